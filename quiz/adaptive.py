@@ -0,0 +1,205 @@
+"""
+Adaptive difficulty for single-player sessions.
+
+Every question has an item difficulty b on a logit scale: Question.irt_difficulty
+once it has been calibrated, otherwise a prior from its easy/medium/hard label.
+An adaptive session keeps the player's ability θ on the same scale, and under
+the Rasch model the player answers correctly with probability
+1 / (1 + e^-(θ - b)).
+
+Selection: a worker groups the question bank (per topic filter) into buckets
+ADAPTIVE_BUCKET_WIDTH logits wide once and keeps them for ADAPTIVE_BUCKET_TTL
+seconds, for the ADAPTIVE_BUCKET_CACHE_SIZE most recently used topic
+filters (players can send any topic combination). The next question comes from the bucket where the player has an
+ADAPTIVE_TARGET_SUCCESS chance of being right: a dict lookup and a random
+pick, trying neighbouring buckets when that one is empty or used up. No
+selection queries the question bank.
+
+Update: after each answer θ moves by step * (outcome - P(correct)), with a
+step that shrinks as the session goes on. A correct answer scores 1 when
+instant and a little less the closer it came to the timer running out; a
+wrong or missing answer scores 0.
+"""
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .rating import ability_from_rating
+
+# Difficulty of questions that have not been calibrated yet
+DIFFICULTY_PRIOR = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+
+# Ability stays within this many logits of 0
+MAX_ABILITY = 4.0
+
+# How much of a correct answer's outcome a full-timer response gives up
+SLOW_DISCOUNT = 0.25
+
+# Buckets tried on each side of the target bucket
+MAX_BUCKET_DISTANCE = 8
+
+# Random picks tried in a bucket before looking through it
+PICK_ATTEMPTS = 4
+
+
+def item_difficulty(irt_difficulty, label):
+    if irt_difficulty is not None:
+        return irt_difficulty
+    return DIFFICULTY_PRIOR.get(label, 0.0)
+
+
+def p_correct(ability, difficulty):
+    return 1.0 / (1.0 + math.exp(difficulty - ability))
+
+
+def _logit(p):
+    return math.log(p / (1.0 - p))
+
+
+def target_difficulty(ability, target=None):
+    """Item difficulty the player answers correctly with probability `target`."""
+    target = target or getattr(settings, "ADAPTIVE_TARGET_SUCCESS", 0.7)
+    return ability - _logit(target)
+
+
+def initial_ability(user=None, difficulty="mixed"):
+    """
+    Starting ability. A chosen difficulty starts the session on questions of
+    that level; otherwise a registered player starts from their Elo rating.
+    """
+    if difficulty in DIFFICULTY_PRIOR:
+        return DIFFICULTY_PRIOR[difficulty] + _logit(getattr(settings, "ADAPTIVE_TARGET_SUCCESS", 0.7))
+    if user is not None and user.is_authenticated:
+        return max(-MAX_ABILITY, min(MAX_ABILITY, ability_from_rating(user.rating)))
+    return 0.0
+
+
+def answer_outcome(is_correct, response_time_ms=None, time_limit=None):
+    if not is_correct:
+        return 0.0
+    if response_time_ms is None or not time_limit:
+        return 1.0
+    slowness = min(max(response_time_ms / (time_limit * 1000.0), 0.0), 1.0)
+    return 1.0 - SLOW_DISCOUNT * slowness
+
+
+def step_size(answered):
+    """Large steps while little is known about the player, smaller ones later."""
+    return max(1.0 / math.sqrt(answered + 1), 0.25)
+
+
+def update_ability(ability, difficulty, outcome, answered):
+    ability += step_size(answered) * (outcome - p_correct(ability, difficulty))
+    return max(-MAX_ABILITY, min(MAX_ABILITY, ability))
+
+
+class DifficultyBuckets:
+    """Question ids grouped by difficulty, for one topic filter."""
+
+    def __init__(self, rows, width=None):
+        """rows: (id, irt_difficulty, difficulty label) per question."""
+        self.width = width or getattr(settings, "ADAPTIVE_BUCKET_WIDTH", 0.5)
+        self.buckets = {}
+        self.size = 0
+        for question_id, irt_difficulty, label in rows:
+            self.buckets.setdefault(self.index(item_difficulty(irt_difficulty, label)), []).append(question_id)
+            self.size += 1
+        self.built_at = time.monotonic()
+
+    def index(self, difficulty):
+        return math.floor(difficulty / self.width + 0.5)
+
+    def pick(self, difficulty, exclude=()):
+        """A random question id from the bucket nearest `difficulty`, skipping `exclude`."""
+        centre = self.index(difficulty)
+        for distance in range(MAX_BUCKET_DISTANCE + 1):
+            sides = (centre,) if distance == 0 else (centre - distance, centre + distance)
+            for idx in sides:
+                ids = self.buckets.get(idx)
+                if not ids:
+                    continue
+                for _ in range(PICK_ATTEMPTS):
+                    question_id = random.choice(ids)
+                    if question_id not in exclude:
+                        return question_id
+                # Mostly used up; only this small a bucket gets looked through
+                if len(ids) <= len(exclude) + PICK_ATTEMPTS:
+                    rest = [question_id for question_id in ids if question_id not in exclude]
+                    if rest:
+                        return random.choice(rest)
+        return None
+
+
+# Topic key -> DifficultyBuckets, least recently used first
+_buckets = OrderedDict()
+_buckets_lock = threading.Lock()
+
+
+def _topic_key(topics):
+    from .models import normalize_topic
+
+    return tuple(sorted({normalize_topic(t) for t in topics or () if t and normalize_topic(t)}))
+
+
+def get_buckets(topics=()):
+    """This worker's buckets for the topic filter, rebuilt after ADAPTIVE_BUCKET_TTL."""
+    from .models import Question
+    from .search import filter_by_topics
+
+    key = _topic_key(topics)
+    ttl = getattr(settings, "ADAPTIVE_BUCKET_TTL", 300)
+    with _buckets_lock:
+        cached = _buckets.get(key)
+        if cached is not None and time.monotonic() - cached.built_at < ttl:
+            _buckets.move_to_end(key)
+            return cached
+
+    qs = Question.objects.filter(question_type="multiple_choice")
+    if key:
+        qs = filter_by_topics(qs, key)
+    buckets = DifficultyBuckets(qs.values_list("id", "irt_difficulty", "difficulty").iterator())
+    if not buckets.size and key:
+        # Nothing on these topics yet: adapt over the whole bank
+        buckets = get_buckets()
+
+    max_entries = getattr(settings, "ADAPTIVE_BUCKET_CACHE_SIZE", 64)
+    with _buckets_lock:
+        _buckets[key] = buckets
+        _buckets.move_to_end(key)
+        while len(_buckets) > max_entries:
+            _buckets.popitem(last=False)
+    return buckets
+
+
+def select_next_question(session):
+    """
+    Pick the question for session.current_question_index and link it to
+    the session. Returns the Question, or None when nothing is left.
+    """
+    from .models import Question, SessionQuestion
+
+    used = set(session.sessionquestion_set.values_list("question_id", flat=True))
+    buckets = get_buckets(session.adaptive_topics)
+    target = target_difficulty(session.ability)
+    for _ in range(PICK_ATTEMPTS):
+        question_id = buckets.pick(target, exclude=used)
+        if question_id is None:
+            return None
+        question = Question.objects.filter(pk=question_id).first()
+        if question is not None:
+            SessionQuestion.objects.create(session=session, question=question, order=session.current_question_index)
+            return question
+        used.add(question_id)  # deleted since the buckets were built
+    return None
+
+
+def record_answer(session, question, is_correct, response_time_ms=None):
+    """Move the session's ability after an answer to `question` (not saved)."""
+    difficulty = item_difficulty(question.irt_difficulty, question.difficulty)
+    outcome = answer_outcome(is_correct, response_time_ms, session.time_limit)
+    session.ability = update_ability(session.ability, difficulty, outcome, session.current_question_index)
+    return session.ability
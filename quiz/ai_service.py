@@ -4,32 +4,167 @@ import threading
 import os
 from functools import lru_cache
 
-import google.generativeai as genai
 from django.conf import settings
 from django.db.models.functions import Lower
+from .generation_cache import GENERATION_CACHE
+from .json_stream import JSONArrayStreamParser
 from .models import Question
+from .providers import QuestionProvider
+
+try:
+    import google.generativeai as genai
+except ImportError:  # the local provider works without the Gemini SDK
+    genai = None
 
 # Configure Gemini
+api_key = None
 try:
     # Try to get key from settings first, then env
     api_key = getattr(settings, 'GEMINI_API_KEY', os.getenv("GEMINI_API_KEY"))
-    if api_key:
+    if api_key and genai:
         genai.configure(api_key=api_key)
 except Exception:
     pass
 
-@lru_cache(maxsize=4)
+@lru_cache(maxsize=8)
 def get_gemini_model(model_name: str):
     """
     Cached Gemini model loader so we don't reinitialize models repeatedly.
     """
     return genai.GenerativeModel(model_name)
 
-class GeminiQuestionGenerator:
+
+# Models in order of preference. Each is also tried with the "models/" prefix.
+GEMINI_MODEL_CANDIDATES = [
+    "gemini-1.5-flash",
+    "gemini-2.0-flash",
+    "gemini-1.5-pro",
+    "gemini-pro",
+]
+
+
+# Errors saying the model itself can't be used, as opposed to rate limits,
+# quota or network trouble, which say nothing about the model
+UNUSABLE_MODEL_ERRORS = ("NotFound", "PermissionDenied")
+UNUSABLE_MODEL_MESSAGES = ("404", "403", "not found", "not supported", "permission denied", "permission_denied")
+
+
+def is_model_unusable(error):
+    if type(error).__name__ in UNUSABLE_MODEL_ERRORS:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in UNUSABLE_MODEL_MESSAGES)
+
+
+class ModelRegistry:
+    """
+    Process-wide record of which Gemini model names work.
+
+    Real calls report success or failure here, so a missing model costs one
+    failed request per process per BAD_TTL instead of one per generator.
+    Unknown models are probed in a background thread, never on the request path.
+    Only model-not-found and permission errors mark a model bad; a transient
+    error (429, quota, timeout) leaves it unknown.
+    """
+    GOOD_TTL = 30 * 60  # seconds
+    BAD_TTL = 10 * 60
+
+    def __init__(self, candidates):
+        self.variants = []
+        for name in candidates:
+            self.variants.extend([name, f"models/{name}"])
+        self._status = {}  # variant -> (is_good, expires_at)
+        self._lock = threading.Lock()
+        self._probe_thread = None
+
+    def _set(self, variant, is_good, ttl):
+        with self._lock:
+            self._status[variant] = (is_good, time.monotonic() + ttl)
+
+    def mark_good(self, variant):
+        self._set(variant, True, self.GOOD_TTL)
+
+    def mark_bad(self, variant):
+        self._set(variant, False, self.BAD_TTL)
+
+    def status(self, variant):
+        """True / False for known good / bad, None when unknown or expired."""
+        with self._lock:
+            entry = self._status.get(variant)
+            if entry is None:
+                return None
+            is_good, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._status[variant]
+                return None
+            return is_good
+
+    def best_model(self, exclude=()):
+        """
+        Pick a known-good model first, then the first one we know nothing
+        about. Returns None when every candidate is known to be bad.
+        """
+        unknown = None
+        for variant in self.variants:
+            if variant in exclude:
+                continue
+            state = self.status(variant)
+            if state is True:
+                return variant
+            if state is None and unknown is None:
+                unknown = variant
+        return unknown
+
+    def has_good_model(self):
+        return any(self.status(v) is True for v in self.variants)
+
+    def probe_in_background(self):
+        """Check unknown models in a daemon thread (one probe thread at a time)."""
+        if not genai:
+            return
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(
+                target=self._probe_unknown, name="gemini-model-probe", daemon=True
+            )
+            self._probe_thread.start()
+
+    def _probe_unknown(self):
+        for variant in self.variants:
+            if self.status(variant) is not None:
+                continue
+            try:
+                resp = get_gemini_model(variant).generate_content("test", stream=False)
+            except Exception as e:
+                if is_model_unusable(e):
+                    self.mark_bad(variant)
+                    continue
+                # Rate limited or offline: every probe would fail the same way, try again later
+                return
+            if hasattr(resp, "text"):
+                self.mark_good(variant)
+                # Candidates are in preference order, so stop at the first hit
+                return
+            self.mark_bad(variant)
+
+
+MODEL_REGISTRY = ModelRegistry(GEMINI_MODEL_CANDIDATES)
+
+
+class GeminiQuestionGenerator(QuestionProvider):
+    name = "gemini"
+
     def __init__(self):
-        # Default stable model
-        self.model_name = "gemini-1.5-flash"
-        self.model = get_gemini_model(self.model_name)
+        # Best model this process knows about, default stable model otherwise
+        self.model_name = MODEL_REGISTRY.best_model() or GEMINI_MODEL_CANDIDATES[0]
+        self.model = get_gemini_model(self.model_name) if genai else None
+        if not MODEL_REGISTRY.has_good_model():
+            MODEL_REGISTRY.probe_in_background()
+
+    def is_available(self):
+        """Degraded when the SDK/key is missing or every model is known bad."""
+        return bool(genai and api_key) and MODEL_REGISTRY.best_model() is not None
 
     def list_available_models(self):
         """Helper method to list available models for debugging."""
@@ -47,9 +182,10 @@ class GeminiQuestionGenerator:
             print(f"Error listing models: {e}")
             return []
 
-    def generate_questions(self, topic, difficulty="medium", num_questions=5):
+    def generate_questions(self, topic, difficulty="medium", num_questions=5, user=None):
         """
-        Main entry: try batch generation first (fast), then fallback to per-question.
+        Main entry: serve from the prompt cache when possible, otherwise try
+        batch generation first (fast), then fallback to per-question.
         """
         questions_data = []
         
@@ -58,10 +194,11 @@ class GeminiQuestionGenerator:
             return []
 
         try:
-            batch_questions = self._generate_questions_batch(
+            batch_questions = self._generate_questions_batch_cached(
                 topic=topic,
                 difficulty=difficulty,
                 num_questions=num_questions,
+                user=user,
             )
             if batch_questions and len(batch_questions) >= num_questions:
                 questions_data = batch_questions
@@ -85,27 +222,150 @@ class GeminiQuestionGenerator:
 
         return questions_data
 
+    def generate_questions_stream(self, topic, difficulty="medium", num_questions=5, user=None):
+        """
+        Same as generate_questions, but yields each question as soon as it is
+        ready. Callers can start serving question 1 while the rest streams in
+        (see QuestionProvider.generate_questions_stream for who does today).
+        """
+        if not genai:
+            print("Gemini API not configured")
+            return
+
+        cached = GENERATION_CACHE.get_slice(topic, difficulty, num_questions, user=user)
+        if cached is not None:
+            yield from cached
+            return
+
+        existing_normalized = self._load_existing_normalized()
+        streamed = []
+
+        try:
+            for question in self._stream_questions_batch(
+                topic=topic,
+                difficulty=difficulty,
+                num_questions=num_questions,
+                existing_normalized=existing_normalized,
+            ):
+                streamed.append(question)
+                yield question
+        except Exception as e:
+            print(f"Batch generation error: {e}, falling back to individual generation")
+        GENERATION_CACHE.store(topic, difficulty, num_questions, streamed)
+
+        if len(streamed) < num_questions:
+            for question in self._generate_questions_individual(
+                topic=topic,
+                difficulty=difficulty,
+                num_questions=num_questions - len(streamed),
+                existing_normalized=existing_normalized,
+            ):
+                yield question
+
+    def _load_existing_normalized(self):
+        """Normalized text of every stored question, used for dedup."""
+        return set(
+            Question.objects.annotate(normalized=Lower("question_text"))
+            .values_list("normalized", flat=True)
+        )
+
+    @staticmethod
+    def _validate_question(q_data, existing_normalized):
+        """
+        Check one generated question and return the cleaned dict,
+        or None if it is malformed or a duplicate.
+        """
+        if not isinstance(q_data, dict):
+            return None
+
+        # Validate required keys
+        if not all(k in q_data for k in ("question", "options", "correct_answer")):
+            return None
+
+        question_text = str(q_data.get("question") or "").strip()
+        options = q_data.get("options", [])
+        correct = str(q_data.get("correct_answer") or "").strip()
+
+        if not question_text or not isinstance(options, list) or len(options) != 4:
+            return None
+
+        if correct not in options:
+            return None
+
+        # Normalize & check uniqueness
+        normalized = question_text.lower()
+        if normalized in existing_normalized:
+            return None
+        existing_normalized.add(normalized)
+
+        return {
+            "question": question_text,
+            "options": options,
+            "correct_answer": correct,
+            "explanation": str(q_data.get("explanation") or "").strip(),
+        }
+
+    def _generate_questions_batch_cached(
+        self, topic, difficulty="medium", num_questions=5, user=None
+    ):
+        """
+        Prompt-level cache in front of _generate_questions_batch. Identical
+        (topic, difficulty, num_questions) requests reuse the validated batch,
+        minus anything this user has already played.
+        """
+        cached = GENERATION_CACHE.get_slice(topic, difficulty, num_questions, user=user)
+        if cached is not None:
+            return cached
+
+        batch_questions = self._generate_questions_batch(
+            topic=topic,
+            difficulty=difficulty,
+            num_questions=num_questions,
+        )
+        GENERATION_CACHE.store(topic, difficulty, num_questions, batch_questions)
+        return batch_questions
+
     def _generate_questions_batch(self, topic, difficulty="medium", num_questions=5):
         """
         I try to get all questions at once (Batch) because it's faster.
         I ask Gemini to give me a JSON array.
         """
+        return list(
+            self._stream_questions_batch(
+                topic=topic,
+                difficulty=difficulty,
+                num_questions=num_questions,
+                existing_normalized=self._load_existing_normalized(),
+            )
+        )
+
+    def _stream_questions_batch(
+        self, topic, difficulty="medium", num_questions=5, existing_normalized=None
+    ):
+        """
+        Stream the batch response and yield every valid, unique question the
+        moment its JSON object is complete. Retries ask only for the
+        questions that are still missing.
+        """
         max_retries = 3
         base_delay = 1  # smaller base delay
         max_delay = 4   # cap backoff
 
-        # Load existing questions (normalized) once per batch
-        existing_normalized = set(
-            Question.objects.annotate(normalized=Lower("question_text"))
-            .values_list("normalized", flat=True)
-        )
+        if existing_normalized is None:
+            existing_normalized = self._load_existing_normalized()
+
+        produced = 0
 
         for attempt in range(max_retries):
+            remaining = num_questions - produced
+            if remaining <= 0:
+                return
+
             try:
                 # This is the prompt I send to Gemini.
                 # I tell it exactly what I want: JSON format, no duplicates.
                 prompt = f"""
-Generate exactly {num_questions} unique multiple-choice aptitude questions
+Generate exactly {remaining} unique multiple-choice aptitude questions
 on the topic: {topic}.
 Difficulty: {difficulty}.
 
@@ -128,101 +388,46 @@ Strict output format: a valid JSON array ONLY, no markdown, no comments:
 ]
 
 Requirements:
-- Exactly {num_questions} objects.
+- Exactly {remaining} objects.
 - Each has exactly 4 options.
 - "correct_answer" MUST exactly match one of the options.
 - No markdown code fences, no extra text.
 """
 
-                # Use streaming for faster time-to-first-byte
+                # Parse the stream as it arrives instead of after the last chunk
                 response = self.model.generate_content(prompt, stream=True)
-                chunks = []
+                parser = JSONArrayStreamParser()
+                model_ok = False
                 for chunk in response:
-                    if hasattr(chunk, "text") and chunk.text:
-                        chunks.append(chunk.text)
-                response_text = "".join(chunks).strip()
-
-                # First, try direct JSON parse
-                try:
-                    batch_data = json.loads(response_text)
-                except json.JSONDecodeError:
-                    # If model accidentally wrapped in ```json ... ``` or ``` ... ```
-                    cleaned = response_text.strip()
-                    if cleaned.startswith("```json"):
-                        cleaned = cleaned[len("```json"):].strip()
-                    if cleaned.startswith("```"):
-                        cleaned = cleaned[len("```"):].strip()
-                    if cleaned.endswith("```"):
-                        cleaned = cleaned[:-3].strip()
-
-                    batch_data = json.loads(cleaned)
-
-                if not isinstance(batch_data, list):
-                    raise ValueError("Response must be a JSON array of questions")
-
-                valid_questions = []
-
-                for q_data in batch_data:
-                    if not isinstance(q_data, dict):
-                        continue
-
-                    # Validate required keys
-                    if not all(
-                        k in q_data
-                        for k in ("question", "options", "correct_answer")
-                    ):
-                        continue
-
-                    question_text = q_data.get("question", "").strip()
-                    options = q_data.get("options", [])
-                    correct = q_data.get("correct_answer", "").strip()
-
-                    if (
-                        not question_text
-                        or not isinstance(options, list)
-                        or len(options) != 4
-                    ):
-                        continue
-
-                    if correct not in options:
+                    if not model_ok:
+                        MODEL_REGISTRY.mark_good(self.model_name)
+                        model_ok = True
+                    if not (hasattr(chunk, "text") and chunk.text):
                         continue
-
-                    # Normalize & check uniqueness
-                    normalized = question_text.lower()
-                    if normalized not in existing_normalized:
-                        existing_normalized.add(normalized)
-                        valid_questions.append(
-                            {
-                                "question": question_text,
-                                "options": options,
-                                "correct_answer": correct,
-                                "explanation": q_data.get("explanation", "").strip(),
-                            }
-                        )
-
-                    if len(valid_questions) >= num_questions:
+                    for q_data in parser.feed(chunk.text):
+                        question = self._validate_question(q_data, existing_normalized)
+                        if question is None:
+                            continue
+                        produced += 1
+                        yield question
+                        if produced >= num_questions:
+                            return
+                    if parser.finished:
                         break
 
-                if len(valid_questions) >= num_questions:
-                    return valid_questions[:num_questions]
-                else:
-                    print(
-                        f"Batch attempt {attempt + 1}: "
-                        f"only {len(valid_questions)} valid unique questions"
-                    )
-
-                    if attempt < max_retries - 1:
-                        delay = min(base_delay * (2 ** attempt), max_delay)
-                        print(f"Retrying batch generation in {delay} seconds...")
-                        time.sleep(delay)
+                if not parser.started:
+                    raise ValueError("Response must be a JSON array of questions")
 
-            except json.JSONDecodeError as e:
                 print(
-                    f"JSON decode error in batch generation attempt {attempt + 1}: {e}"
+                    f"Batch attempt {attempt + 1}: "
+                    f"only {produced} valid unique questions"
                 )
+
                 if attempt < max_retries - 1:
                     delay = min(base_delay * (2 ** attempt), max_delay)
+                    print(f"Retrying batch generation in {delay} seconds...")
                     time.sleep(delay)
+
             except Exception as e:
                 error_str = str(e).lower()
                 if "429" in error_str or "quota" in error_str or "rate limit" in error_str:
@@ -232,11 +437,7 @@ Requirements:
                         f"{delay} seconds..."
                     )
                     time.sleep(delay)
-                elif (
-                    "404" in error_str
-                    or "not found" in error_str
-                    or "not supported" in error_str
-                ):
+                elif is_model_unusable(e):
                     if self._try_fallback_model():
                         # Try again with new model
                         continue
@@ -252,10 +453,9 @@ Requirements:
                         time.sleep(delay)
 
         print("Batch generation failed after all retries")
-        return []
 
     def _generate_questions_individual(
-        self, topic, difficulty="medium", num_questions=5
+        self, topic, difficulty="medium", num_questions=5, existing_normalized=None
     ):
         """
         If the batch method fails, I generate questions one by one.
@@ -267,10 +467,8 @@ Requirements:
         max_delay = 4
 
         # Load existing questions once
-        existing_normalized = set(
-            Question.objects.annotate(normalized=Lower("question_text"))
-            .values_list("normalized", flat=True)
-        )
+        if existing_normalized is None:
+            existing_normalized = self._load_existing_normalized()
 
         for i in range(num_questions):
             attempts = 0
@@ -308,6 +506,7 @@ Requirements:
                         if hasattr(chunk, "text") and chunk.text:
                             chunks.append(chunk.text)
                     response_text = "".join(chunks).strip()
+                    MODEL_REGISTRY.mark_good(self.model_name)
 
                     # Try direct JSON parse
                     try:
@@ -378,11 +577,7 @@ Requirements:
                         )
                         time.sleep(delay)
                         attempts += 1
-                    elif (
-                        "404" in error_str
-                        or "not found" in error_str
-                        or "not supported" in error_str
-                    ):
+                    elif is_model_unusable(e):
                         if self._try_fallback_model():
                             continue
                         else:
@@ -408,26 +603,19 @@ Requirements:
 
     def _try_fallback_model(self):
         """
-        Try switching to an alternative working model, using cached instances.
+        Mark the current model as bad and switch to the best remaining one
+        from the registry. No test request is sent here; the retried call
+        tells the registry whether the new model works.
         """
-        alternative_models = [
-            "gemini-2.0-flash",
-            "gemini-1.5-pro",
-            "gemini-pro",
-        ]
-
-        for alt_model in alternative_models:
-            for variant in (alt_model, f"models/{alt_model}"):
-                try:
-                    test_model = get_gemini_model(variant)
-                    # Quick lightweight test
-                    resp = test_model.generate_content("test", stream=False)
-                    if hasattr(resp, "text"):
-                        self.model = test_model
-                        self.model_name = variant
-                        print(f"Successfully switched to model: {variant}")
-                        return True
-                except Exception:
-                    continue
-        print("No fallback Gemini model worked.")
-        return False
+        MODEL_REGISTRY.mark_bad(self.model_name)
+
+        variant = MODEL_REGISTRY.best_model(exclude={self.model_name})
+        if variant is None:
+            print("No fallback Gemini model worked.")
+            return False
+
+        self.model = get_gemini_model(variant)
+        self.model_name = variant
+        print(f"Switched to model: {variant}")
+        MODEL_REGISTRY.probe_in_background()
+        return True
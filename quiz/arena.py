@@ -0,0 +1,133 @@
+"""
+Scoring for arena rooms (hundreds of players in one quiz room).
+
+Each player gets a seat number when they join, and everything per player
+lives in compact arrays indexed by seat. An answer is a single array write.
+When a question closes, the whole room is scored in one pass (vectorized
+with numpy when it is installed). Standings are a top-K selection
+(heapq.nlargest) instead of sorting or sending every score.
+
+Scoring: a correct answer is worth BASE_POINTS plus up to SPEED_BONUS more
+for answering early; otherwise speed would never separate hundreds of
+players on equal correct counts.
+"""
+import heapq
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # optional, the pure-Python pass gives the same result
+    np = None
+
+BASE_POINTS = 10
+SPEED_BONUS = 10
+
+UNANSWERED = -1
+INVALID = -2
+
+
+class ArenaScoreboard:
+    def __init__(self, players=()):
+        self.names = []
+        self.seats = {}
+        self.totals = array("l")
+        self.correct = array("l")
+        self.answered = array("l")
+        for name in players:
+            self.add_player(name)
+        self.open_question(None, 0.0)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add_player(self, name):
+        """Give a new player the next seat. Only between questions."""
+        seat = len(self.names)
+        self.names.append(name)
+        self.seats[name] = seat
+        for column in (self.totals, self.correct, self.answered):
+            column.append(0)
+        return seat
+
+    def open_question(self, correct_option, now):
+        n = len(self.names)
+        self.correct_option = correct_option
+        self.opened_at = now
+        self.selected = array("h", [UNANSWERED]) * n
+        self.answer_ms = array("l", [0]) * n
+        self.answer_count = 0
+
+    def answer(self, name, selected, now):
+        """Record a player's first answer. Returns False for repeats and unknown players."""
+        seat = self.seats.get(name)
+        if seat is None or seat >= len(self.selected) or self.selected[seat] != UNANSWERED:
+            return False
+        if not isinstance(selected, int) or isinstance(selected, bool) or not 0 <= selected < 100:
+            selected = INVALID
+        self.selected[seat] = selected
+        self.answer_ms[seat] = max(int((now - self.opened_at) * 1000), 0)
+        self.answer_count += 1
+        return True
+
+    @property
+    def all_answered(self):
+        return self.answer_count >= len(self.selected)
+
+    def close_question(self, time_limit_ms):
+        """Score every seat for the open question. Returns the points per seat."""
+        if np is not None:
+            points = self._score_numpy(time_limit_ms)
+        else:
+            points = self._score_python(time_limit_ms)
+
+        for seat, p in enumerate(points):
+            if p:
+                self.totals[seat] += p
+                self.correct[seat] += 1
+            if self.selected[seat] != UNANSWERED:
+                self.answered[seat] += 1
+        return points
+
+    def _score_python(self, time_limit_ms):
+        correct_option = self.correct_option
+        limit = max(time_limit_ms, 1)
+        return [
+            BASE_POINTS + round(SPEED_BONUS * max(limit - ms, 0) / limit) if sel == correct_option else 0
+            for sel, ms in zip(self.selected, self.answer_ms)
+        ]
+
+    def _score_numpy(self, time_limit_ms):
+        selected = np.frombuffer(self.selected, dtype=np.int16)
+        ms = np.frombuffer(self.answer_ms, dtype=np.dtype("l"))
+        limit = max(time_limit_ms, 1)
+        bonus = np.rint(SPEED_BONUS * np.clip(limit - ms, 0, None) / limit).astype(np.int64)
+        return np.where(selected == self.correct_option, BASE_POINTS + bonus, 0).tolist()
+
+    def answers(self):
+        """(name, selected or None, is_correct, response_ms) for everyone who answered."""
+        for seat, sel in enumerate(self.selected):
+            if sel == UNANSWERED:
+                continue
+            yield (
+                self.names[seat],
+                sel if sel >= 0 else None,
+                sel == self.correct_option,
+                self.answer_ms[seat],
+            )
+
+    def top(self, k):
+        """[(name, total)] for the k best players; ties keep join order."""
+        best = heapq.nlargest(k, range(len(self.names)), key=self.totals.__getitem__)
+        return [(self.names[seat], self.totals[seat]) for seat in best]
+
+    def ranks(self):
+        """1-based competition rank for every seat (equal totals share a rank)."""
+        order = sorted(range(len(self.names)), key=self.totals.__getitem__, reverse=True)
+        ranks = array("l", [0]) * len(order)
+        prev_total, prev_rank = None, 0
+        for position, seat in enumerate(order, start=1):
+            total = self.totals[seat]
+            if total != prev_total:
+                prev_total, prev_rank = total, position
+            ranks[seat] = prev_rank
+        return ranks
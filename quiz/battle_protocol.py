@@ -0,0 +1,84 @@
+"""
+Compact wire format for coding battles.
+
+* Code: each submission gets a version number per author. A peer receives a
+  diff (quiz/code_diff.py) against the last version it acknowledged, and
+  acks the new one. If it lost track it asks for a full copy (code_sync).
+* Results: per-case pass/fail is a bitmap (hex string, bit i = case i
+  passed). Inputs, outputs and errors are only sent when a client asks for
+  them (result_details).
+"""
+from .code_diff import make_diff
+
+# Versions kept per author so a slightly late ack still has its base
+CODE_HISTORY = 4
+
+
+def results_bitmap(results):
+    """Hex bitmap of passed cases, bit i set when case i passed."""
+    mask = 0
+    for i, result in enumerate(results):
+        if result.get("passed"):
+            mask |= 1 << i
+    return format(mask, "x")
+
+
+def bitmap_cases(bits, total):
+    """[True/False] per case from a hex bitmap."""
+    mask = int(bits or "0", 16)
+    return [bool(mask >> i & 1) for i in range(total)]
+
+
+def submission_summary(submission):
+    """What everyone may see of a submission: counts, runtime and the bitmap."""
+    return {
+        "passed": submission["passed"],
+        "total": submission["total"],
+        "runtime": submission["runtime"],
+        "bits": results_bitmap(submission["results"]),
+    }
+
+
+class CodeSync:
+    """Latest code per author and the version each peer has acknowledged."""
+
+    def __init__(self):
+        self.history = {}  # author -> {version: code}, newest CODE_HISTORY versions
+        self.latest = {}   # author -> version
+        self.acked = {}    # (peer, author) -> version
+
+    def update(self, author, code):
+        version = self.latest.get(author, 0) + 1
+        self.latest[author] = version
+        versions = self.history.setdefault(author, {})
+        versions[version] = code
+        for old in sorted(versions)[:-CODE_HISTORY]:
+            del versions[old]
+        return version
+
+    def code(self, author, version=None):
+        version = self.latest.get(author) if version is None else version
+        return self.history.get(author, {}).get(version)
+
+    def frame_for(self, peer, author):
+        """Fields describing the author's latest code for this peer, as a diff when possible."""
+        version = self.latest.get(author, 0)
+        base = self.acked.get((peer, author), 0)
+        base_code = "" if base == 0 else self.code(author, base)
+        if base_code is None:  # peer acked something we no longer keep
+            return self.full_frame(author)
+        return {
+            "code_version": version,
+            "base_version": base,
+            "code_diff": make_diff(base_code, self.code(author) or ""),
+        }
+
+    def full_frame(self, author):
+        return {"code_version": self.latest.get(author, 0), "code": self.code(author) or ""}
+
+    def ack(self, peer, author, version):
+        """Record the peer's ack; ignored for versions we don't know or older than its last."""
+        if self.code(author, version) is None or version < self.acked.get((peer, author), 0):
+            return False
+        self.acked[(peer, author)] = version
+        return True
@@ -0,0 +1,103 @@
+"""
+Encode-once broadcasting for the websocket consumers.
+
+A plain group_send of a dict makes every member's handler build and
+json.dumps the same frame again, so one broadcast to N players costs N
+encodes. broadcast() encodes the client frame once (orjson when it is
+installed) and sends the finished text through the channel layer; each
+member's broadcast_frame handler just writes it to its socket.
+
+Large frames (WS_COMPRESS_THRESHOLD bytes and up) are also deflated once,
+and clients that asked for compression ("compress": true on create/join)
+get them as a binary zlib frame instead of text.
+
+Clients that negotiated the MessagePack protocol (quiz/wire.py) get binary
+msgpack frames. Those are also packed once per broadcast, but only when
+the group has such a member.
+"""
+import json
+import zlib
+
+from django.conf import settings
+
+from . import wire
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def encode_frame(payload):
+    """Client frame as a JSON string."""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def deflate_if_large(text):
+    """zlib-compressed frame when text is over the threshold, else None."""
+    if len(text) < getattr(settings, "WS_COMPRESS_THRESHOLD", 4096):
+        return None
+    return zlib.compress(text.encode(), 6)
+
+
+class BroadcastMixin:
+    """Adds broadcast() and the matching broadcast_frame handler to a consumer."""
+
+    # Set per connection from the client's "compress" flag
+    compress = False
+    # Set per connection by the "hello" negotiation
+    protocol = wire.PROTOCOL_JSON
+
+    async def join_group(self, group):
+        """group_add that also counts msgpack members, see broadcast()."""
+        await self.channel_layer.group_add(group, self.channel_name)
+        if self.protocol == wire.PROTOCOL_MSGPACK:
+            wire.GROUP_MSGPACK_MEMBERS[group] += 1
+        self.__dict__.setdefault("joined_groups", []).append(group)
+
+    async def leave_groups(self):
+        for group in self.__dict__.pop("joined_groups", []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+            if self.protocol == wire.PROTOCOL_MSGPACK:
+                wire.GROUP_MSGPACK_MEMBERS[group] -= 1
+                if wire.GROUP_MSGPACK_MEMBERS[group] <= 0:
+                    del wire.GROUP_MSGPACK_MEMBERS[group]
+
+    async def broadcast(self, group, payload, exclude=None):
+        """Send payload to everyone in group, except the player named `exclude`."""
+        text = encode_frame(payload)
+        await self.channel_layer.group_send(
+            group,
+            {
+                "type": "broadcast_frame",
+                "text": text,
+                "deflated": deflate_if_large(text),
+                "packed": wire.pack(payload) if wire.GROUP_MSGPACK_MEMBERS.get(group) else None,
+                "exclude": exclude,
+            }
+        )
+
+    async def send_frame(self, payload):
+        """Send payload to this client only, in its protocol, compressed if large and wanted."""
+        if self.protocol == wire.PROTOCOL_MSGPACK:
+            await self.send(bytes_data=wire.pack(payload))
+            return
+        text = encode_frame(payload)
+        deflated = deflate_if_large(text) if self.compress else None
+        if deflated is not None:
+            await self.send(bytes_data=deflated)
+        else:
+            await self.send(text_data=text)
+
+    async def broadcast_frame(self, event):
+        if event.get("exclude") is not None and event["exclude"] == getattr(self, "player_name", None):
+            return
+        if self.protocol == wire.PROTOCOL_MSGPACK:
+            packed = event.get("packed") or wire.pack(json.loads(event["text"]))
+            await self.send(bytes_data=packed)
+        elif self.compress and event.get("deflated") is not None:
+            await self.send(bytes_data=event["deflated"])
+        else:
+            await self.send(text_data=event["text"])
@@ -0,0 +1,48 @@
+"""
+Tiny text diffs for streaming code edits.
+
+Between two versions of a file typically only one region changes, so a diff
+is just: keep `p` characters of prefix and `s` characters of suffix from the
+old text and put `i` in between. That is O(len) to compute, trivial to apply
+in the browser, and a few bytes for a small edit instead of the whole file.
+
+`p` and `s` count UTF-16 code units, because that is what String.slice
+counts in the browser: an emoji or other astral character is one Python
+character but two JavaScript ones. The split points are found per Python
+character, so they never fall inside a surrogate pair.
+"""
+
+
+def _utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def make_diff(old, new):
+    """{"p": prefix, "s": suffix, "i": inserted} turning old into new, or None if equal."""
+    if old == new:
+        return None
+    limit = min(len(old), len(new))
+
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    return {
+        "p": _utf16_len(old[:prefix]),
+        "s": _utf16_len(old[len(old) - suffix:]),
+        "i": new[prefix:len(new) - suffix],
+    }
+
+
+def apply_diff(old, diff):
+    """Server-side twin of applyDiff in coding_battle.html, with the same UTF-16 offsets."""
+    if diff is None:
+        return old
+    units = old.encode("utf-16-le")
+    kept_prefix, kept_suffix = units[:2 * diff["p"]], units[len(units) - 2 * diff["s"]:]
+    return (kept_prefix + diff["i"].encode("utf-16-le") + kept_suffix).decode("utf-16-le")
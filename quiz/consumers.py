@@ -1,17 +1,52 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.conf import settings
 from django.utils import timezone
 
+import asyncio
 import json
 import random
+import secrets
 import logging
-
-from quiz.models import Question, CodingProblem, CustomUser
+import time
+
+from quiz.arena import ArenaScoreboard
+from quiz.battle_protocol import CodeSync, results_bitmap, submission_summary
+from quiz.broadcast import BroadcastMixin, encode_frame
+from quiz.matchmaking import MatchmakingMixin
+from quiz.models import Question, CodingProblem
+from quiz.persistence import enqueue_game_result
+from quiz.resume import ReplayBuffer, ResumeMixin
+from quiz.spectators import SpectatorMixin
+from quiz import wire
 from quiz.utils import call_judge0
 from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
+
+def unused_room_name(prefix, rooms):
+    """
+    A "<prefix>_NNNN" name not in `rooms`. Call it with no await between
+    picking the name and storing the room, so no other handler can take it.
+    Falls back to longer codes when the 4-digit ones are nearly all in use.
+    """
+    for attempt in range(200):
+        hi = 9999 if attempt < 100 else 99999999
+        room_name = f"{prefix}_{random.randint(1000, hi)}"
+        if room_name not in rooms:
+            return room_name
+    return f"{prefix}_{secrets.token_hex(8)}"
+
+
+def scope_user_id(scope):
+    """ID of the logged-in user from AuthMiddlewareStack, or None for guests."""
+    user = scope.get("user")
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return None
+
+
 # ---------------------------
 # SIMPLE QUIZ GAME CONSUMER
 # ---------------------------
@@ -20,120 +55,322 @@ logger = logging.getLogger(__name__)
 # This is enough for a small project / demo.
 ROOMS = {}
 
+# Arena rooms (mode="arena") take up to ARENA_MAX_PLAYERS players, see quiz/arena.py
+ARENA_MAX_PLAYERS = getattr(settings, "ARENA_MAX_PLAYERS", 500)
+ARENA_QUESTION_TIME = getattr(settings, "ARENA_QUESTION_TIME", 15)  # seconds
+ARENA_TOP_K = getattr(settings, "ARENA_TOP_K", 10)
+# Lobby and answer-progress updates go out at most once per interval
+ARENA_BROADCAST_INTERVAL = getattr(settings, "ARENA_BROADCAST_INTERVAL", 0.5)
+
+
+def new_quiz_room(players, user_ids, channels, config, arena=False):
+    return {
+        "players": list(players),
+        "config": config,
+        "questions": [],
+        "current_q_index": 0,
+        "scores": {p: 0 for p in players},
+        "user_ids": dict(user_ids),
+        "current_answers": {},
+        "answers": [],
+        "game_active": False,
+        "host": players[0],
+        "max_players": ARENA_MAX_PLAYERS if arena else 2,
+        # Arena only: per-seat score arrays, player channels for personal frames, throttle state
+        "arena": ArenaScoreboard(list(players)) if arena else None,
+        "channels": dict(channels),
+        "throttle": {},
+        # Resume tokens and the frames a reconnecting player may have missed
+        "tokens": {},
+        "replay": ReplayBuffer(),
+    }
+
+
+class QuizConsumer(MatchmakingMixin, ResumeMixin, SpectatorMixin, BroadcastMixin, AsyncWebsocketConsumer):
+    spectator_rooms = ROOMS
+    resume_rooms = ROOMS
+    queue_game = "quiz"
 
-class QuizConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        self.user_id = scope_user_id(self.scope)
         await self.accept()
         logger.info("Quiz WebSocket connected")
 
     async def disconnect(self, close_code):
         logger.info(f"Quiz WebSocket disconnected: {close_code}")
+        await self.stop_spectating()
+        await self.leave_queue()
+        await self.leave_groups()
         # For now we don't remove from ROOMS.
         # (Can be improved later.)
 
     async def receive(self, text_data=None, bytes_data=None):
-        # Basic JSON parsing
+        # JSON text frames, or msgpack binary frames after a "hello"
         try:
-            data = json.loads(text_data)
+            if bytes_data is not None and self.protocol == wire.PROTOCOL_MSGPACK:
+                data = wire.unpack(bytes_data)
+            else:
+                data = json.loads(text_data)
         except Exception:
-            await self.send(json.dumps({"error": "invalid json"}))
+            await self.send_frame({"error": "invalid json"})
             return
 
         action = data.get("action")
 
+        if action == "hello":
+            await self.handle_hello(data)
+            return
+
+        # Spectators are read-only
+        if getattr(self, "spectating", None):
+            return
+
         if action == "create":
             await self.handle_create(data)
         elif action == "join":
             await self.handle_join(data)
+        elif action == "spectate":
+            await self.handle_spectate(data)
+        elif action == "resume":
+            await self.handle_resume(data)
+        elif action == "queue":
+            await self.handle_queue(data)
+        elif action == "leave_queue":
+            await self.leave_queue()
         elif action == "answer":
             await self.handle_answer(data)
+        elif action == "start":
+            await self.handle_start(data)
         # you can add "leave" later if needed
 
+    async def handle_hello(self, data):
+        """Protocol negotiation, only honoured before joining a room."""
+        if getattr(self, "room_name", None) or getattr(self, "spectating", None):
+            await self.send_frame({"error": "hello must come before create/join"})
+            return
+        reply = wire.hello_reply(data.get("protocol"))
+        await self.send(text_data=encode_frame(reply))
+        self.protocol = reply["protocol"]
+
     async def handle_create(self, data):
         """Create a new quiz room with one player."""
-        room_name = f"room_{random.randint(1000, 9999)}"
+        room_name = unused_room_name("room", ROOMS)
         player = data.get("player", "Player")
 
+        arena = data.get("mode") == "arena"
+
         config = {
             "topic": data.get("topic", "any"),
             "difficulty": data.get("difficulty", "any"),
             "num_questions": int(data.get("num_questions", 5)),
         }
 
-        ROOMS[room_name] = {
-            "players": [player],
-            "config": config,
-            "questions": [],
-            "current_q_index": 0,
-            "scores": {player: 0},
-            "current_answers": {},
-            "game_active": False,
-        }
+        ROOMS[room_name] = new_quiz_room(
+            [player], {player: self.user_id}, {player: self.channel_name}, config, arena=arena,
+        )
 
         self.room_name = room_name
         self.player_name = player
 
-        await self.channel_layer.group_add(room_name, self.channel_name)
+        await self.join_group(room_name)
 
-        await self.send(json.dumps({
+        await self.send_frame({
             "event": "created",
             "room": room_name,
             "players": ROOMS[room_name]["players"],
-        }))
+            "mode": "arena" if arena else "duel",
+            "max_players": ROOMS[room_name]["max_players"],
+            "token": self.new_resume_token(ROOMS[room_name], player),
+        })
 
     async def handle_join(self, data):
-        """Second player joins an existing room."""
+        """Second player joins an existing room (or anyone, up to the limit, in an arena)."""
         room_name = data.get("room")
         player = data.get("player", "Player2")
 
         if not room_name or room_name not in ROOMS:
-            await self.send(json.dumps({"error": "Room not found"}))
+            await self.send_frame({"error": "Room not found"})
             return
 
         room = ROOMS[room_name]
 
-        if len(room["players"]) >= 2:
-            await self.send(json.dumps({"error": "Room is full"}))
+        if len(room["players"]) >= room["max_players"]:
+            await self.send_frame({"error": "Room is full"})
+            return
+
+        if room["arena"] is not None and room["game_active"]:
+            await self.send_frame({"error": "Game already started"})
             return
 
         # If duplicate name, make it unique
-        if player in room["players"]:
-            player = f"{player}_{random.randint(1, 99)}"
+        base_name = player
+        while player in room["user_ids"]:
+            player = f"{base_name}_{random.randint(1, 999)}"
 
         room["players"].append(player)
         room["scores"][player] = 0
+        room["user_ids"][player] = self.user_id
+        room["channels"][player] = self.channel_name
 
         self.room_name = room_name
         self.player_name = player
 
-        await self.channel_layer.group_add(room_name, self.channel_name)
+        await self.join_group(room_name)
+
+        await self.send_frame({
+            "event": "joined",
+            "room": room_name,
+            "player": player,
+            "mode": "duel" if room["arena"] is None else "arena",
+            "token": self.new_resume_token(room, player),
+        })
+
+        if room["arena"] is not None:
+            room["arena"].add_player(player)
+            # One lobby update per interval instead of the whole list on every join
+            def lobby():
+                return {
+                    "event": "player_joined",
+                    "players": room["players"][-ARENA_TOP_K:],
+                    "count": len(room["players"]),
+                    "player": room["players"][-1],
+                }
+
+            await self.throttled_broadcast(room_name, "lobby", lobby)
+            self.to_spectators(room, "players", lobby())
+            return
 
         # Notify both players
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "player_joined_event",
-                "players": room["players"],
-                "player": player,
-            }
-        )
+        joined = {
+            "event": "player_joined",
+            "players": room["players"],
+            "player": player,
+        }
+        await self.broadcast(room_name, joined)
+        self.to_spectators(room, "players", joined)
 
         # Start game when 2 players in room
         if len(room["players"]) == 2:
             await self.start_game(room_name)
 
+    async def create_match(self, ticket, opponent):
+        """Matchmaking paired two players: a duel room with its questions already picked."""
+        config = {
+            "topic": ticket["topic"],
+            "difficulty": ticket["difficulty"],
+            "num_questions": 5,
+        }
+        sides = (ticket, opponent)
+        room = new_quiz_room(
+            [t["player"] for t in sides],
+            {t["player"]: t["user_id"] for t in sides},
+            {t["player"]: t["channel"] for t in sides},
+            config,
+        )
+        room["questions"] = await self.get_questions(**config)
+        room["matched"] = set()
+        room_name = unused_room_name("room", ROOMS)
+        ROOMS[room_name] = room
+        return room_name
+
+    async def join_match(self, room_name, player):
+        room = ROOMS.get(room_name)
+        if room is None:
+            # Rooms are per process; the other side's worker must serve this player
+            await self.send_frame({"error": "Matched room is not available on this server"})
+            return
+        self.room_name = room_name
+        self.player_name = player
+        room["channels"][player] = self.channel_name
+        await self.join_group(room_name)
+        await self.send_frame({
+            "event": "matched",
+            "room": room_name,
+            "player": player,
+            "players": room["players"],
+            "mode": "duel",
+            "token": self.new_resume_token(room, player),
+        })
+        room["matched"].add(player)
+        if len(room["matched"]) == len(room["players"]):
+            await self.start_game(room_name)
+
+    async def handle_start(self, data):
+        """The host starts an arena game whenever enough players are in."""
+        room = ROOMS.get(getattr(self, "room_name", None))
+        if not room or room["arena"] is None or room["game_active"]:
+            return
+        if room["host"] != self.player_name:
+            await self.send_frame({"error": "Only the host can start the game"})
+            return
+        await self.start_game(self.room_name)
+
+    def on_resumed(self, room, player):
+        # Personal arena frames go to the player's current channel
+        room["channels"][player] = self.channel_name
+
+    def spectator_snapshot(self, room_name, room):
+        """Current state for a spectator who just arrived (or a player resuming)."""
+        board = room["arena"]
+        snapshot = {
+            "mode": "duel" if board is None else "arena",
+            "players": room["players"][-ARENA_TOP_K:] if board is not None else room["players"],
+            "count": len(room["players"]),
+            "game_active": room["game_active"],
+        }
+        if board is not None:
+            snapshot["top"] = board.top(ARENA_TOP_K)
+        else:
+            snapshot["scores"] = room["scores"]
+
+        idx = room["current_q_index"]
+        if room["game_active"] and idx < len(room["questions"]):
+            q = room["questions"][idx]
+            snapshot["question"] = {
+                "question_text": q["question_text"],
+                "options": q["options"],
+                "order": idx + 1,
+                "total": len(room["questions"]),
+            }
+        return snapshot
+
+    async def throttled_broadcast(self, room_name, key, build):
+        """
+        Broadcast build() at most once per ARENA_BROADCAST_INTERVAL. Calls in
+        between are folded into one trailing broadcast of the latest state.
+        """
+        room = ROOMS[room_name]
+        state = room["throttle"].setdefault(key, {"last": 0.0, "task": None})
+        if state["task"] is not None:
+            return
+
+        wait = state["last"] + ARENA_BROADCAST_INTERVAL - time.monotonic()
+        if wait <= 0:
+            state["last"] = time.monotonic()
+            await self.broadcast(room_name, build())
+            return
+
+        async def trailing():
+            await asyncio.sleep(wait)
+            state["task"] = None
+            state["last"] = time.monotonic()
+            await self.broadcast(room_name, build())
+
+        state["task"] = asyncio.create_task(trailing())
+
     async def start_game(self, room_name):
         """Fetch questions from DB and start the quiz."""
         room = ROOMS[room_name]
         room["game_active"] = True
-
-        questions = await self.get_questions(
-            topic=room["config"]["topic"],
-            difficulty=room["config"]["difficulty"],
-            num_questions=room["config"]["num_questions"],
-        )
-
-        room["questions"] = questions
+        room["started_at"] = timezone.now()
+
+        # Matchmade rooms picked their questions when the pair was made
+        if not room["questions"]:
+            room["questions"] = await self.get_questions(
+                topic=room["config"]["topic"],
+                difficulty=room["config"]["difficulty"],
+                num_questions=room["config"]["num_questions"],
+            )
         await self.send_question(room_name)
 
     @database_sync_to_async
@@ -144,7 +381,7 @@ class QuizConsumer(AsyncWebsocketConsumer):
         if topic != "any":
             qs = qs.filter(category__iexact=topic)
         if difficulty != "any":
-            qs = qs.filter(difficulty__iexact=difficulty)
+            qs = qs.filter(difficulty=difficulty.lower())
 
         qs = qs.order_by("?")[:num_questions]
 
@@ -186,17 +423,26 @@ class QuizConsumer(AsyncWebsocketConsumer):
 
         q = room["questions"][idx]
         room["current_answers"] = {}
+        room["question_sent_at"] = time.monotonic()
 
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "question_event",
-                "question_text": q["question_text"],
-                "options": q["options"],
-                "order": idx + 1,
-                "total": len(room["questions"]),
-            }
-        )
+        frame = {
+            "event": "question",
+            "question_text": q["question_text"],
+            "options": q["options"],
+            "order": idx + 1,
+            "total": len(room["questions"]),
+        }
+
+        if room["arena"] is not None:
+            room["arena"].open_question(q["correct_option"], room["question_sent_at"])
+            frame["time_limit"] = ARENA_QUESTION_TIME
+            await self.broadcast(room_name, frame)
+            self.to_spectators(room, "question", frame)
+            room["close_task"] = asyncio.create_task(self.close_after_timeout(room_name, idx))
+            return
+
+        await self.broadcast(room_name, frame)
+        self.to_spectators(room, "question", frame)
 
     async def handle_answer(self, data):
         """Handle answer from a player."""
@@ -211,6 +457,10 @@ class QuizConsumer(AsyncWebsocketConsumer):
         if not room["game_active"]:
             return
 
+        if room["arena"] is not None:
+            await self.handle_arena_answer(room_name, room, selected_idx)
+            return
+
         # Ignore if this player already answered
         if player in room["current_answers"]:
             return
@@ -224,69 +474,181 @@ class QuizConsumer(AsyncWebsocketConsumer):
         if is_correct:
             # simple +10 score
             room["scores"][player] += 10
+            self.to_spectators(room, "scores", {"event": "scores", "scores": dict(room["scores"])})
+
+        # Kept for the write-behind queue, persisted after the game ends
+        room["answers"].append({
+            "player": player,
+            "question_id": q["id"],
+            "selected": selected_idx if isinstance(selected_idx, int) else None,
+            "is_correct": is_correct,
+            "response_time_ms": int((time.monotonic() - room["question_sent_at"]) * 1000),
+            "answered_at": timezone.now(),
+        })
 
         # When all players answered, go to next question
         if len(room["current_answers"]) == len(room["players"]):
             room["current_q_index"] += 1
             await self.send_question(room_name)
 
+    async def handle_arena_answer(self, room_name, room, selected_idx):
+        """O(1) per answer; the room hears a throttled count, not every answer."""
+        board = room["arena"]
+        # Trust the connection's seat, not the "player" field in the message
+        if not board.answer(self.player_name, selected_idx, time.monotonic()):
+            return
+
+        if board.all_answered:
+            await self.close_arena_question(room_name, room["current_q_index"])
+            return
+
+        order = room["current_q_index"] + 1
+
+        def progress():
+            return {
+                "event": "progress",
+                "order": order,
+                "answered": board.answer_count,
+                "players": len(board),
+            }
+
+        await self.throttled_broadcast(room_name, "progress", progress)
+        self.to_spectators(room, "progress", progress())
+
+    async def close_after_timeout(self, room_name, idx):
+        await asyncio.sleep(ARENA_QUESTION_TIME)
+        await self.close_arena_question(room_name, idx)
+
+    async def close_arena_question(self, room_name, idx):
+        """Score the question in one pass, send top-K standings and each player's own rank."""
+        room = ROOMS.get(room_name)
+        if not room or not room["game_active"] or room["current_q_index"] != idx:
+            return  # already closed (timer and last answer raced)
+        room["current_q_index"] += 1
+
+        task = room.pop("close_task", None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        pending = room["throttle"].pop("progress", None)
+        if pending and pending["task"] is not None:
+            pending["task"].cancel()
+
+        board = room["arena"]
+        q = room["questions"][idx]
+        points = board.close_question(ARENA_QUESTION_TIME * 1000)
+
+        now = timezone.now()
+        for name, selected, is_correct, ms in board.answers():
+            room["answers"].append({
+                "player": name,
+                "question_id": q["id"],
+                "selected": selected,
+                "is_correct": is_correct,
+                "response_time_ms": ms,
+                "answered_at": now,
+            })
+
+        standings = {
+            "event": "standings",
+            "order": idx + 1,
+            "correct_option": q["correct_option"],
+            "top": board.top(ARENA_TOP_K),
+            "players": len(board),
+        }
+        await self.broadcast(room_name, standings)
+        self.to_spectators(room, "standings", standings)
+
+        # One small frame per player: linear in room size. Each is recorded for
+        # its player, so a reconnect replays the ranks it missed; the buffer
+        # grows to keep a question's worth of them next to the room frames.
+        ranks = board.ranks()
+        replay = room["replay"]
+        replay.reserve(getattr(settings, "RESUME_BUFFER_SIZE", 200) + 2 * len(board))
+        for seat, name in enumerate(board.names):
+            payload = replay.record({
+                "event": "your_rank",
+                "order": idx + 1,
+                "rank": ranks[seat],
+                "score": board.totals[seat],
+                "points": points[seat],
+                "players": len(board),
+            }, to=name)
+            channel = room["channels"].get(name)
+            if channel is None:
+                continue  # disconnected: gets it on resume
+            await self.channel_layer.send(channel, {
+                "type": "broadcast_frame",
+                "text": encode_frame(payload),
+            })
+
+        await self.send_question(room_name)
+
     async def finish_game(self, room_name):
         """Send final scores and update basic stats."""
         room = ROOMS[room_name]
         room["game_active"] = False
 
-        scores = room["scores"]
-        max_score = max(scores.values())
-        winners = [p for p, s in scores.items() if s == max_score]
-
-        results = {
-            "scores": scores,
-            "winners": winners,
-        }
-
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "finished_event",
-                "results": results,
+        board = room["arena"]
+        if board is not None:
+            # Persist every player, but only broadcast the top K
+            scores = dict(zip(board.names, board.totals))
+            top = board.top(ARENA_TOP_K)
+            max_score = top[0][1] if top else 0
+            winners = [p for p, s in scores.items() if s == max_score]
+            results = {
+                "scores": dict(top),
+                "winners": winners,
+                "players": len(board),
             }
-        )
+        else:
+            scores = room["scores"]
+            max_score = max(scores.values())
+            winners = [p for p, s in scores.items() if s == max_score]
 
-        # Simple stats update (optional)
-        for player_name, score in scores.items():
-            try:
-                username = player_name.split("_")[0]
-                user = await database_sync_to_async(CustomUser.objects.get)(
-                    username=username
-                )
-                won = (player_name in winners)
-                await database_sync_to_async(user.update_stats)(score, won=won)
-            except Exception as e:
-                logger.error(f"Error updating stats for {player_name}: {e}")
-
-    # --- Events sent to clients ---
-
-    async def player_joined_event(self, event):
-        await self.send(json.dumps({
-            "event": "player_joined",
-            "players": event["players"],
-            "player": event["player"],
-        }))
+            results = {
+                "scores": scores,
+                "winners": winners,
+            }
 
-    async def question_event(self, event):
-        await self.send(json.dumps({
-            "event": "question",
-            "question_text": event["question_text"],
-            "options": event["options"],
-            "order": event["order"],
-            "total": event["total"],
-        }))
-
-    async def finished_event(self, event):
-        await self.send(json.dumps({
+        finished = {
             "event": "finished",
-            "results": event["results"],
-        }))
+            "results": results,
+        }
+        await self.broadcast(room_name, finished)
+        self.to_spectators(room, "finished", finished, urgent=True)
+
+        # Sessions, scores, answers and user stats are written in the background
+        if board is not None:
+            correct = dict(zip(board.names, board.correct))
+            answered = dict(zip(board.names, board.answered))
+        else:
+            correct = {p: 0 for p in scores}
+            answered = {p: 0 for p in scores}
+            for answer in room["answers"]:
+                answered[answer["player"]] = answered.get(answer["player"], 0) + 1
+                if answer["is_correct"]:
+                    correct[answer["player"]] = correct.get(answer["player"], 0) + 1
+
+        enqueue_game_result({
+            "mode": "multiplayer",
+            "room": room_name,
+            "difficulty": room["config"]["difficulty"],
+            "started_at": room.get("started_at"),
+            "finished_at": timezone.now(),
+            "question_ids": [q["id"] for q in room["questions"]],
+            "players": [
+                {
+                    "name": p,
+                    "user_id": room["user_ids"].get(p),
+                    "score": score,
+                    "correct": correct.get(p, 0),
+                    "total": answered.get(p, 0),
+                    "won": p in winners,
+                }
+                for p, score in scores.items()
+            ],
+            "answers": room["answers"],
+        })
 
 
 # ------------------------------
@@ -296,13 +658,34 @@ class QuizConsumer(AsyncWebsocketConsumer):
 BATTLES = {}
 
 
-class CodingBattleConsumer(AsyncWebsocketConsumer):
+def new_battle(players, user_ids, problem):
+    return {
+        "players": list(players),
+        "problem": problem,
+        "submissions": {},
+        "user_ids": dict(user_ids),
+        "game_active": False,
+        "code_sync": CodeSync(),
+        "tokens": {},
+        "replay": ReplayBuffer(),
+    }
+
+
+class CodingBattleConsumer(MatchmakingMixin, ResumeMixin, SpectatorMixin, BroadcastMixin, AsyncWebsocketConsumer):
+    spectator_rooms = BATTLES
+    resume_rooms = BATTLES
+    queue_game = "battle"
+
     async def connect(self):
+        self.user_id = scope_user_id(self.scope)
         await self.accept()
         logger.info("CodingBattle WebSocket connected")
 
     async def disconnect(self, close_code):
         logger.info(f"CodingBattle WebSocket disconnected: {close_code}")
+        await self.stop_spectating()
+        await self.leave_queue()
+        await self.leave_groups()
 
     async def receive(self, text_data=None, bytes_data=None):
         try:
@@ -312,15 +695,32 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
 
         action = data.get("action")
 
+        # Spectators are read-only
+        if getattr(self, "spectating", None):
+            return
+
         if action == "create":
             await self.handle_create(data)
         elif action == "join":
             await self.handle_join(data)
+        elif action == "spectate":
+            await self.handle_spectate(data)
+        elif action == "resume":
+            await self.handle_resume(data)
+        elif action == "queue":
+            await self.handle_queue(data)
+        elif action == "leave_queue":
+            await self.leave_queue()
         elif action == "submit":
             await self.handle_submit(data)
+        elif action == "ack_code":
+            self.handle_ack_code(data)
+        elif action == "code_sync":
+            await self.handle_code_sync(data)
+        elif action == "result_details":
+            await self.handle_result_details(data)
 
     async def handle_create(self, data):
-        room_name = f"battle_{random.randint(1000, 9999)}"
         player = data.get("player", "Player")
         difficulty = data.get("difficulty", "mixed")
 
@@ -329,24 +729,22 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
         if not problem:
             problem = await self.get_random_problem(difficulty)
 
-        BATTLES[room_name] = {
-            "players": [player],
-            "problem": problem,
-            "submissions": {},
-            "game_active": False,
-        }
+        room_name = unused_room_name("battle", BATTLES)
+        BATTLES[room_name] = new_battle([player], {player: self.user_id}, problem)
 
         self.room_name = room_name
         self.player_name = player
+        self.compress = bool(data.get("compress"))
 
-        await self.channel_layer.group_add(room_name, self.channel_name)
+        await self.join_group(room_name)
 
-        await self.send(json.dumps({
+        await self.send_frame({
             "event": "created",
             "room": room_name,
             "players": BATTLES[room_name]["players"],
             "problem": self.serialize_problem(problem),
-        }))
+            "token": self.new_resume_token(BATTLES[room_name], player),
+        })
 
     async def handle_join(self, data):
         room_name = data.get("room")
@@ -366,42 +764,77 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
             player = f"{player}_{random.randint(1, 99)}"
 
         battle["players"].append(player)
+        battle["user_ids"][player] = self.user_id
 
         self.room_name = room_name
         self.player_name = player
+        self.compress = bool(data.get("compress"))
 
-        await self.channel_layer.group_add(room_name, self.channel_name)
+        await self.join_group(room_name)
 
-        await self.send(json.dumps({
+        await self.send_frame({
             "event": "joined",
             "room": room_name,
             "player": player,
-        }))
-
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "player_joined_event",
-                "players": battle["players"],
-                "player": player,
-            }
-        )
+            "token": self.new_resume_token(battle, player),
+        })
+
+        joined = {
+            "event": "player_joined",
+            "players": battle["players"],
+            "player": player,
+        }
+        await self.broadcast(room_name, joined)
+        self.to_spectators(battle, "players", joined)
 
         # Start battle when 2 players are inside
         if len(battle["players"]) == 2:
             await self.start_battle(room_name)
 
+    async def create_match(self, ticket, opponent):
+        """Matchmaking paired two players: a battle with its problem already picked."""
+        difficulty = ticket["difficulty"] if ticket["difficulty"] != "any" else "mixed"
+        battle = new_battle(
+            [ticket["player"], opponent["player"]],
+            {t["player"]: t["user_id"] for t in (ticket, opponent)},
+            await self.get_random_problem(difficulty),
+        )
+        battle["matched"] = set()
+        room_name = unused_room_name("battle", BATTLES)
+        BATTLES[room_name] = battle
+        return room_name
+
+    async def join_match(self, room_name, player):
+        battle = BATTLES.get(room_name)
+        if battle is None:
+            # Rooms are per process; the other side's worker must serve this player
+            await self.send_frame({"error": "Matched room is not available on this server"})
+            return
+        self.room_name = room_name
+        self.player_name = player
+        await self.join_group(room_name)
+        await self.send_frame({
+            "event": "matched",
+            "room": room_name,
+            "player": player,
+            "players": battle["players"],
+            "token": self.new_resume_token(battle, player),
+        })
+        battle["matched"].add(player)
+        if len(battle["matched"]) == len(battle["players"]):
+            await self.start_battle(room_name)
+
     async def start_battle(self, room_name):
         battle = BATTLES[room_name]
         battle["game_active"] = True
+        battle["started_at"] = timezone.now()
 
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "battle_started_event",
-                "problem": self.serialize_problem(battle["problem"]),
-            }
-        )
+        started = {
+            "event": "battle_started",
+            "problem": self.serialize_problem(battle["problem"]),
+        }
+        await self.broadcast(room_name, started)
+        self.to_spectators(battle, "battle_started", started)
 
     async def handle_submit(self, data):
         """Run user's code with Judge0 and send back results."""
@@ -427,14 +860,12 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
         passed_count = 0
 
         # Inform both sides that this player is running code
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "submission_event",
-                "player": player,
-                "status": "running",
-            }
-        )
+        running = {
+            "event": "opponent_running",
+            "player": player,
+        }
+        await self.broadcast(room_name, running, exclude=player)
+        self.to_spectators(battle, f"status:{player}", running)
 
         total_runtime = 0.0
 
@@ -472,24 +903,39 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
             "submission_time": submission_time,
         }
 
-        await self.send(json.dumps({
+        bits = results_bitmap(results)
+
+        # Per-case details are fetched with result_details when the client wants them
+        await self.send_personal({
             "event": "submission_result",
             "passed": passed_count,
             "total": len(test_cases),
-            "results": results,
-        }))
-
-        # Inform opponent about result
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "opponent_submission_event",
-                "player": player,
-                "passed": passed_count,
-                "total": len(test_cases),
-                "code": source_code,
-            }
-        )
+            "bits": bits,
+        })
+
+        # Inform opponent about result; code goes as a diff against what they acked
+        code_sync = battle["code_sync"]
+        code_sync.update(player, source_code)
+        opponent = next((p for p in battle["players"] if p != player), None)
+        frame = {
+            "event": "opponent_result",
+            "player": player,
+            "passed": passed_count,
+            "total": len(test_cases),
+            "bits": bits,
+        }
+        if opponent is not None:
+            frame.update(code_sync.frame_for(opponent, player))
+        await self.broadcast(room_name, frame, exclude=player)
+
+        # Spectators get the code as a diff, separately from the result
+        self.code_to_spectators(battle, player, source_code)
+        self.to_spectators(battle, f"status:{player}", {
+            "event": "opponent_result",
+            "player": player,
+            "passed": passed_count,
+            "total": len(test_cases),
+        })
 
         # Check winner when both players have submitted
         if len(battle["submissions"]) == 2:
@@ -538,28 +984,80 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
         battle = BATTLES[room_name]
         battle["game_active"] = False
 
-        await self.channel_layer.group_send(
-            room_name,
-            {
-                "type": "game_over_event",
-                "winner": winner,
-                "reason": reason,
-                "submissions": battle["submissions"],
-            }
-        )
+        # Summaries only; code and per-case details are available on request
+        game_over = {
+            "event": "game_over",
+            "winner": winner,
+            "reason": reason,
+            "submissions": {p: submission_summary(sub) for p, sub in battle["submissions"].items()},
+        }
+        await self.broadcast(room_name, game_over)
+        self.to_spectators(battle, "game_over", game_over, urgent=True)
 
-        # Simple stats update
-        for player_name in battle["players"]:
-            try:
-                username = player_name.split("_")[0]
-                user = await database_sync_to_async(CustomUser.objects.get)(
-                    username=username
-                )
-                is_win = (player_name == winner)
-                score = 100 if is_win else 20
-                await database_sync_to_async(user.update_stats)(score, won=is_win)
-            except Exception as e:
-                logger.error(f"Error updating stats for {player_name}: {e}")
+        # Session, scores and user stats are written in the background
+        submissions = battle["submissions"]
+        enqueue_game_result({
+            "mode": "coding_battle",
+            "room": room_name,
+            "difficulty": getattr(battle["problem"], "difficulty", None),
+            "started_at": battle.get("started_at"),
+            "finished_at": timezone.now(),
+            "players": [
+                {
+                    "name": p,
+                    "user_id": battle["user_ids"].get(p),
+                    "score": 100 if p == winner else 20,
+                    "correct": submissions.get(p, {}).get("passed", 0),
+                    "total": submissions.get(p, {}).get("total", 0),
+                    "won": p == winner,
+                }
+                for p in battle["players"]
+            ],
+        })
+
+    def handle_ack_code(self, data):
+        """The client applied a code diff; later diffs are relative to this version."""
+        battle = BATTLES.get(getattr(self, "room_name", None))
+        if battle is None or not isinstance(data.get("version"), int):
+            return
+        battle["code_sync"].ack(self.player_name, data.get("player"), data["version"])
+
+    async def handle_code_sync(self, data):
+        """Full copy of a player's latest code, for a client whose copy is out of step."""
+        battle = BATTLES.get(getattr(self, "room_name", None))
+        author = data.get("player")
+        if battle is None or author not in battle["players"]:
+            return
+        await self.send_frame({"event": "code_sync", "player": author, **battle["code_sync"].full_frame(author)})
+
+    async def handle_result_details(self, data):
+        """
+        Per-case results on demand. Your own at any time, the opponent's once
+        the battle is over. `cases` limits the reply to those indexes.
+        """
+        battle = BATTLES.get(getattr(self, "room_name", None))
+        if battle is None:
+            return
+        player = data.get("player") or self.player_name
+        if player != self.player_name and battle["game_active"]:
+            await self.send_frame({"event": "error", "message": "Opponent details are available after the battle"})
+            return
+
+        submission = battle["submissions"].get(player)
+        if submission is None:
+            return
+        results = submission["results"]
+        wanted = data.get("cases")
+        if not isinstance(wanted, list):
+            wanted = range(len(results))
+        await self.send_frame({
+            "event": "result_details",
+            "player": player,
+            "cases": [
+                {"case": i, **results[i]}
+                for i in wanted if isinstance(i, int) and 0 <= i < len(results)
+            ],
+        })
 
     # ---- DB helpers ----
 
@@ -567,14 +1065,28 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
     def get_random_problem(self, difficulty):
         qs = CodingProblem.objects.all()
         if difficulty != "mixed":
-            qs = qs.filter(difficulty__iexact=difficulty)
+            qs = qs.filter(difficulty=difficulty.lower())
         return qs.order_by("?").first()
 
     @database_sync_to_async
     def get_specific_problem(self, title):
         return CodingProblem.objects.filter(title__iexact=title).first()
 
-    # ---- Serialization and events ----
+    # ---- Serialization ----
+
+    def spectator_snapshot(self, room_name, battle):
+        relay = battle.get("relay")
+        return {
+            "players": battle["players"],
+            "game_active": battle["game_active"],
+            "problem": self.serialize_problem(battle["problem"]) if battle["game_active"] else {},
+            # Baseline for the code diffs that follow
+            "code": relay.snapshot_code() if relay is not None else {},
+            "submissions": {
+                p: {"passed": sub["passed"], "total": sub["total"]}
+                for p, sub in battle["submissions"].items()
+            },
+        }
 
     def serialize_problem(self, problem):
         if not problem:
@@ -585,41 +1097,3 @@ class CodingBattleConsumer(AsyncWebsocketConsumer):
             "starter_code": problem.starter_code,
             "test_cases": problem.test_cases,
         }
-
-    async def player_joined_event(self, event):
-        await self.send(json.dumps({
-            "event": "player_joined",
-            "players": event["players"],
-            "player": event["player"],
-        }))
-
-    async def battle_started_event(self, event):
-        await self.send(json.dumps({
-            "event": "battle_started",
-            "problem": event["problem"],
-        }))
-
-    async def submission_event(self, event):
-        if event["player"] != self.player_name:
-            await self.send(json.dumps({
-                "event": "opponent_running",
-                "player": event["player"],
-            }))
-
-    async def opponent_submission_event(self, event):
-        if event["player"] != self.player_name:
-            await self.send(json.dumps({
-                "event": "opponent_result",
-                "player": event["player"],
-                "passed": event["passed"],
-                "total": event["total"],
-                "code": event["code"],
-            }))
-
-    async def game_over_event(self, event):
-        await self.send(json.dumps({
-            "event": "game_over",
-            "winner": event["winner"],
-            "reason": event["reason"],
-            "submissions": event["submissions"],
-        }))
@@ -0,0 +1,102 @@
+"""
+Dashboard data with a per-user cache.
+
+All stats come from one aggregate() and the recent/trend lists from one
+query. The result is cached per user and dropped whenever one of that
+user's PlayerScore rows is saved or deleted (see quiz/signals.py), so a
+repeated dashboard load is a single cache hit.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, Max, Sum
+
+from .models import PlayerScore
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, "DASHBOARD_CACHE_TIMEOUT", 15 * 60)
+
+
+def dashboard_cache_key(user_id):
+    return f"dashboard:{user_id}"
+
+
+def build_dashboard_payload(user_id):
+    """Two queries: one aggregate, one for the last 10 games."""
+    user_scores = PlayerScore.objects.filter(player_id=user_id)
+
+    totals = user_scores.aggregate(
+        total_quizzes=Count("id"),
+        avg_score=Avg("score"),
+        best_score=Max("score"),
+        total_questions=Sum("total_answers"),
+        total_correct=Sum("correct_answers"),
+    )
+    total_questions = totals["total_questions"] or 0
+    total_correct = totals["total_correct"] or 0
+
+    win_rate = 0
+    if total_questions > 0:
+        win_rate = (total_correct / total_questions) * 100
+
+    stats = {
+        "total_quizzes": totals["total_quizzes"],
+        "average_score": round(totals["avg_score"] or 0, 1),
+        "best_score": totals["best_score"] or 0,
+        "total_questions": total_questions,
+        "win_rate": round(win_rate, 1),
+    }
+
+    # Newest 10 games: the first 5 are the recent list, all 10 (oldest first) the trend.
+    # joined_at (set when the score row is written, with or just after its session)
+    # keeps the sort inside playerscore_player_recent_idx instead of a temp B-tree.
+    latest = list(
+        user_scores.order_by("-joined_at").values(
+            "score", "correct_answers", "total_answers",
+            "session__created_at", "session__session_type",
+        )[:10]
+    )
+
+    recent_quizzes = []
+    for row in latest[:5]:
+        total = row["total_answers"]
+        recent_quizzes.append({
+            "date": row["session__created_at"],
+            "score": row["score"],
+            "accuracy": (row["correct_answers"] / total) * 100 if total else 0.0,
+            "mode": row["session__session_type"],
+        })
+
+    trend = list(reversed(latest))
+    return {
+        "stats": stats,
+        "recent_quizzes": recent_quizzes,
+        "trend_dates": [row["session__created_at"].strftime("%m/%d") for row in trend],
+        "trend_scores": [row["score"] for row in trend],
+    }
+
+
+def get_dashboard_payload(user_id):
+    key = dashboard_cache_key(user_id)
+    try:
+        payload = cache.get(key)
+    except Exception:
+        payload = None
+    if payload is not None:
+        return payload
+
+    payload = build_dashboard_payload(user_id)
+    try:
+        cache.set(key, payload, DASHBOARD_CACHE_TIMEOUT)
+    except Exception:
+        pass
+    return payload
+
+
+def invalidate_dashboard(*user_ids):
+    try:
+        cache.delete_many([dashboard_cache_key(uid) for uid in user_ids])
+    except Exception as e:
+        logger.warning(f"Could not invalidate dashboard cache for {user_ids}: {e}")
@@ -0,0 +1,186 @@
+"""
+Prompt-level cache for AI question generation.
+
+Popular (topic, difficulty, num_questions) requests hit Gemini over and over.
+GenerationCache keeps the validated batch for each prompt in the Django cache,
+hands out slices of it (skipping questions the requesting user has already
+seen), and counts hits and misses.
+
+Each prompt has a cursor advanced with cache.incr, which is atomic on every
+Django cache backend, so concurrent requests for the same prompt start at
+different offsets and get different slices instead of the same first N.
+
+The key index that enforces max_entries is read-modify-written under a
+short lock taken with cache.add (also atomic everywhere), so two workers
+storing at once can't drop each other's keys from it. Hit/miss counts are
+served at /question-cache/stats/.
+"""
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.functions import Lower
+
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+# Index lock: how long a holder may keep it (seconds) and how long others wait for it
+INDEX_LOCK_TIMEOUT = 5
+INDEX_LOCK_WAIT = 0.5
+
+
+class GenerationCache:
+    KEY_PREFIX = "qgen"
+
+    def __init__(self, timeout=None, max_entries=None, max_batch_size=None):
+        self.timeout = timeout or getattr(settings, "QUESTION_CACHE_TIMEOUT", 6 * 60 * 60)
+        self.max_entries = max_entries or getattr(settings, "QUESTION_CACHE_MAX_ENTRIES", 500)
+        self.max_batch_size = max_batch_size or getattr(settings, "QUESTION_CACHE_MAX_BATCH", 50)
+
+    # ---- keys ----
+
+    def make_key(self, topic, difficulty, num_questions):
+        raw = f"{(topic or '').strip().lower()}|{(difficulty or '').strip().lower()}|{num_questions}"
+        return f"{self.KEY_PREFIX}:batch:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    @staticmethod
+    def _cursor_key(key):
+        return f"{key}:cursor"
+
+    @property
+    def _index_key(self):
+        return f"{self.KEY_PREFIX}:index"
+
+    # ---- safe cache access (a cache outage must never break generation) ----
+
+    @staticmethod
+    def _get(key, default=None):
+        try:
+            return cache.get(key, default)
+        except Exception:
+            return default
+
+    @staticmethod
+    def _set(key, value, timeout):
+        try:
+            cache.set(key, value, timeout)
+        except Exception:
+            pass
+
+    def _incr(self, name):
+        key = f"{self.KEY_PREFIX}:stats:{name}"
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception:
+            pass
+
+    def _next_offset(self, key, step):
+        """Claim the next slice offset for a prompt; 0 if the cache is down."""
+        cursor = self._cursor_key(key)
+        try:
+            cache.add(cursor, 0, self.timeout)
+            return (cache.incr(cursor) - 1) * step
+        except Exception:
+            return 0
+
+    # ---- public API ----
+
+    def get_slice(self, topic, difficulty, num_questions, user=None):
+        """
+        Return num_questions cached questions the user hasn't seen yet,
+        or None on a miss (nothing cached, or not enough unseen questions).
+        """
+        key = self.make_key(topic, difficulty, num_questions)
+        batch = self._get(key)
+        if batch:
+            seen = used_question_texts(user)
+            fresh = [q for q in batch if q["question"].lower() not in seen]
+            if len(fresh) >= num_questions:
+                self._incr("hits")
+                start = self._next_offset(key, num_questions) % len(fresh)
+                return (fresh[start:] + fresh[:start])[:num_questions]
+
+        self._incr("misses")
+        return None
+
+    def store(self, topic, difficulty, num_questions, questions):
+        """Merge a newly generated batch into the cached one for this prompt."""
+        if not questions:
+            return
+
+        key = self.make_key(topic, difficulty, num_questions)
+        batch = self._get(key) or []
+        known = {q["question"].lower() for q in batch}
+        for q in questions:
+            if q["question"].lower() not in known:
+                known.add(q["question"].lower())
+                batch.append(q)
+
+        # Keep the newest questions when the batch grows past the cap
+        self._set(key, batch[-self.max_batch_size:], self.timeout)
+        self._touch(key)
+
+    def _lock_index(self):
+        """Take the index lock; False if the cache is down or another worker held it too long."""
+        deadline = time.monotonic() + INDEX_LOCK_WAIT
+        while True:
+            try:
+                if cache.add(f"{self._index_key}:lock", 1, INDEX_LOCK_TIMEOUT):
+                    return True
+            except Exception:
+                return False
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+
+    def _touch(self, key):
+        """Track keys in insertion order and evict the oldest past max_entries."""
+        if not self._lock_index():
+            # Untracked, the batch still expires after self.timeout
+            logger.warning(f"Question cache index busy, {key} not tracked for eviction")
+            return
+        try:
+            index = [k for k in self._get(self._index_key, []) if k != key]
+            index.append(key)
+            evicted, index = index[:-self.max_entries], index[-self.max_entries:]
+            if evicted:
+                try:
+                    cache.delete_many(evicted + [self._cursor_key(k) for k in evicted])
+                except Exception:
+                    pass
+            self._set(self._index_key, index, None)
+        finally:
+            try:
+                cache.delete(f"{self._index_key}:lock")
+            except Exception:
+                pass
+
+    def stats(self):
+        hits = self._get(f"{self.KEY_PREFIX}:stats:hits", 0) or 0
+        misses = self._get(f"{self.KEY_PREFIX}:stats:misses", 0) or 0
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total * 100, 1) if total else 0.0,
+            "entries": len(self._get(self._index_key, [])),
+        }
+
+
+def used_question_texts(user):
+    """Normalized text of every question the user has already played."""
+    if user is None or not getattr(user, "is_authenticated", False):
+        return set()
+
+    return set(
+        Question.objects.filter(sessionquestion__session__playerscore__player=user)
+        .annotate(normalized=Lower("question_text"))
+        .values_list("normalized", flat=True)
+    )
+
+
+GENERATION_CACHE = GenerationCache()
@@ -0,0 +1,80 @@
+"""
+Incremental parser for JSON arrays that arrive in pieces.
+
+Gemini streams its answer as arbitrary text chunks. Instead of joining every
+chunk and calling json.loads at the very end, JSONArrayStreamParser picks each
+top-level object out of the array as soon as its closing brace arrives, so the
+first question can be used while the rest is still being generated.
+"""
+import json
+
+
+class JSONArrayStreamParser:
+    """
+    Feed text chunks in, get completed top-level objects out.
+
+    Anything before the opening '[' (for example a ```json fence) is ignored,
+    as is anything after the closing ']'. Elements that are not objects, or
+    objects that fail to parse, are skipped.
+    """
+
+    def __init__(self):
+        self._partial = ""      # text of an object that spans chunks
+        self._depth = 0         # nesting depth inside the current element
+        self._in_string = False
+        self._escape = False
+        self.started = False    # seen the opening '['
+        self.finished = False   # seen the closing ']'
+
+    def feed(self, text):
+        """Consume one chunk and return the list of objects it completed."""
+        objects = []
+        if self.finished or not text:
+            return objects
+
+        start = 0 if self._depth > 0 else None
+
+        for i, ch in enumerate(text):
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif self._depth == 0:
+                # Between elements of the top-level array
+                if ch == "{":
+                    self._depth = 1
+                    start = i
+                elif ch == "]":
+                    self.finished = True
+                    break
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    raw = self._partial + text[start:i + 1]
+                    self._partial = ""
+                    start = None
+                    try:
+                        obj = json.loads(raw)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(obj, dict):
+                        objects.append(obj)
+
+        if self._depth > 0 and start is not None:
+            self._partial += text[start:]
+
+        return objects
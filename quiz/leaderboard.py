@@ -0,0 +1,396 @@
+"""
+Global leaderboard service.
+
+Scores live in a Redis sorted set so top-N, a user's rank and the players
+around them are all O(log N) lookups instead of an ORDER BY over the user
+table on every page view. CustomUser.update_stats pushes each new total here.
+
+Daily / weekly / monthly and per-mode boards are rolling buckets: every game
+adds its points to the current bucket of each window (ZINCRBY), and each
+bucket key expires a little after its period ends, so memory stays bounded
+and nothing scans PlayerScore per request.
+
+A board counts as warm once it has been loaded from the database
+(replace_all), not merely because it exists: the first ZADD after a deploy
+creates the key with a single user in it. Redis boards keep that state in a
+separate "<key>:warm" marker key.
+
+When Redis isn't reachable an in-process MemoryLeaderboard (a sorted list
+searched with bisect) is used instead; it warms itself from the database the
+first time it is used. `manage.py rebuild_leaderboard` rebuilds from the DB.
+"""
+import bisect
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_KEY = "leaderboard:all"
+
+MODES = ("single", "multiplayer", "coding_battle")
+
+# window -> (bucket id format, seconds a bucket is kept)
+WINDOWS = {
+    "daily": ("%Y-%m-%d", 2 * 24 * 60 * 60),
+    "weekly": ("%G-W%V", 15 * 24 * 60 * 60),
+    "monthly": ("%Y-%m", 62 * 24 * 60 * 60),
+}
+
+
+class MemoryLeaderboard:
+    """
+    Sorted list of (-score, user_id) pairs kept in this process.
+
+    Lookups (rank, top, around) are O(log N) bisects, but an update inserts
+    into and deletes from a Python list, which is an O(N) memmove. That is
+    cheap at the size of a single-process fallback; the Redis sorted set is
+    the O(log N) path for updates.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._scores = {}
+        self._lock = threading.Lock()
+        self.warmed = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, user_id):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            idx = bisect.bisect_left(self._entries, (-old, user_id))
+            del self._entries[idx]
+
+    def set_score(self, user_id, score):
+        with self._lock:
+            self._remove(user_id)
+            self._scores[user_id] = score
+            bisect.insort(self._entries, (-score, user_id))
+
+    def incr(self, user_id, delta):
+        with self._lock:
+            score = self._scores.get(user_id, 0) + delta
+            self._remove(user_id)
+            self._scores[user_id] = score
+            bisect.insort(self._entries, (-score, user_id))
+            return score
+
+    def remove(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def replace_all(self, pairs, ttl=None):
+        # ttl is for RedisLeaderboard parity; MemoryBuckets expires whole boards
+        with self._lock:
+            self._scores = dict(pairs)
+            self._entries = sorted((-score, uid) for uid, score in self._scores.items())
+            self.warmed = True
+
+    def top(self, n):
+        """[(user_id, score)] for the best n players."""
+        return [(uid, -neg) for neg, uid in self._entries[:n]]
+
+    def rank(self, user_id):
+        """1-based rank, or None if the user isn't on the board."""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect.bisect_left(self._entries, (-score, user_id)) + 1
+
+    def around(self, user_id, radius=2):
+        """[(rank, user_id, score)] for the user and `radius` players either side."""
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        window = self._entries[start:rank + radius]
+        return [(start + i + 1, uid, -neg) for i, (neg, uid) in enumerate(window)]
+
+
+class RedisLeaderboard:
+    """Same interface as MemoryLeaderboard, backed by a Redis sorted set."""
+
+    def __init__(self, client, key=LEADERBOARD_KEY):
+        self.client = client
+        self.key = key
+        self.warm_key = f"{key}:warm"
+
+    def __len__(self):
+        return self.client.zcard(self.key)
+
+    @property
+    def warmed(self):
+        return self.client.exists(self.warm_key) > 0
+
+    def set_score(self, user_id, score):
+        self.client.zadd(self.key, {str(user_id): score})
+
+    def incr(self, user_id, delta):
+        return int(self.client.zincrby(self.key, delta, str(user_id)))
+
+    def remove(self, user_id):
+        self.client.zrem(self.key, str(user_id))
+
+    def replace_all(self, pairs, ttl=None, chunk_size=5000):
+        """Load into a temporary key, then swap it in and mark the board warm atomically."""
+        tmp_key = f"{self.key}:rebuild"
+        self.client.delete(tmp_key)
+        chunk = {}
+        for user_id, score in pairs:
+            chunk[str(user_id)] = score
+            if len(chunk) >= chunk_size:
+                self.client.zadd(tmp_key, chunk)
+                chunk = {}
+        if chunk:
+            self.client.zadd(tmp_key, chunk)
+        pipe = self.client.pipeline()
+        if self.client.exists(tmp_key):
+            pipe.rename(tmp_key, self.key)
+        else:
+            pipe.delete(self.key)
+        pipe.set(self.warm_key, 1)
+        if ttl:
+            pipe.expire(self.key, ttl)
+            pipe.expire(self.warm_key, ttl)
+        pipe.execute()
+
+    def top(self, n):
+        rows = self.client.zrevrange(self.key, 0, n - 1, withscores=True)
+        return [(int(uid), int(score)) for uid, score in rows]
+
+    def rank(self, user_id):
+        rank = self.client.zrevrank(self.key, str(user_id))
+        return None if rank is None else rank + 1
+
+    def around(self, user_id, radius=2):
+        rank = self.rank(user_id)
+        if rank is None:
+            return []
+        start = max(rank - 1 - radius, 0)
+        rows = self.client.zrevrange(self.key, start, rank - 1 + radius, withscores=True)
+        return [(start + i + 1, int(uid), int(score)) for i, (uid, score) in enumerate(rows)]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _redis_client():
+    from django_redis import get_redis_connection
+
+    client = get_redis_connection("default")
+    client.ping()
+    return client
+
+
+def get_backend():
+    """
+    Pick the backend once per process: Redis when LEADERBOARD_BACKEND is
+    "redis" or "auto" (the default) and the server answers, memory otherwise.
+    """
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    with _backend_lock:
+        if _backend is None:
+            choice = getattr(settings, "LEADERBOARD_BACKEND", "auto")
+            backend = None
+            if choice in ("auto", "redis"):
+                try:
+                    backend = RedisLeaderboard(_redis_client())
+                except Exception as e:
+                    logger.warning(f"Leaderboard: Redis unavailable ({e}), using in-process fallback")
+            _backend = backend or MemoryLeaderboard()
+    return _backend
+
+
+_warm_checked = False
+
+
+def _warm(backend):
+    """Fill an empty board from the database the first time it is read."""
+    global _warm_checked
+    if not _warm_checked:
+        if not backend.warmed:
+            rebuild(backend)
+        _warm_checked = True
+    return backend
+
+
+def rebuild(backend=None):
+    """Reload every user's total_score from the database. Returns the number of users."""
+    from .models import CustomUser
+
+    if backend is None:
+        backend = get_backend()
+    pairs = list(CustomUser.objects.values_list("id", "total_score").iterator(chunk_size=5000))
+    backend.replace_all(pairs)
+    return len(pairs)
+
+
+def record_score(user_id, total_score):
+    """Called whenever a user's total_score changes. Never raises."""
+    try:
+        get_backend().set_score(user_id, total_score)
+    except Exception as e:
+        logger.error(f"Leaderboard update failed for user {user_id}: {e}")
+
+
+def top(n=50):
+    return _warm(get_backend()).top(n)
+
+
+def rank(user_id):
+    return _warm(get_backend()).rank(user_id)
+
+
+def around(user_id, radius=2):
+    return _warm(get_backend()).around(user_id, radius)
+
+
+# ---- Time-windowed and per-mode boards ----
+
+
+def bucket_key(window, mode=None, when=None):
+    """Redis key for the bucket of `window` containing `when` (default now)."""
+    mode = mode or "all"
+    if window == "all":
+        return f"leaderboard:mode:{mode}"
+    when = when or timezone.now()
+    return f"leaderboard:{window}:{when.strftime(WINDOWS[window][0])}:{mode}"
+
+
+def window_start(window, when=None):
+    """First instant of the current bucket, used when rebuilding from PlayerScore."""
+    when = when or timezone.now()
+    start = when.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "weekly":
+        start -= timedelta(days=start.weekday())
+    elif window == "monthly":
+        start = start.replace(day=1)
+    elif window == "all":
+        return None
+    return start
+
+
+class MemoryBuckets:
+    """In-process bucket boards with expiry (used when Redis is unavailable)."""
+
+    def __init__(self):
+        self._boards = {}  # key -> (MemoryLeaderboard, expires_at or None)
+        self._lock = threading.Lock()
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [k for k, (_, exp) in self._boards.items() if exp is not None and exp <= now]
+        for key in expired:
+            del self._boards[key]
+
+    def board(self, key, ttl=None):
+        with self._lock:
+            self._prune()
+            if key not in self._boards:
+                expires_at = time.monotonic() + ttl if ttl else None
+                self._boards[key] = (MemoryLeaderboard(), expires_at)
+            return self._boards[key][0]
+
+    def warmed(self, key):
+        with self._lock:
+            self._prune()
+            return key in self._boards and self._boards[key][0].warmed
+
+    def incr_many(self, updates):
+        """updates: [(key, user_id, delta, ttl)]"""
+        for key, user_id, delta, ttl in updates:
+            self.board(key, ttl).incr(user_id, delta)
+
+
+class RedisBuckets:
+    def __init__(self, client):
+        self.client = client
+
+    def board(self, key, ttl=None):
+        return RedisLeaderboard(self.client, key)
+
+    def warmed(self, key):
+        return self.board(key).warmed
+
+    def incr_many(self, updates):
+        """All bucket updates for a game in one round trip."""
+        pipe = self.client.pipeline(transaction=False)
+        for key, user_id, delta, ttl in updates:
+            pipe.zincrby(key, delta, str(user_id))
+            if ttl:
+                pipe.expire(key, ttl)
+        pipe.execute()
+
+
+_buckets = None
+
+
+def get_buckets():
+    global _buckets
+    if _buckets is None:
+        backend = get_backend()
+        if isinstance(backend, RedisLeaderboard):
+            _buckets = RedisBuckets(backend.client)
+        else:
+            _buckets = MemoryBuckets()
+    return _buckets
+
+
+def record_game(user_id, points, mode, when=None):
+    """
+    Add one game's points to the current daily/weekly/monthly buckets, both
+    for its mode and across all modes, plus the all-time board of the mode.
+    Never raises.
+    """
+    if mode not in MODES:
+        return
+    updates = [(bucket_key("all", mode), user_id, points, None)]
+    for window, (_, ttl) in WINDOWS.items():
+        for m in (mode, None):
+            updates.append((bucket_key(window, m, when), user_id, points, ttl))
+    try:
+        get_buckets().incr_many(updates)
+    except Exception as e:
+        logger.error(f"Windowed leaderboard update failed for user {user_id}: {e}")
+
+
+def rebuild_bucket(window, mode=None):
+    """Recompute the current bucket from PlayerScore (one grouped query)."""
+    from django.db.models import Sum
+    from .models import PlayerScore
+
+    qs = PlayerScore.objects.all()
+    start = window_start(window)
+    if start is not None:
+        qs = qs.filter(session__created_at__gte=start)
+    if mode:
+        qs = qs.filter(session__session_type=mode)
+    pairs = list(qs.values("player").annotate(points=Sum("score")).values_list("player", "points"))
+
+    key = bucket_key(window, mode)
+    ttl = WINDOWS[window][1] if window in WINDOWS else None
+    get_buckets().board(key, ttl).replace_all(pairs, ttl=ttl)
+    return len(pairs)
+
+
+def bucket_board(window, mode=None):
+    """
+    The current board for a window/mode, loaded from the DB the first time
+    it is read. record_game creates buckets too, so a bucket that exists
+    may still hold only the games played since it was created.
+    """
+    key = bucket_key(window, mode)
+    buckets = get_buckets()
+    if not buckets.warmed(key):
+        rebuild_bucket(window, mode)
+    return buckets.board(key)
@@ -0,0 +1,199 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Avg, Max, Sum
+from django.utils import timezone
+
+from quiz.models import CodingProblem, CustomUser, PlayerScore, Question, QuizSession
+
+# Indexes the hot queries rely on (migrations 0009 and 0014)
+HOT_INDEXES = [
+    "question_type_diff_idx",
+    "codingproblem_difficulty_idx",
+    "playerscore_player_recent_idx",
+    "user_total_score_idx",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a large throwaway dataset, then reports query plans and timings for the hot '
+        'quiz queries with and without the composite indexes. Everything is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--questions', type=int, default=50000)
+        parser.add_argument('--problems', type=int, default=2000)
+        parser.add_argument('--games-per-user', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query; the median is reported')
+        parser.add_argument(
+            '--max-ms', type=float, default=None,
+            help='Fail if any query is slower than this with indexes (for CI regression checks)',
+        )
+
+    def handle(self, *args, **options):
+        self.repeat = options['repeat']
+        rng = random.Random(0)
+
+        with transaction.atomic():
+            self.stdout.write('Seeding benchmark data...')
+            probe_user = self.seed(rng, options)
+            self.analyze()
+
+            queries = self.hot_queries(probe_user)
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\nWith indexes'))
+            after = self.run_queries(queries)
+
+            for name in HOT_INDEXES:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+            self.analyze()
+
+            self.stdout.write(self.style.MIGRATE_HEADING('\nWithout indexes'))
+            before = self.run_queries(queries)
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nSummary (median ms)'))
+        self.stdout.write(f'{"query":<28}{"no index":>12}{"indexed":>12}{"speedup":>10}')
+        for name in queries:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write(f'{name:<28}{before[name]:>12.3f}{after[name]:>12.3f}{speedup:>9.1f}x')
+
+        limit = options['max_ms']
+        if limit is not None:
+            slow = [name for name, ms in after.items() if ms > limit]
+            if slow:
+                raise CommandError(f'Queries slower than {limit} ms with indexes: {", ".join(slow)}')
+        self.stdout.write(self.style.SUCCESS('\nRolled back, no rows kept.'))
+
+    # ---- data ----
+
+    def seed(self, rng, options):
+        tag = uuid.uuid4().hex[:8]
+        difficulties = ['easy', 'medium', 'hard']
+        categories = [f'Category {i}' for i in range(50)]
+
+        users = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f'bench_{tag}_{i}',
+                    total_score=rng.randint(0, 100000),
+                    games_played=rng.randint(0, 500),
+                )
+                for i in range(options['users'])
+            ],
+            batch_size=1000,
+        )
+
+        Question.objects.bulk_create(
+            [
+                Question(
+                    question_text=f'Benchmark question {tag} #{i}',
+                    question_type=rng.choice(['multiple_choice', 'multiple_choice', 'true_false']),
+                    difficulty=rng.choice(difficulties),
+                    category=rng.choice(categories),
+                    options=['a', 'b', 'c', 'd'],
+                    correct_answer='0',
+                    text_hash=f'{tag}{i:056d}',
+                )
+                for i in range(options['questions'])
+            ],
+            batch_size=1000,
+        )
+
+        CodingProblem.objects.bulk_create(
+            [
+                CodingProblem(
+                    title=f'Benchmark problem {i}',
+                    difficulty=rng.choice(difficulties),
+                    description='', input_format='', output_format='', test_cases=[],
+                )
+                for i in range(options['problems'])
+            ],
+            batch_size=1000,
+        )
+
+        games = options['games_per_user']
+        sessions = QuizSession.objects.bulk_create(
+            [QuizSession(session_type='single', status='finished') for _ in range(len(users) * games)],
+            batch_size=1000,
+        )
+        # Spread the games over the last year so date-window queries are selective
+        now = timezone.now()
+        for session in sessions:
+            session.created_at = now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+        QuizSession.objects.bulk_update(sessions, ['created_at'], batch_size=1000)
+
+        scores = []
+        for u_idx, user in enumerate(users):
+            for g in range(games):
+                total = rng.randint(1, 10)
+                correct = rng.randint(0, total)
+                session = sessions[u_idx * games + g]
+                scores.append(PlayerScore(
+                    player=user,
+                    session=session,
+                    score=correct * 10,
+                    correct_answers=correct,
+                    total_answers=total,
+                ))
+        scores = PlayerScore.objects.bulk_create(scores, batch_size=1000)
+        for score in scores:
+            score.joined_at = score.session.created_at
+        PlayerScore.objects.bulk_update(scores, ['joined_at'], batch_size=1000)
+
+        self.stdout.write(
+            f'  {len(users)} users, {options["questions"]} questions, '
+            f'{options["problems"]} coding problems, {len(scores)} scores'
+        )
+        return users[len(users) // 2]
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    # ---- queries ----
+
+    def hot_queries(self, user):
+        """The queries as the app runs them (generate_mcq_questions, dashboard, leaderboard)."""
+        week_start = timezone.now() - timedelta(days=7)
+        return {
+            'question_selection': lambda: Question.objects.filter(
+                question_type='multiple_choice', difficulty='medium',
+            ).order_by('?')[:10],
+            'coding_by_difficulty': lambda: CodingProblem.objects.filter(difficulty='easy'),
+            'dashboard_recent': lambda: PlayerScore.objects.filter(player=user).order_by('-joined_at').values(
+                'score', 'correct_answers', 'total_answers', 'session__created_at', 'session__session_type',
+            )[:10],
+            'dashboard_aggregates': lambda: PlayerScore.objects.filter(player=user).values('player').annotate(
+                avg=Avg('score'), best=Max('score'),
+                questions=Sum('total_answers'), correct=Sum('correct_answers'),
+            ),
+            'leaderboard_weekly': lambda: PlayerScore.objects.filter(session__created_at__gte=week_start)
+            .values('player').annotate(points=Sum('score')).values_list('player', 'points'),
+            'leaderboard_top50': lambda: CustomUser.objects.order_by('-total_score')[:50],
+        }
+
+    def run_queries(self, queries):
+        results = {}
+        for name, build in queries.items():
+            plan = build().explain()
+            timings = []
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+
+            self.stdout.write(f'\n{name}: {results[name]:.3f} ms')
+            for line in plan.splitlines():
+                self.stdout.write(f'    {line}')
+        return results
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from quiz.models import QuizSession
+from quiz.providers import get_question_provider, to_session_question
+from quiz.views import link_questions_to_session
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the single-player session pipeline (generate -> persist -> link) many times '
+        'and reports throughput. Uses the offline local provider by default, and rolls '
+        'everything back unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', default='local', choices=['local', 'gemini'])
+        parser.add_argument('--sessions', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=10)
+        parser.add_argument('--topic', default='Aptitude')
+        parser.add_argument('--difficulty', default='medium')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='Commit the generated rows')
+
+    def handle(self, *args, **options):
+        provider = get_question_provider(options['provider'], seed=options['seed'])
+        sessions = options['sessions']
+        num_questions = options['questions']
+        topic = options['topic']
+        difficulty = options['difficulty']
+
+        self.stdout.write(
+            f'Running {sessions} sessions x {num_questions} questions with provider "{provider.name}"...'
+        )
+
+        generate_time = 0.0
+        persist_time = 0.0
+        first_question_time = 0.0
+        total_questions = 0
+
+        with transaction.atomic():
+            started = time.perf_counter()
+
+            for _ in range(sessions):
+                t0 = time.perf_counter()
+                questions = []
+                for question in provider.generate_questions_stream(topic, difficulty, num_questions):
+                    if not questions:
+                        first_question_time += time.perf_counter() - t0
+                    questions.append(to_session_question(
+                        question, topic, difficulty,
+                        is_ai_generated=provider.name != 'local',
+                    ))
+                t1 = time.perf_counter()
+
+                session = QuizSession.objects.create(
+                    session_type='single',
+                    max_players=1,
+                    difficulty_level=difficulty,
+                )
+                link_questions_to_session(session, questions)
+                t2 = time.perf_counter()
+
+                generate_time += t1 - t0
+                persist_time += t2 - t1
+                total_questions += len(questions)
+
+            elapsed = time.perf_counter() - started
+
+            if not options['keep']:
+                transaction.set_rollback(True)
+
+        self.stdout.write(f'Total time:            {elapsed:.2f}s')
+        self.stdout.write(f'Sessions/sec:          {sessions / elapsed:.1f}')
+        self.stdout.write(f'Questions/sec:         {total_questions / elapsed:.1f}')
+        self.stdout.write(f'Avg generate/session:  {generate_time / sessions * 1000:.2f} ms')
+        self.stdout.write(f'Avg first question:    {first_question_time / sessions * 1000:.2f} ms')
+        self.stdout.write(f'Avg persist/session:   {persist_time / sessions * 1000:.2f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            'Rows kept.' if options['keep'] else 'Rolled back, no rows kept.'
+        ))
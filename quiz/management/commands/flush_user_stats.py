@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz import stats_buffer
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered user stats deltas (QUIZ_STATS_BUFFERED) from the shared Redis buffer to the database. Safe to run from cron.'
+
+    def handle(self, *args, **options):
+        buffer = stats_buffer.get_stats_buffer()
+        if isinstance(buffer.store, stats_buffer.MemoryStatsBuffer):
+            # This process's buffer is empty; the deltas sit in each worker's own memory
+            self.stdout.write(self.style.WARNING(
+                'Redis is not reachable, so every worker buffers stats in its own memory and '
+                f'flushes it itself (every {buffer.flush_interval}s and at exit). Nothing to flush here.'
+            ))
+            return
+
+        self.stdout.write(f'Flushing stats buffer ({len(buffer.store)} users pending)...')
+
+        start = time.perf_counter()
+        count = buffer.flush()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f'Updated {count} users in {elapsed:.2f}s.'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quiz import leaderboard
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the leaderboard sorted set from CustomUser.total_score, and the current '
+        'daily/weekly/monthly and per-mode buckets from PlayerScore.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-windows', action='store_true', help='Only rebuild the all-time board')
+
+    def handle(self, *args, **options):
+        backend = leaderboard.get_backend()
+        self.stdout.write(f'Rebuilding leaderboard ({type(backend).__name__})...')
+
+        start = time.perf_counter()
+        count = leaderboard.rebuild(backend)
+        self.stdout.write(f'  all-time: {count} users')
+
+        if not options['skip_windows']:
+            for window in ['all', *leaderboard.WINDOWS]:
+                for mode in [None, *leaderboard.MODES]:
+                    if window == 'all' and mode is None:
+                        continue  # that's the total_score board above
+                    rows = leaderboard.rebuild_bucket(window, mode)
+                    self.stdout.write(f'  {window}/{mode or "all modes"}: {rows} players')
+        elapsed = time.perf_counter() - start
+
+        if isinstance(backend, leaderboard.MemoryLeaderboard):
+            self.stdout.write(self.style.WARNING(
+                'Redis is not reachable, so this only rebuilt an in-process board. '
+                'Web workers warm their own copy from the database on first use.'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'Done in {elapsed:.2f}s.'))
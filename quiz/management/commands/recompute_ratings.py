@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from quiz import rating
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes every CustomUser.rating by replaying all multiplayer and coding battle '
+        'PlayerScore rows in order (vectorized when numpy is installed).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--history', action='store_true', help='Also rebuild RatingHistory')
+        parser.add_argument('--chunk-size', type=int, default=20000, help='Rows fetched per query')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Replaying rated games...')
+        stats = rating.recompute_ratings(history=options['history'], chunk_size=options['chunk_size'])
+
+        games = stats['games']
+        rate = games / stats['replay_s'] if stats['replay_s'] else 0
+        self.stdout.write(
+            f"  {games} games, {stats['players']} players "
+            f"({'numpy' if stats['vectorized'] else 'pure Python'} replay)"
+        )
+        self.stdout.write(
+            f"  load {stats['load_s']:.2f}s, replay {stats['replay_s']:.2f}s ({rate:.0f} games/s), "
+            f"write {stats['write_s']:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS('Ratings recomputed.'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from quiz import question_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Rolls up PlayerAnswer into per-question attempt count, correct rate and median '
+        'response time, and calibrates Question.irt_difficulty. Only answers newer than the '
+        'last run are read unless --full is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every question from all answers')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows fetched and questions written per batch')
+
+    def handle(self, *args, **options):
+        stats = question_stats.rollup_question_stats(full=options['full'], chunk_size=options['chunk_size'])
+
+        mode = 'full' if stats['full'] else 'incremental'
+        self.stdout.write(
+            f"  {mode}: answers {stats['from_id'] + 1}..{stats['to_id']}, "
+            f"{stats['answers']} answers over {stats['questions']} questions in {stats['seconds']:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS('Question stats updated.'))
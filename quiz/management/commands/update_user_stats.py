@@ -1,52 +1,89 @@
-from django.core.management.base import BaseCommand
+import time
+from datetime import datetime, time as dt_time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from quiz import leaderboard
 from quiz.models import CustomUser, PlayerScore
-from django.db.models import Sum, Count, Avg
+
 
 class Command(BaseCommand):
     help = 'Recalculates and updates user statistics (total_score, games_played, win_rate) based on PlayerScore history.'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only recompute users with scores changed at or after this date/datetime (ISO format)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk_update')
+
     def handle(self, *args, **options):
         self.stdout.write('Starting user stats update...')
-        
+        start = time.perf_counter()
+        batch_size = options['batch_size']
+
         users = CustomUser.objects.all()
-        count = 0
-        
-        for user in users:
-            # Get all scores for this user
-            scores = PlayerScore.objects.filter(player=user)
-            
-            if not scores.exists():
-                user.total_score = 0
-                user.games_played = 0
-                user.win_rate = 0.0
-                user.save()
-                continue
-                
-            # Calculate stats
-            stats = scores.aggregate(
+        if options['since']:
+            since = self.parse_since(options['since'])
+            users = users.filter(
+                id__in=PlayerScore.objects.filter(last_activity__gte=since).values('player_id')
+            )
+
+        # One grouped query for every user's totals.
+        # A "win" is accuracy >= 50% (same rule as submit_answer), i.e. 2 * correct >= total.
+        stats = {
+            row['player']: row
+            for row in PlayerScore.objects.filter(player__in=users)
+            .values('player')
+            .annotate(
                 total_score=Sum('score'),
-                games_played=Count('id')
+                games_played=Count('id'),
+                wins=Count('id', filter=Q(total_answers__gt=0, total_answers__lte=F('correct_answers') * 2)),
             )
-            
-            total_score = stats['total_score'] or 0
-            games_played = stats['games_played'] or 0
-            
-            # Calculate win rate (accuracy >= 50% counts as a "win" for single player logic consistency)
-            # Note: In views.py submit_answer, is_win = score.accuracy >= 50
-            wins = 0
-            for s in scores:
-                if s.accuracy >= 50:
-                    wins += 1
-            
-            win_rate = (wins / games_played * 100) if games_played > 0 else 0.0
-            
-            # Update user
-            user.total_score = total_score
+        }
+
+        count = 0
+        batch = []
+        for user in users.only('id', 'total_score', 'games_played', 'win_rate').iterator(chunk_size=batch_size):
+            row = stats.get(user.id)
+            games_played = row['games_played'] if row else 0
+            user.total_score = (row['total_score'] or 0) if row else 0
             user.games_played = games_played
-            user.win_rate = win_rate
-            user.save()
-            
-            self.stdout.write(f'Updated {user.username}: Score={total_score}, Games={games_played}, WinRate={win_rate:.1f}%')
-            count += 1
-            
-        self.stdout.write(self.style.SUCCESS(f'Successfully updated stats for {count} users.'))
+            user.win_rate = (row['wins'] / games_played * 100) if games_played else 0.0
+            batch.append(user)
+
+            if len(batch) >= batch_size:
+                count += self.flush(batch)
+                batch = []
+
+        if batch:
+            count += self.flush(batch)
+
+        elapsed = time.perf_counter() - start
+        rate = count / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully updated stats for {count} users in {elapsed:.2f}s ({rate:.0f} users/s).'
+        ))
+
+    def flush(self, batch):
+        with transaction.atomic():
+            CustomUser.objects.bulk_update(batch, ['total_score', 'games_played', 'win_rate'])
+        # bulk_update skips update_stats, so push the new totals to the leaderboard here
+        for user in batch:
+            leaderboard.record_score(user.id, user.total_score)
+        return len(batch)
+
+    def parse_since(self, value):
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise CommandError(f'Invalid --since value: {value!r}')
+            parsed = datetime.combine(day, dt_time.min)
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
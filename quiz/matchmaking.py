@@ -0,0 +1,361 @@
+"""
+Matchmaking queue for quiz duels and coding battles.
+
+{"action": "queue", "difficulty": ..., "topic": ...} puts the player in a
+bucket per game, difficulty and topic. Each bucket is a sorted set keyed by
+rating, so finding the closest waiting opponent is one range lookup either
+side of the player's rating, O(log N). Two players are compatible when their
+ratings are within MATCHMAKING_RATING_BAND. A waiting player's band widens by
+MATCHMAKING_BAND_WIDEN points per second, so nobody waits forever for a
+perfect match. Waiting players retry every MATCHMAKING_RETRY_INTERVAL
+seconds with their widened band.
+
+The consumer that completes a pair creates the room, picks the questions or
+problem, and sends "match_found" to both players' channels. Rooms and the
+in-memory channel layer belong to the worker process that created them, so
+each worker only pairs players connected to it: in Redis (the leaderboard's
+connection) its queues live under a per-process scope, while queue depths
+and wait-time histograms are shared. Claiming a waiting ticket is a single
+ZREM, so two consumers can never take the same player. Without Redis
+everything stays in this process.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import random
+import secrets
+import socket
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from . import leaderboard
+from .rating import DEFAULT_RATING
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the wait-time histogram bins
+WAIT_BINS = (1, 2, 5, 10, 30, 60, 120)
+
+# Closest tickets looked at on each side of the rating
+NEAREST = 5
+
+# Seconds a worker's Redis queue outlives its last ticket (cleans up after dead workers)
+QUEUE_TTL = 60 * 60
+
+
+def wait_bin(seconds):
+    idx = bisect.bisect_left(WAIT_BINS, seconds)
+    return str(WAIT_BINS[idx]) if idx < len(WAIT_BINS) else "+Inf"
+
+
+def worker_scope():
+    """This process, which owns the rooms it creates."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def player_rating(user_id):
+    """The user's Elo rating (quiz/rating.py); guests get DEFAULT_RATING."""
+    from .models import CustomUser
+
+    if user_id is None:
+        return DEFAULT_RATING
+    rating = CustomUser.objects.filter(pk=user_id).values_list("rating", flat=True).first()
+    return DEFAULT_RATING if rating is None else rating
+
+
+class MemoryQueueStore:
+    """Per-bucket sorted lists of (rating, ticket id), for a single process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._tickets = {}
+        self._waits = {}
+        self._lock = threading.Lock()
+
+    def add(self, ticket):
+        with self._lock:
+            self._tickets[ticket["id"]] = ticket
+            bisect.insort(self._buckets.setdefault(ticket["bucket"], []), (ticket["rating"], ticket["id"]))
+
+    def nearest(self, bucket, rating, n=NEAREST):
+        with self._lock:
+            entries = self._buckets.get(bucket, [])
+            idx = bisect.bisect_left(entries, (rating, ""))
+            window = entries[max(idx - n, 0):idx + n]
+            return [self._tickets[tid] for _, tid in window]
+
+    def claim(self, ticket):
+        """Remove the ticket if it is still queued. Returns it, or None if someone else got it."""
+        with self._lock:
+            claimed = self._tickets.pop(ticket["id"], None)
+            if claimed is None:
+                return None
+            entries = self._buckets[claimed["bucket"]]
+            del entries[bisect.bisect_left(entries, (claimed["rating"], claimed["id"]))]
+            if not entries:
+                del self._buckets[claimed["bucket"]]
+            return claimed
+
+    def record_wait(self, game, seconds):
+        with self._lock:
+            self._waits.setdefault(game, Counter())[wait_bin(seconds)] += 1
+
+    def depths(self):
+        with self._lock:
+            return {bucket: len(entries) for bucket, entries in self._buckets.items()}
+
+    def wait_histograms(self):
+        with self._lock:
+            return {game: dict(counts) for game, counts in self._waits.items()}
+
+
+class RedisQueueStore:
+    """
+    Same interface in Redis: one sorted set per bucket plus a ticket hash,
+    under this worker's scope. The set of queue keys and the wait
+    histograms are shared, so depths() and wait_histograms() cover every worker.
+    """
+
+    def __init__(self, client, prefix="matchmaking", scope=None):
+        self.client = client
+        self.prefix = prefix
+        self.scope_prefix = f"{prefix}:{scope or worker_scope()}"
+        self.tickets_key = f"{self.scope_prefix}:tickets"
+        self.buckets_key = f"{prefix}:queues"
+
+    def _bucket_key(self, bucket):
+        return f"{self.scope_prefix}:queue:{bucket}"
+
+    def add(self, ticket):
+        bucket_key = self._bucket_key(ticket["bucket"])
+        pipe = self.client.pipeline()
+        pipe.hset(self.tickets_key, ticket["id"], json.dumps(ticket))
+        pipe.zadd(bucket_key, {ticket["id"]: ticket["rating"]})
+        pipe.sadd(self.buckets_key, bucket_key)
+        pipe.expire(self.tickets_key, QUEUE_TTL)
+        pipe.expire(bucket_key, QUEUE_TTL)
+        pipe.execute()
+
+    def nearest(self, bucket, rating, n=NEAREST):
+        key = self._bucket_key(bucket)
+        ids = self.client.zrevrangebyscore(key, rating, "-inf", start=0, num=n)
+        ids += self.client.zrangebyscore(key, f"({rating}", "+inf", start=0, num=n)
+        if not ids:
+            return []
+        rows = self.client.hmget(self.tickets_key, ids)
+        return [json.loads(row) for row in rows if row is not None]
+
+    def claim(self, ticket):
+        if not self.client.zrem(self._bucket_key(ticket["bucket"]), ticket["id"]):
+            return None
+        pipe = self.client.pipeline()
+        pipe.hget(self.tickets_key, ticket["id"])
+        pipe.hdel(self.tickets_key, ticket["id"])
+        row, _ = pipe.execute()
+        return json.loads(row) if row is not None else ticket
+
+    def record_wait(self, game, seconds):
+        self.client.hincrby(f"{self.prefix}:waits:{game}", wait_bin(seconds), 1)
+
+    def depths(self):
+        keys = sorted(k.decode() if isinstance(k, bytes) else k for k in self.client.smembers(self.buckets_key))
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.zcard(key)
+        depths = Counter()
+        for key, depth in zip(keys, pipe.execute()):
+            if depth:
+                depths[key.rsplit(":queue:", 1)[1]] += depth
+            else:
+                self.client.srem(self.buckets_key, key)  # emptied or expired
+        return dict(depths)
+
+    def wait_histograms(self):
+        out = {}
+        for game in ("quiz", "battle"):
+            counts = self.client.hgetall(f"{self.prefix}:waits:{game}")
+            if counts:
+                out[game] = {
+                    (k.decode() if isinstance(k, bytes) else k): int(v) for k, v in counts.items()
+                }
+        return out
+
+
+class Matchmaker:
+    def __init__(self, store, band=None, widen=None):
+        self.store = store
+        self.band = band if band is not None else getattr(settings, "MATCHMAKING_RATING_BAND", 100)
+        self.widen = widen if widen is not None else getattr(settings, "MATCHMAKING_BAND_WIDEN", 10)
+
+    def new_ticket(self, game, player, user_id, channel, rating, difficulty="any", topic="any"):
+        return {
+            "id": secrets.token_hex(8),
+            "game": game,
+            "bucket": f"{game}:{difficulty}:{topic}".lower(),
+            "difficulty": difficulty,
+            "topic": topic,
+            "player": player,
+            "user_id": user_id,
+            "channel": channel,
+            "rating": rating,
+            "enqueued_at": time.time(),
+        }
+
+    def band_for(self, ticket, now):
+        return self.band + self.widen * max(now - ticket["enqueued_at"], 0)
+
+    def find_opponent(self, ticket):
+        """Claim the closest compatible waiting ticket, or return None."""
+        now = time.time()
+        candidates = sorted(
+            self.store.nearest(ticket["bucket"], ticket["rating"]),
+            key=lambda c: abs(c["rating"] - ticket["rating"]),
+        )
+        for candidate in candidates:
+            if candidate["id"] == ticket["id"] or candidate["channel"] == ticket["channel"]:
+                continue
+            gap = abs(candidate["rating"] - ticket["rating"])
+            if gap > max(self.band_for(ticket, now), self.band_for(candidate, now)):
+                continue  # a farther candidate that has waited longer may still fit
+            opponent = self.store.claim(candidate)
+            if opponent is not None:
+                self.store.record_wait(ticket["game"], now - ticket["enqueued_at"])
+                self.store.record_wait(ticket["game"], now - opponent["enqueued_at"])
+                return opponent
+        return None
+
+    def enqueue(self, ticket):
+        """Pair the ticket right away if possible, else queue it. Returns the opponent or None."""
+        opponent = self.find_opponent(ticket)
+        if opponent is None:
+            self.store.add(ticket)
+        return opponent
+
+    def retry(self, ticket):
+        """
+        Look again with the ticket's widened band. Returns (still_queued, opponent):
+        still_queued is False when another worker already matched this ticket.
+        """
+        if self.store.claim(ticket) is None:
+            return False, None
+        opponent = self.find_opponent(ticket)
+        if opponent is None:
+            self.store.add(ticket)
+            return True, None
+        return False, opponent
+
+    def cancel(self, ticket):
+        self.store.claim(ticket)
+
+    def stats(self):
+        return {
+            "depth": self.store.depths(),
+            "wait_seconds": self.store.wait_histograms(),
+            "wait_bins": [str(b) for b in WAIT_BINS] + ["+Inf"],
+        }
+
+
+_matchmaker = None
+
+
+def get_matchmaker():
+    """Redis-backed when the leaderboard uses Redis, in-process otherwise."""
+    global _matchmaker
+    if _matchmaker is None:
+        backend = leaderboard.get_backend()
+        if isinstance(backend, leaderboard.RedisLeaderboard):
+            store = RedisQueueStore(backend.client)
+        else:
+            store = MemoryQueueStore()
+        _matchmaker = Matchmaker(store)
+    return _matchmaker
+
+
+class MatchmakingMixin:
+    """
+    Queue handling for a consumer. The consumer sets `queue_game` ("quiz" or
+    "battle") and implements create_match(ticket, opponent) -> room name
+    (room built, content picked, players not yet joined) and
+    join_match(room_name, player).
+    """
+
+    queue_game = None
+    queue_ticket = None
+    queue_task = None
+
+    async def handle_queue(self, data):
+        if self.queue_ticket is not None or getattr(self, "room_name", None):
+            await self.send_frame({"error": "Already queued or in a room"})
+            return
+
+        self.compress = bool(data.get("compress"))
+        matchmaker = get_matchmaker()
+        rating = await database_sync_to_async(player_rating)(self.user_id)
+        ticket = matchmaker.new_ticket(
+            self.queue_game,
+            player=data.get("player", "Player"),
+            user_id=self.user_id,
+            channel=self.channel_name,
+            rating=rating,
+            difficulty=data.get("difficulty", "any"),
+            topic=data.get("topic", "any"),
+        )
+        opponent = await sync_to_async(matchmaker.enqueue, thread_sensitive=False)(ticket)
+        if opponent is not None:
+            await self.start_match(ticket, opponent)
+            return
+
+        self.queue_ticket = ticket
+        await self.send_frame({"event": "queued", "bucket": ticket["bucket"]})
+        self.queue_task = asyncio.create_task(self.retry_queue(ticket))
+
+    async def retry_queue(self, ticket):
+        matchmaker = get_matchmaker()
+        interval = getattr(settings, "MATCHMAKING_RETRY_INTERVAL", 2)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                queued, opponent = await sync_to_async(matchmaker.retry, thread_sensitive=False)(ticket)
+                if opponent is not None:
+                    # Detach first so our own match_found doesn't cancel this task mid-match
+                    self.queue_ticket = self.queue_task = None
+                    await self.start_match(ticket, opponent)
+                if not queued:
+                    return  # matched, here or by another worker's match_found
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Matchmaking retry for {ticket['player']} failed: {e}")
+
+    async def start_match(self, ticket, opponent):
+        if opponent["player"] == ticket["player"]:
+            opponent["player"] = f"{opponent['player']}_{random.randint(1, 99)}"
+        room_name = await self.create_match(ticket, opponent)
+        for side in (ticket, opponent):
+            await self.channel_layer.send(side["channel"], {
+                "type": "match_found",
+                "room": room_name,
+                "player": side["player"],
+            })
+
+    async def leave_queue(self):
+        ticket, self.queue_ticket = self.queue_ticket, None
+        if self.queue_task is not None:
+            self.queue_task.cancel()
+            self.queue_task = None
+        if ticket is not None:
+            await sync_to_async(get_matchmaker().cancel, thread_sensitive=False)(ticket)
+
+    async def match_found(self, event):
+        if self.queue_task is not None:
+            self.queue_task.cancel()
+        self.queue_task = None
+        self.queue_ticket = None
+        await self.join_match(event["room"], event["player"])
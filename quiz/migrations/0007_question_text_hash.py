@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:51
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_text_hash(apps, schema_editor):
+    """
+    Hash existing questions. If the bank already holds duplicates, only the
+    oldest copy gets a hash so the unique constraint can be added.
+    """
+    Question = apps.get_model('quiz', 'Question')
+    seen = set()
+    batch = []
+
+    for question in Question.objects.order_by('id').only('id', 'question_text').iterator(chunk_size=2000):
+        normalized = " ".join(str(question.question_text or "").lower().split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        question.text_hash = digest
+        batch.append(question)
+
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ['text_hash'])
+            batch = []
+
+    if batch:
+        Question.objects.bulk_update(batch, ['text_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_quizsession_difficulty_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='text_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the normalized question text; the database rejects duplicates', max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_text_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='question',
+            name='text_hash',
+            field=models.CharField(blank=True, editable=False, help_text='SHA-256 of the normalized question text; the database rejects duplicates', max_length=64, null=True, unique=True),
+        ),
+    ]
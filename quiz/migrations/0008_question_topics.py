@@ -0,0 +1,107 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:52
+
+from django.db import migrations, models
+
+
+SQLITE_FTS_SQL = [
+    # External-content FTS5 table over quiz_question, kept in sync by triggers
+    """CREATE VIRTUAL TABLE IF NOT EXISTS quiz_question_fts USING fts5(
+        question_text, category, content='quiz_question', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_ai AFTER INSERT ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(rowid, question_text, category)
+        VALUES (new.id, new.question_text, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_ad AFTER DELETE ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(quiz_question_fts, rowid, question_text, category)
+        VALUES ('delete', old.id, old.question_text, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_au AFTER UPDATE ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(quiz_question_fts, rowid, question_text, category)
+        VALUES ('delete', old.id, old.question_text, old.category);
+        INSERT INTO quiz_question_fts(rowid, question_text, category)
+        VALUES (new.id, new.question_text, new.category);
+    END""",
+    "INSERT INTO quiz_question_fts(quiz_question_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS quiz_question_fts_ai",
+    "DROP TRIGGER IF EXISTS quiz_question_fts_ad",
+    "DROP TRIGGER IF EXISTS quiz_question_fts_au",
+    "DROP TABLE IF EXISTS quiz_question_fts",
+]
+
+POSTGRES_FTS_SQL = [
+    """CREATE INDEX IF NOT EXISTS quiz_question_search_idx ON quiz_question
+        USING GIN (to_tsvector('english', coalesce(question_text, '') || ' ' || coalesce(category, '')))""",
+]
+
+POSTGRES_FTS_DROP_SQL = [
+    "DROP INDEX IF EXISTS quiz_question_search_idx",
+]
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_FTS_SQL
+    elif vendor == 'postgresql':
+        statements = POSTGRES_FTS_SQL
+    else:
+        return  # other backends fall back to LIKE matching in quiz/search.py
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {'sqlite': SQLITE_FTS_DROP_SQL, 'postgresql': POSTGRES_FTS_DROP_SQL}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def tag_existing_questions(apps, schema_editor):
+    """Create a topic tag from every question's category."""
+    Question = apps.get_model('quiz', 'Question')
+    Topic = apps.get_model('quiz', 'Topic')
+    Through = Question.topics.through
+
+    pairs = []
+    for question_id, category in Question.objects.exclude(category__isnull=True).values_list('id', 'category').iterator():
+        name = " ".join(str(category).lower().split())[:100]
+        if name:
+            pairs.append((question_id, name))
+
+    names = {name for _, name in pairs}
+    Topic.objects.bulk_create([Topic(name=name) for name in names], ignore_conflicts=True)
+    topic_ids = dict(Topic.objects.filter(name__in=names).values_list('name', 'id'))
+    Through.objects.bulk_create(
+        [Through(question_id=qid, topic_id=topic_ids[name]) for qid, name in pairs],
+        batch_size=2000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0007_question_text_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Topic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Normalized topic name (see normalize_topic)', max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='topics',
+            field=models.ManyToManyField(blank=True, help_text='Normalized topic tags', related_name='questions', to='quiz.topic'),
+        ),
+        migrations.RunPython(tag_existing_questions, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
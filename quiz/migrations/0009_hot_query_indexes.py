@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('quiz', '0008_question_topics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='codingproblem',
+            index=models.Index(fields=['difficulty'], name='codingproblem_difficulty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-total_score'], name='user_total_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='playerscore',
+            index=models.Index(fields=['player', 'session', 'score', 'correct_answers', 'total_answers'], name='playerscore_player_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['question_type', 'difficulty', 'category'], name='question_type_diff_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizsession',
+            index=models.Index(fields=['created_at'], name='quizsession_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerAnswer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('player_name', models.CharField(blank=True, help_text='Display name used in the room', max_length=150)),
+                ('selected_option', models.IntegerField(blank=True, help_text='Chosen option index (None if unanswered)', null=True)),
+                ('is_correct', models.BooleanField(default=False)),
+                ('response_time_ms', models.IntegerField(blank=True, help_text='Time from question shown to answer', null=True)),
+                ('answered_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('player', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quiz.question')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answers', to='quiz.quizsession')),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_playeranswer'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='rating',
+            field=models.FloatField(default=1200.0, help_text='Elo skill rating, see quiz/rating.py'),
+        ),
+        migrations.CreateModel(
+            name='RatingHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.SmallIntegerField(help_text='Rating after the game, rounded')),
+                ('delta', models.SmallIntegerField(help_text='Change caused by the game, rounded')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rating_history', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='quiz.quizsession')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['player', 'created_at'], name='ratinghistory_player_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0011_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='irt_difficulty',
+            field=models.FloatField(blank=True, help_text='Item difficulty on the logit scale (see quiz/adaptive.py); None uses the easy/medium/hard prior', null=True),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='ability',
+            field=models.FloatField(default=0.0, help_text='Running ability estimate of an adaptive session (logit scale)'),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='adaptive_topics',
+            field=models.JSONField(blank=True, default=list, help_text='Topic filter of an adaptive session'),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='is_adaptive',
+            field=models.BooleanField(default=False, help_text="Pick each question from the player's estimated ability"),
+        ),
+        migrations.AddField(
+            model_name='quizsession',
+            name='target_questions',
+            field=models.IntegerField(default=0, help_text='Length of an adaptive session'),
+        ),
+    ]
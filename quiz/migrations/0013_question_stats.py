@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0012_adaptive_difficulty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='attempt_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='correct_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='correct_rate',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='median_response_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='response_time_histogram',
+            field=models.JSONField(blank=True, default=dict, help_text='Answer counts per log-scale response time bucket'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='stats_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
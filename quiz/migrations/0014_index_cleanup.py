@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0013_question_stats'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='playerscore',
+            name='playerscore_player_cover_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='question',
+            name='question_type_diff_cat_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='quizsession',
+            name='quizsession_created_idx',
+        ),
+        migrations.AddIndex(
+            model_name='playerscore',
+            index=models.Index(fields=['player', '-joined_at', 'score', 'correct_answers', 'total_answers'], name='playerscore_player_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['question_type', 'difficulty'], name='question_type_diff_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+import hashlib
+
+from django.db import migrations
+
+
+def merge_duplicate_questions(apps, schema_editor):
+    """
+    Fold the duplicates that 0007 left without a text_hash into the copy
+    that holds the hash, so every question has one and save() no longer
+    collides on the unique column.
+
+    Session links, answers and code submissions move to the kept copy and
+    its topic tags gain the duplicate's. Answer counts are not merged here;
+    run `manage.py rollup_question_stats --full` afterwards to recount them.
+    """
+    Question = apps.get_model('quiz', 'Question')
+    SessionQuestion = apps.get_model('quiz', 'SessionQuestion')
+    PlayerAnswer = apps.get_model('quiz', 'PlayerAnswer')
+    CodeSubmission = apps.get_model('quiz', 'CodeSubmission')
+    Through = Question.topics.through
+
+    # Listed up front: the loop deletes rows from the table being read
+    unhashed = list(Question.objects.filter(text_hash__isnull=True).order_by('id').values_list('id', 'question_text'))
+    for question_id, question_text in unhashed:
+        normalized = " ".join(str(question_text or "").lower().split())
+        digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        kept_id = Question.objects.filter(text_hash=digest).values_list('id', flat=True).first()
+        if kept_id is None:
+            # No hashed copy (the question was added without one): it becomes the kept copy
+            Question.objects.filter(id=question_id).update(text_hash=digest)
+            continue
+
+        for model in (SessionQuestion, PlayerAnswer, CodeSubmission):
+            model.objects.filter(question_id=question_id).update(question_id=kept_id)
+        topic_ids = Through.objects.filter(question_id=question_id).values_list('topic_id', flat=True)
+        Through.objects.bulk_create(
+            [Through(question_id=kept_id, topic_id=topic_id) for topic_id in topic_ids],
+            ignore_conflicts=True,
+        )
+        Question.objects.filter(id=question_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0014_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_questions, migrations.RunPython.noop),
+    ]
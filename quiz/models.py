@@ -1,9 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
+import hashlib
 import json
 
 
+def normalize_question_text(text):
+    """Lowercase and collapse whitespace so trivially different copies match."""
+    return " ".join(str(text or "").lower().split())
+
+
+def question_text_hash(text):
+    """SHA-256 of the normalized question text (the Question.text_hash value)."""
+    return hashlib.sha256(normalize_question_text(text).encode("utf-8")).hexdigest()
+
+
+def normalize_topic(name):
+    """Canonical form of a topic tag: lowercase, single spaces."""
+    return " ".join(str(name or "").lower().split())[:100]
+
+
 class CustomUser(AbstractUser):
     """
     Custom user model extending Django's AbstractUser.
@@ -12,21 +28,55 @@ class CustomUser(AbstractUser):
     total_score = models.IntegerField(default=0, help_text="Total accumulated score across all games")
     games_played = models.IntegerField(default=0, help_text="Number of games played")
     win_rate = models.FloatField(default=0.0, help_text="Win rate percentage")
+    rating = models.FloatField(default=1200.0, help_text="Elo skill rating, see quiz/rating.py")
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True, help_text="User avatar image")
 
-    def update_stats(self, score, won=False):
-        """Update user statistics after a game"""
-        self.total_score += score
-        self.games_played += 1
-        if won:
-            self.win_rate = ((self.win_rate * (self.games_played - 1)) + 100) / self.games_played
-        else:
-            self.win_rate = (self.win_rate * (self.games_played - 1)) / self.games_played
-        self.save()
+    def update_stats(self, score, won=False, mode=None):
+        """
+        Update user statistics after a game (mode feeds the per-mode/windowed leaderboards).
+
+        The counters are bumped with F() expressions in one UPDATE, so
+        concurrent games for the same user can't overwrite each other. With
+        QUIZ_STATS_BUFFERED the game is queued instead (see quiz/stats_buffer.py).
+        """
+        from . import leaderboard, stats_buffer
+
+        if mode:
+            leaderboard.record_game(self.pk, score, mode)
+
+        if stats_buffer.stats_buffered():
+            stats_buffer.record_game_stats(self.pk, score, won)
+            return
+
+        # Every right-hand side reads the old row, so win_rate uses the old games_played
+        self.win_rate = (
+            models.F('win_rate') * models.F('games_played') + (100.0 if won else 0.0)
+        ) / (models.F('games_played') + 1.0)
+        self.total_score = models.F('total_score') + score
+        self.games_played = models.F('games_played') + 1
+        self.save(update_fields=['total_score', 'games_played', 'win_rate'])
+        self.refresh_from_db(fields=['total_score', 'games_played', 'win_rate'])
+
+        leaderboard.record_score(self.pk, self.total_score)
 
     class Meta:
         verbose_name = "User"
         verbose_name_plural = "Users"
+        indexes = [
+            # Leaderboard: ORDER BY total_score DESC
+            models.Index(fields=["-total_score"], name="user_total_score_idx"),
+        ]
+
+
+class Topic(models.Model):
+    """
+    Normalized topic tag. Questions are tagged so topic filtering is an
+    index lookup instead of a LIKE scan over the question table.
+    """
+    name = models.CharField(max_length=100, unique=True, help_text="Normalized topic name (see normalize_topic)")
+
+    def __str__(self):
+        return self.name
 
 
 class Question(models.Model):
@@ -55,10 +105,40 @@ class Question(models.Model):
     category = models.CharField(max_length=100, blank=True, null=True, help_text="Question category/topic")
     created_at = models.DateTimeField(auto_now_add=True)
     is_ai_generated = models.BooleanField(default=False, help_text="Whether this question was generated by AI")
+    text_hash = models.CharField(
+        max_length=64, unique=True, blank=True, null=True, editable=False,
+        help_text="SHA-256 of the normalized question text; the database rejects duplicates",
+    )
+    topics = models.ManyToManyField(Topic, blank=True, related_name="questions", help_text="Normalized topic tags")
+    irt_difficulty = models.FloatField(
+        blank=True, null=True,
+        help_text="Item difficulty on the logit scale (see quiz/adaptive.py); None uses the easy/medium/hard prior",
+    )
+
+    # Rolled up from PlayerAnswer by `manage.py rollup_question_stats` (quiz/question_stats.py)
+    attempt_count = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    correct_rate = models.FloatField(blank=True, null=True)
+    median_response_ms = models.IntegerField(blank=True, null=True)
+    response_time_histogram = models.JSONField(
+        default=dict, blank=True, help_text="Answer counts per log-scale response time bucket",
+    )
+    stats_updated_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Session question selection (generate_mcq_questions) filters on type and difficulty
+            models.Index(fields=["question_type", "difficulty"], name="question_type_diff_idx"),
+        ]
 
     def __str__(self):
         return f"{self.question_type}: {self.question_text[:50]}..."
 
+    def save(self, *args, **kwargs):
+        if not self.text_hash:
+            self.text_hash = question_text_hash(self.question_text)
+        super().save(*args, **kwargs)
+
     def is_correct(self, answer):
         """Check if the provided answer is correct"""
         # Handle None or empty answer
@@ -118,6 +198,10 @@ class QuizSession(models.Model):
     time_limit = models.IntegerField(default=15, help_text="Time limit per question in seconds")
     difficulty_level = models.CharField(max_length=10, default='mixed', help_text="Difficulty level of the session")
     questions = models.ManyToManyField(Question, through='SessionQuestion', help_text="Questions in this session")
+    is_adaptive = models.BooleanField(default=False, help_text="Pick each question from the player's estimated ability")
+    ability = models.FloatField(default=0.0, help_text="Running ability estimate of an adaptive session (logit scale)")
+    target_questions = models.IntegerField(default=0, help_text="Length of an adaptive session")
+    adaptive_topics = models.JSONField(default=list, blank=True, help_text="Topic filter of an adaptive session")
 
     def __str__(self):
         return f"{self.session_type} Session {self.id} - {self.status}"
@@ -175,6 +259,14 @@ class PlayerScore(models.Model):
 
     class Meta:
         unique_together = ('player', 'session')
+        indexes = [
+            # Dashboard: a player's newest games in index order, and the
+            # aggregates read from the index alone
+            models.Index(
+                fields=["player", "-joined_at", "score", "correct_answers", "total_answers"],
+                name="playerscore_player_recent_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.player.username} - Session {self.session.id}: {self.score} points"
@@ -199,6 +291,56 @@ class PlayerScore(models.Model):
         return (self.correct_answers / self.total_answers) * 100
 
 
+class PlayerAnswer(models.Model):
+    """
+    One answer to one question in a session. Multiplayer rooms write these
+    in batches through the write-behind queue (quiz/persistence.py), so
+    guests are kept by name with no player row.
+    """
+    session = models.ForeignKey(QuizSession, on_delete=models.CASCADE, related_name="answers")
+    player = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, blank=True, null=True)
+    player_name = models.CharField(max_length=150, blank=True, help_text="Display name used in the room")
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="answers")
+    selected_option = models.IntegerField(blank=True, null=True, help_text="Chosen option index (None if unanswered)")
+    is_correct = models.BooleanField(default=False)
+    response_time_ms = models.IntegerField(blank=True, null=True, help_text="Time from question shown to answer")
+    answered_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.player_name or self.player_id} - Q{self.question_id}: {'correct' if self.is_correct else 'wrong'}"
+
+
+class RatingHistory(models.Model):
+    """
+    A user's rating after each rated game. Kept small: whole rating points
+    and the change, one row per user per game.
+    """
+    player = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="rating_history")
+    session = models.ForeignKey(QuizSession, on_delete=models.SET_NULL, blank=True, null=True)
+    rating = models.SmallIntegerField(help_text="Rating after the game, rounded")
+    delta = models.SmallIntegerField(help_text="Change caused by the game, rounded")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # A player's rating chart
+            models.Index(fields=["player", "created_at"], name="ratinghistory_player_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id}: {self.rating} ({self.delta:+d})"
+
+
+class StatsCheckpoint(models.Model):
+    """How far an incremental rollup job has read, by last processed row id."""
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_id}"
+
+
 class CodeSubmission(models.Model):
     """
     Model for code submissions in coding battles.
@@ -288,7 +430,12 @@ class CodingProblem(models.Model):
     output_format = models.TextField()
     test_cases = models.JSONField(help_text="List of test cases")
     starter_code = models.TextField(blank=True, null=True, help_text="Initial code for the user")
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["difficulty"], name="codingproblem_difficulty_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} ({self.difficulty})"
 
@@ -0,0 +1,215 @@
+"""
+Write-behind persistence for finished games.
+
+Consumers broadcast the final results first and then hand the game to
+enqueue_game_result(). A background task on the event loop collects
+results into batches and writes each batch with a handful of bulk inserts
+(QuizSession, SessionQuestion, PlayerScore, PlayerAnswer) plus one stats
+UPDATE and one rating update (quiz/rating.py), so no DB work sits between the last answer and the `finished` event.
+
+A game result is a plain dict:
+
+    {
+        "mode": "multiplayer" | "coding_battle",
+        "room": "room_1234",
+        "difficulty": "medium",
+        "started_at": datetime or None,
+        "finished_at": datetime,
+        "question_ids": [12, 40, ...],
+        "players": [{"name", "user_id", "score", "correct", "total", "won"}],
+        "answers": [{"player", "question_id", "selected", "is_correct",
+                     "response_time_ms", "answered_at"}],
+    }
+
+Leaderboard and stats-buffer updates run in transaction.on_commit, so a
+batch that rolls back (and is retried) never adds its points to Redis. A
+batch that still fails after MAX_ATTEMPTS is written one game at a time,
+and only the games that fail on their own are dropped.
+
+The queue is per process; results that are still queued when the process
+dies are lost, same as the in-memory rooms they came from.
+"""
+import asyncio
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+def persist_game_results(results):
+    """Write a batch of game results. Runs in a worker thread."""
+    from django.db import transaction
+
+    from .dashboard import invalidate_dashboard
+    from .models import PlayerAnswer, PlayerScore, QuizSession, SessionQuestion
+    from .rating import apply_game_ratings
+    from .stats_buffer import record_game_results
+
+    with transaction.atomic():
+        sessions = QuizSession.objects.bulk_create([
+            QuizSession(
+                session_type=result["mode"],
+                status="finished",
+                started_at=result.get("started_at"),
+                finished_at=result["finished_at"],
+                max_players=len(result["players"]),
+                current_question_index=len(result.get("question_ids", [])),
+                difficulty_level=result.get("difficulty") or "mixed",
+            )
+            for result in results
+        ])
+
+        session_questions, scores, answers = [], [], []
+        for session, result in zip(sessions, results):
+            user_ids = {p["name"]: p["user_id"] for p in result["players"]}
+
+            for order, question_id in enumerate(result.get("question_ids", [])):
+                session_questions.append(
+                    SessionQuestion(session=session, question_id=question_id, order=order)
+                )
+
+            # (player, session) is unique; the same account in two seats keeps its first seat
+            seen = set()
+            for p in result["players"]:
+                if p["user_id"] is None or p["user_id"] in seen:
+                    continue
+                seen.add(p["user_id"])
+                scores.append(PlayerScore(
+                    player_id=p["user_id"],
+                    session=session,
+                    score=p["score"],
+                    correct_answers=p["correct"],
+                    total_answers=p["total"],
+                ))
+
+            for a in result.get("answers", []):
+                answers.append(PlayerAnswer(
+                    session=session,
+                    player_id=user_ids.get(a["player"]),
+                    player_name=a["player"],
+                    question_id=a["question_id"],
+                    selected_option=a["selected"],
+                    is_correct=a["is_correct"],
+                    response_time_ms=a["response_time_ms"],
+                    answered_at=a["answered_at"],
+                ))
+
+        SessionQuestion.objects.bulk_create(session_questions)
+        PlayerScore.objects.bulk_create(scores)
+        PlayerAnswer.objects.bulk_create(answers)
+
+        by_mode = {}
+        for result in results:
+            by_mode.setdefault(result["mode"], []).extend(
+                (p["user_id"], p["score"], p["won"]) for p in result["players"]
+            )
+        for mode, rows in by_mode.items():
+            record_game_results(rows, mode=mode)
+
+        apply_game_ratings([
+            (session, [(p["user_id"], p["score"]) for p in result["players"]], result["finished_at"])
+            for session, result in zip(sessions, results)
+        ])
+
+        # bulk_create skips the post_save signal that normally does this
+        user_ids = {score.player_id for score in scores}
+        transaction.on_commit(lambda: invalidate_dashboard(*user_ids), robust=True)
+    return len(sessions)
+
+
+class WriteBehindQueue:
+    """asyncio queue drained by one background task that writes in batches."""
+
+    # Seconds before the next attempt, times the attempt number
+    retry_delay = 0.5
+
+    def __init__(self, persist=None, batch_size=None, flush_delay=None):
+        self.persist = persist or persist_game_results
+        self.batch_size = batch_size
+        # How long the worker waits for more results before writing a partial batch
+        self.flush_delay = flush_delay
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        if self.batch_size is None:
+            self.batch_size = getattr(settings, "QUIZ_PERSIST_BATCH_SIZE", 50)
+        if self.flush_delay is None:
+            self.flush_delay = getattr(settings, "QUIZ_PERSIST_FLUSH_DELAY", 0.2)
+
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    def enqueue(self, result):
+        """Queue a result; returns immediately. Must be called from the event loop."""
+        self._ensure_worker()
+        self._queue.put_nowait(result)
+
+    async def join(self):
+        """Wait until everything queued so far has been written (tests, shutdown)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _persist(self, batch):
+        from channels.db import database_sync_to_async
+
+        await database_sync_to_async(self.persist)(batch)
+
+    async def _write(self, batch):
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                await self._persist(batch)
+                return
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS:
+                    if len(batch) == 1:
+                        logger.error(f"Dropping game result {batch[0].get('room', '?')} after {attempt} attempts: {e}")
+                    else:
+                        logger.warning(f"Persisting {len(batch)} game results failed {attempt} times, writing them one by one: {e}")
+                        await self._write_each(batch)
+                    return
+                logger.warning(f"Persisting {len(batch)} game results failed (attempt {attempt}): {e}")
+                await asyncio.sleep(self.retry_delay * attempt)
+
+    async def _write_each(self, batch):
+        """Keep every game of a failing batch except the ones that fail on their own."""
+        for result in batch:
+            try:
+                await self._persist([result])
+            except Exception as e:
+                logger.error(f"Dropping game result {result.get('room', '?')}: {e}")
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+GAME_RESULTS = WriteBehindQueue()
+
+
+def enqueue_game_result(result):
+    GAME_RESULTS.enqueue(result)
@@ -0,0 +1,278 @@
+"""
+Question providers.
+
+A provider turns (topic, difficulty, num_questions, user) into a list of MCQ
+dicts, leaving out questions the user has already played where it can:
+
+    {"question": str, "options": [4 strings], "correct_answer": str, "explanation": str}
+
+GeminiQuestionGenerator (quiz/ai_service.py) is the remote provider.
+LocalQuestionProvider builds aptitude questions from templates with a seeded
+RNG, so the whole session pipeline can be load-tested without network calls
+or API cost, and it doubles as the fallback when Gemini is degraded. For any
+other topic it can only draw from the question bank, and returns nothing
+when the bank has no questions on that topic.
+"""
+import random
+
+from django.conf import settings
+
+
+class QuestionProvider:
+    """Interface every question provider implements."""
+    name = "base"
+
+    def is_available(self):
+        """Whether the provider can be expected to answer right now."""
+        return True
+
+    def generate_questions(self, topic, difficulty="medium", num_questions=5, user=None):
+        raise NotImplementedError
+
+    def generate_questions_stream(self, topic, difficulty="medium", num_questions=5, user=None):
+        """
+        Yield questions one by one. Providers that can stream override this.
+
+        Only `manage.py benchmark_question_pipeline` consumes the stream so
+        far. Sessions are built from the question bank (generate_mcq_questions
+        in views.py) and the websocket rooms read the bank too, so no request
+        path gets the earlier first question yet. A caller that builds a
+        session from a provider should iterate this rather than
+        generate_questions(), which collects the whole list.
+        """
+        yield from self.generate_questions(topic, difficulty, num_questions, user=user)
+
+
+# Number ranges per difficulty for the templates below
+_RANGES = {
+    "easy": (2, 20),
+    "medium": (10, 100),
+    "hard": (50, 500),
+}
+
+
+def _arithmetic(rng, lo, hi):
+    a, b = rng.randint(lo, hi), rng.randint(lo, hi)
+    op = rng.choice(["+", "-", "*"])
+    answer = {"+": a + b, "-": a - b, "*": a * b}[op]
+    return (
+        f"What is {a} {op} {b}?",
+        answer,
+        f"{a} {op} {b} = {answer}.",
+    )
+
+
+def _percentage(rng, lo, hi):
+    pct = rng.choice([5, 10, 12, 15, 20, 25, 30, 40, 50, 75])
+    base = rng.randint(lo, hi) * 4
+    answer = base * pct / 100
+    answer = int(answer) if answer == int(answer) else round(answer, 2)
+    return (
+        f"What is {pct}% of {base}?",
+        answer,
+        f"{pct}% of {base} = {base} x {pct} / 100 = {answer}.",
+    )
+
+
+def _sequence(rng, lo, hi):
+    start = rng.randint(lo, hi)
+    step = rng.randint(2, max(3, hi // 10))
+    terms = [start + step * i for i in range(4)]
+    answer = start + step * 4
+    return (
+        f"What comes next in the sequence {', '.join(map(str, terms))}, ...?",
+        answer,
+        f"Each term increases by {step}, so the next term is {answer}.",
+    )
+
+
+def _speed(rng, lo, hi):
+    hours = rng.randint(2, 6)
+    speed = rng.randint(lo, hi)
+    distance = speed * hours
+    return (
+        f"A vehicle covers {distance} km in {hours} hours at a constant speed. "
+        f"What is its speed in km/h?",
+        speed,
+        f"Speed = distance / time = {distance} / {hours} = {speed} km/h.",
+    )
+
+
+def _average(rng, lo, hi):
+    count = rng.randint(3, 5)
+    mean = rng.randint(lo, hi)
+    values = [mean + rng.randint(-lo, lo) for _ in range(count - 1)]
+    values.append(mean * count - sum(values))
+    return (
+        f"What is the average of {', '.join(map(str, values))}?",
+        mean,
+        f"The sum is {mean * count} and there are {count} numbers, so the average is {mean}.",
+    )
+
+
+TEMPLATES = [_arithmetic, _percentage, _sequence, _speed, _average]
+
+# Topics (normalized) the templates above actually cover
+TEMPLATE_TOPICS = {"aptitude", "quantitative aptitude", "arithmetic", "math", "maths", "mathematics"}
+
+
+class LocalQuestionProvider(QuestionProvider):
+    """
+    Offline provider: template MCQs for aptitude topics, the question bank
+    for everything else.
+
+    Template output is fully determined by the seed: the n-th call for a
+    given (topic, difficulty) returns the same questions on every run, and
+    later calls continue the sequence instead of repeating it.
+    """
+    name = "local"
+
+    def __init__(self, seed=0):
+        self.seed = seed
+        self._calls = {}
+
+    def generate_questions(self, topic, difficulty="medium", num_questions=5, user=None):
+        # Same normalization as models.normalize_topic (models need the app registry)
+        if " ".join(str(topic or "").lower().split()) not in TEMPLATE_TOPICS:
+            return self._from_bank(topic, difficulty, num_questions, user)
+
+        key = (topic, difficulty)
+        call_index = self._calls.get(key, 0)
+        self._calls[key] = call_index + 1
+
+        rng = random.Random(f"{self.seed}:{topic}:{difficulty}:{call_index}")
+        lo, hi = _RANGES.get(difficulty, _RANGES["medium"])
+
+        questions = []
+        seen = set()
+        attempts = 0
+        while len(questions) < num_questions and attempts < num_questions * 20:
+            attempts += 1
+            text, answer, explanation = rng.choice(TEMPLATES)(rng, lo, hi)
+            if text in seen:
+                continue
+            seen.add(text)
+
+            options = self._build_options(rng, answer)
+            questions.append({
+                "question": text,
+                "options": options,
+                "correct_answer": str(answer),
+                "explanation": explanation,
+            })
+
+        return questions
+
+    @staticmethod
+    def _from_bank(topic, difficulty, num_questions, user):
+        """Stored MCQs on the topic the user hasn't played yet (possibly fewer, or none)."""
+        from .models import Question
+        from .search import filter_by_topics
+
+        qs = filter_by_topics(Question.objects.filter(question_type="multiple_choice"), [topic])
+        if difficulty != "mixed":
+            qs = qs.filter(difficulty=difficulty)
+        if user is not None and getattr(user, "is_authenticated", False):
+            qs = qs.exclude(sessionquestion__session__playerscore__player=user)
+
+        questions = []
+        for q in qs.order_by("?")[:num_questions]:
+            options = [str(o) for o in q.options or []]
+            correct = str(q.correct_answer)
+            # Bank answers are stored as the option index or as the option text
+            if correct not in options and correct.isdigit() and int(correct) < len(options):
+                correct = options[int(correct)]
+            if correct not in options:
+                continue
+            questions.append({
+                "question": q.question_text,
+                "options": options,
+                "correct_answer": correct,
+                "explanation": q.explanation or "",
+            })
+        return questions
+
+    @staticmethod
+    def _build_options(rng, answer):
+        """Correct answer plus three nearby distractors, shuffled."""
+        spread = max(2, abs(int(answer)) // 5)
+        options = {str(answer)}
+        while len(options) < 4:
+            offset = rng.randint(1, spread) * rng.choice([-1, 1])
+            options.add(str(answer + offset))
+        options = sorted(options)
+        rng.shuffle(options)
+        return options
+
+
+class FallbackQuestionProvider(QuestionProvider):
+    """
+    Ask the primary provider first and top up from the fallback when the
+    primary is unavailable or comes back short.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def generate_questions(self, topic, difficulty="medium", num_questions=5, user=None):
+        return list(self.generate_questions_stream(topic, difficulty, num_questions, user=user))
+
+    def generate_questions_stream(self, topic, difficulty="medium", num_questions=5, user=None):
+        produced = 0
+        if self.primary.is_available():
+            try:
+                for question in self.primary.generate_questions_stream(
+                    topic, difficulty, num_questions, user=user
+                ):
+                    produced += 1
+                    yield question
+            except Exception as e:
+                print(f"{self.primary.name} provider failed: {e}")
+
+        if produced < num_questions:
+            yield from self.fallback.generate_questions_stream(
+                topic, difficulty, num_questions - produced, user=user
+            )
+
+
+def get_question_provider(name=None, seed=None):
+    """
+    Build the configured provider.
+
+    settings.QUESTION_PROVIDER picks "gemini" (default) or "local". The Gemini
+    provider falls back to the local one unless QUESTION_PROVIDER_FALLBACK is False.
+    """
+    name = name or getattr(settings, "QUESTION_PROVIDER", "gemini")
+    if seed is None:
+        seed = getattr(settings, "LOCAL_PROVIDER_SEED", 0)
+
+    local = LocalQuestionProvider(seed=seed)
+    if name == "local":
+        return local
+
+    # Imported here because ai_service imports this module for the base class
+    from .ai_service import GeminiQuestionGenerator
+
+    gemini = GeminiQuestionGenerator()
+    if getattr(settings, "QUESTION_PROVIDER_FALLBACK", True):
+        return FallbackQuestionProvider(gemini, local)
+    return gemini
+
+
+def to_session_question(question, topic, difficulty, is_ai_generated=True):
+    """
+    Convert a provider question into the dict shape start_single_session
+    persists (correct_answer stored as the option index, like the fallbacks).
+    """
+    return {
+        "question_text": question["question"],
+        "question_type": "multiple_choice",
+        "difficulty": difficulty if difficulty != "mixed" else "medium",
+        "options": question["options"],
+        "correct_answer": question["options"].index(question["correct_answer"]),
+        "explanation": question.get("explanation", ""),
+        "category": topic,
+        "is_ai_generated": is_ai_generated,
+    }
@@ -0,0 +1,189 @@
+"""
+Per-question statistics rolled up from PlayerAnswer.
+
+Question.difficulty is a hand-set label. rollup_question_stats() measures
+each question instead: attempts, correct answers, correct rate and median
+response time. It then calibrates Question.irt_difficulty for adaptive
+sessions (quiz/adaptive.py).
+
+One streaming pass: answers are read with a chunked iterator ordered by
+question, so only one question's rollup is in memory at a time. Finished
+rollups are written with bulk_update every `chunk_size` questions. A median
+needs every value, so response times go into a log-scale histogram
+(HISTOGRAM_STEPS buckets per doubling, about 19% wide). Histograms of two
+runs simply add up, and the median is read from the bucket holding it.
+
+Incremental mode reads only answers with an id past the "question_stats"
+StatsCheckpoint and merges them into the stored counts and histograms.
+--full recomputes the counts from scratch. irt_difficulty is only
+overwritten for questions that have answers, so a calibration survives
+until there is new data to replace it.
+"""
+import math
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .adaptive import DIFFICULTY_PRIOR, p_correct
+
+CHECKPOINT_NAME = "question_stats"
+
+# Histogram buckets per doubling of response time
+HISTOGRAM_STEPS = 4
+
+
+def time_bucket(response_time_ms):
+    return math.floor(math.log2(max(response_time_ms, 1)) * HISTOGRAM_STEPS)
+
+
+def bucket_value(bucket):
+    """Representative response time (ms) of a bucket: its geometric midpoint."""
+    return round(2 ** ((bucket + 0.5) / HISTOGRAM_STEPS))
+
+
+def merge_histograms(a, b):
+    """Sum of two histograms (JSON keys are strings)."""
+    merged = Counter({int(k): v for k, v in a.items()})
+    merged.update({int(k): v for k, v in b.items()})
+    return {str(k): v for k, v in sorted(merged.items())}
+
+
+def histogram_median(histogram):
+    """Median response time (ms) of a histogram, or None when it is empty."""
+    counts = sorted((int(k), v) for k, v in histogram.items())
+    total = sum(v for _, v in counts)
+    if not total:
+        return None
+    seen = 0
+    for bucket, count in counts:
+        seen += count
+        if seen * 2 >= total:
+            return bucket_value(bucket)
+
+
+def calibrated_difficulty(correct, attempts, label, weight=None):
+    """
+    Rasch item difficulty for a player of ability 0: -logit(correct rate).
+    The label's prior difficulty counts as `weight` extra answers, so a
+    question with few answers stays close to its label.
+    """
+    weight = weight if weight is not None else getattr(settings, "QUESTION_STATS_PRIOR_WEIGHT", 10)
+    prior = p_correct(0.0, DIFFICULTY_PRIOR.get(label, 0.0))
+    rate = (correct + weight * prior) / (attempts + weight)
+    rate = min(max(rate, 0.01), 0.99)
+    return math.log((1 - rate) / rate)
+
+
+class Rollup:
+    """Answers to one question seen in this run."""
+
+    __slots__ = ("question_id", "attempts", "correct", "histogram")
+
+    def __init__(self, question_id):
+        self.question_id = question_id
+        self.attempts = 0
+        self.correct = 0
+        self.histogram = Counter()
+
+    def add(self, is_correct, response_time_ms):
+        self.attempts += 1
+        if is_correct:
+            self.correct += 1
+        if response_time_ms is not None:
+            self.histogram[str(time_bucket(response_time_ms))] += 1
+
+
+def iter_rollups(rows):
+    """(question_id, is_correct, response_time_ms) rows sorted by question -> one Rollup per question."""
+    current = None
+    for question_id, is_correct, response_time_ms in rows:
+        if current is None or current.question_id != question_id:
+            if current is not None:
+                yield current
+            current = Rollup(question_id)
+        current.add(is_correct, response_time_ms)
+    if current is not None:
+        yield current
+
+
+def _write(rollups, merge, now):
+    from .models import Question
+
+    fields = [
+        "attempt_count", "correct_count", "correct_rate", "median_response_ms",
+        "response_time_histogram", "stats_updated_at", "irt_difficulty",
+    ]
+    questions = Question.objects.only("difficulty", *fields).in_bulk([r.question_id for r in rollups])
+    updated = []
+    for rollup in rollups:
+        question = questions.get(rollup.question_id)
+        if question is None:
+            continue
+        if merge:
+            question.attempt_count += rollup.attempts
+            question.correct_count += rollup.correct
+            question.response_time_histogram = merge_histograms(question.response_time_histogram, rollup.histogram)
+        else:
+            question.attempt_count = rollup.attempts
+            question.correct_count = rollup.correct
+            question.response_time_histogram = merge_histograms({}, rollup.histogram)
+        question.correct_rate = question.correct_count / question.attempt_count
+        question.median_response_ms = histogram_median(question.response_time_histogram)
+        question.irt_difficulty = calibrated_difficulty(
+            question.correct_count, question.attempt_count, question.difficulty,
+        )
+        question.stats_updated_at = now
+        updated.append(question)
+    Question.objects.bulk_update(updated, fields, batch_size=500)
+    return len(updated)
+
+
+def rollup_question_stats(full=False, chunk_size=1000):
+    """
+    Roll up PlayerAnswer rows past the checkpoint (all of them with full=True)
+    into Question. Returns counts and timings.
+    """
+    from django.db import transaction
+    from django.db.models import Max
+    from django.utils import timezone
+
+    from .models import PlayerAnswer, Question, StatsCheckpoint
+
+    start = time.perf_counter()
+    stats = {"answers": 0, "questions": 0, "full": full}
+    with transaction.atomic():
+        checkpoint, _ = StatsCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT_NAME)
+        after = 0 if full else checkpoint.last_id
+        # Fixed upper bound, so answers written during the run wait for the next one
+        upto = PlayerAnswer.objects.aggregate(last=Max("id"))["last"] or 0
+        stats["from_id"], stats["to_id"] = after, upto
+
+        if full:
+            Question.objects.update(
+                attempt_count=0, correct_count=0, correct_rate=None, median_response_ms=None,
+                response_time_histogram={}, stats_updated_at=None,
+            )
+        if upto > after:
+            rows = (
+                PlayerAnswer.objects
+                .filter(id__gt=after, id__lte=upto)
+                .order_by("question_id", "id")
+                .values_list("question_id", "is_correct", "response_time_ms")
+                .iterator(chunk_size=chunk_size)
+            )
+            now = timezone.now()
+            batch = []
+            for rollup in iter_rollups(rows):
+                stats["answers"] += rollup.attempts
+                batch.append(rollup)
+                if len(batch) >= chunk_size:
+                    stats["questions"] += _write(batch, merge=not full, now=now)
+                    batch = []
+            if batch:
+                stats["questions"] += _write(batch, merge=not full, now=now)
+
+        checkpoint.last_id = max(upto, after)
+        checkpoint.save()
+    stats["seconds"] = time.perf_counter() - start
+    return stats
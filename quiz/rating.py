@@ -0,0 +1,327 @@
+"""
+Elo skill ratings for multiplayer quizzes and coding battles.
+
+A game with n players counts as n-1 pairwise results for each player (win
+1, tie 0.5, loss 0, by final score), each weighted 1/(n-1). A duel is
+plain Elo, and a big room moves a rating about as much as one duel.
+Guests are left out: only registered players' seats are compared, so the
+incremental ratings match what a replay of PlayerScore (which has no guest
+rows) produces.
+
+Incremental: the write-behind queue (quiz/persistence.py) calls
+apply_game_ratings() for every batch of finished games. That is one query
+to load the ratings, one bulk_update and one RatingHistory bulk_create per
+batch.
+
+Batch: recompute_ratings() replays every rated PlayerScore from scratch
+(guests have no PlayerScore, so a replay only sees registered players).
+Elo is sequential per player, but games with no player in common don't
+affect each other. So replay() groups games into rounds where each player
+appears at most once, keeping every player's games in order. With numpy,
+each round is then a few array operations over all of its pairwise
+results. Without numpy the games are replayed one by one in Python, with
+the same result.
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # optional speedup
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATING = 1200.0
+# Rating gap at which the stronger player is expected to win 10:1
+SCALE = 400.0
+
+RATED_MODES = ("multiplayer", "coding_battle")
+
+
+def k_factor():
+    return getattr(settings, "RATING_K", 32)
+
+
+def expected(rating, opponent):
+    """Expected score of `rating` against `opponent`."""
+    return 1.0 / (1.0 + 10 ** ((opponent - rating) / SCALE))
+
+
+def ability_from_rating(rating):
+    """The rating on the logit scale used by adaptive difficulty (0 = DEFAULT_RATING)."""
+    return (rating - DEFAULT_RATING) * math.log(10) / SCALE
+
+
+def game_deltas(ratings, scores, k=None):
+    """
+    Rating change for each seat of one game, from seat ratings and final
+    scores. All n*(n-1) pairs are compared; with numpy that is one n x n
+    array operation, so a 500-seat arena room stays cheap.
+    """
+    n = len(ratings)
+    if n < 2:
+        return [0.0] * n
+    k = k or k_factor()
+    if np is not None and n > 2:
+        r = np.asarray(ratings, dtype=np.float64)
+        s = np.asarray(scores, dtype=np.float64)
+        actual = (np.sign(s[:, None] - s[None, :]) + 1) / 2
+        e = 1.0 / (1.0 + 10 ** ((r[None, :] - r[:, None]) / SCALE))
+        # The diagonal (a seat against itself) is 0.5 - 0.5 and adds nothing
+        return (k * (actual - e).sum(axis=1) / (n - 1)).tolist()
+
+    deltas = []
+    for i in range(n):
+        total = 0.0
+        for j in range(n):
+            if i != j:
+                actual = 1.0 if scores[i] > scores[j] else 0.5 if scores[i] == scores[j] else 0.0
+                total += actual - expected(ratings[i], ratings[j])
+        deltas.append(k * total / (n - 1))
+    return deltas
+
+
+# ---- Incremental updates ----
+
+
+def apply_game_ratings(games):
+    """
+    Rate a batch of finished games, oldest first.
+
+    games: [(session, [(user_id or None, score), ...], finished_at)]
+    Returns the number of RatingHistory rows written.
+    """
+    from .models import CustomUser, RatingHistory
+
+    user_ids = {uid for _, seats, _ in games for uid, _ in seats if uid is not None}
+    if not user_ids:
+        return 0
+    current = dict(
+        CustomUser.objects.select_for_update().filter(pk__in=user_ids).values_list("id", "rating")
+    )
+
+    history = []
+    for session, seats, finished_at in games:
+        # Registered players only, the same account in two seats playing its
+        # first seat: the rows PlayerScore keeps and recompute_ratings replays
+        seen, unique = set(), []
+        for uid, score in seats:
+            if uid is None or uid in seen or uid not in current:
+                continue
+            seen.add(uid)
+            unique.append((uid, score))
+        seats = unique
+        ratings = [current[uid] for uid, _ in seats]
+        deltas = game_deltas(ratings, [score for _, score in seats])
+        for (uid, _), before, delta in zip(seats, ratings, deltas):
+            current[uid] = before + delta
+            history.append(RatingHistory(
+                player_id=uid,
+                session=session,
+                rating=round(before + delta),
+                delta=round(delta),
+                created_at=finished_at,
+            ))
+
+    CustomUser.objects.bulk_update(
+        [CustomUser(pk=uid, rating=rating) for uid, rating in current.items()], ["rating"], batch_size=500,
+    )
+    RatingHistory.objects.bulk_create(history, batch_size=1000)
+    return len(history)
+
+
+# ---- Batch recomputation ----
+
+
+def replay(games, num_players, k=None):
+    """
+    Replay games from scratch.
+
+    games: [(seats, scores)] oldest first, seats being player indexes in
+    range(num_players). Returns (ratings, deltas, after): the final rating
+    per player, and each seat's change and resulting rating, flattened in
+    input order (game by game, seat by seat).
+    """
+    sizes, seat_player, seat_score = [], [], []
+    for seats, scores in games:
+        sizes.append(len(seats))
+        seat_player.extend(seats)
+        seat_score.extend(scores)
+    return replay_flat(sizes, seat_player, seat_score, num_players, k)
+
+
+def replay_flat(sizes, seat_player, seat_score, num_players, k=None):
+    """replay() on flat lists: seats per game, then all games' seat players and scores in order."""
+    k = k or k_factor()
+    if np is not None:
+        return _replay_numpy(sizes, seat_player, seat_score, num_players, k)
+
+    ratings = [DEFAULT_RATING] * num_players
+    deltas, after = [], []
+    pos = 0
+    for n in sizes:
+        seats = seat_player[pos:pos + n]
+        for player, delta in zip(seats, game_deltas([ratings[p] for p in seats], seat_score[pos:pos + n], k)):
+            ratings[player] += delta
+            deltas.append(delta)
+            after.append(ratings[player])
+        pos += n
+    return ratings, deltas, after
+
+
+def _rounds(sizes, seat_player, num_players):
+    """Round of each game: one past the latest round of any of its players."""
+    last = [-1] * num_players
+    rounds = []
+    pos = 0
+    for n in sizes:
+        if n == 2:
+            a, b = seat_player[pos], seat_player[pos + 1]
+            r = max(last[a], last[b]) + 1
+            last[a] = last[b] = r
+        else:
+            seats = seat_player[pos:pos + n]
+            r = max(last[p] for p in seats) + 1
+            for p in seats:
+                last[p] = r
+        rounds.append(r)
+        pos += n
+    return rounds
+
+
+def _replay_numpy(sizes, seat_player, seat_score, num_players, k):
+    if not len(sizes):
+        return np.full(num_players, DEFAULT_RATING), np.zeros(0), np.zeros(0)
+    game_round = np.asarray(_rounds(list(sizes), list(seat_player), num_players), dtype=np.int64)
+    sizes = np.asarray(sizes, dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+
+    # Seats reordered by round (stable, so games stay whole and in order); each
+    # round's seats, and so its pairs, are then one contiguous slice
+    order = np.argsort(np.repeat(game_round, sizes), kind="stable")
+    player = np.asarray(seat_player, dtype=np.int64)[order]
+    score = np.asarray(seat_score, dtype=np.float64)[order]
+    seat_round = np.repeat(game_round, sizes)[order]
+    seat_in_game = (np.arange(order.size) - np.repeat(starts, sizes))[order]
+    offsets = np.flatnonzero(seat_in_game == 0)
+    game_sizes = np.repeat(sizes, sizes)[order][offsets]
+
+    # All ordered pairs (i, j), i != j, built per game size
+    pair_a, pair_b, pair_w = [], [], []
+    for n in np.unique(game_sizes):
+        if n < 2:
+            continue
+        i, j = np.nonzero(~np.eye(n, dtype=bool))
+        base = offsets[game_sizes == n][:, None]
+        pair_a.append((base + i).ravel())
+        pair_b.append((base + j).ravel())
+        pair_w.append(np.full(pair_a[-1].size, 1.0 / (n - 1)))
+    if pair_a:
+        a, b, w = np.concatenate(pair_a), np.concatenate(pair_b), np.concatenate(pair_w)
+        by_seat = np.argsort(a, kind="stable")
+        a, b, w = a[by_seat], b[by_seat], w[by_seat]
+    else:
+        a = b = np.zeros(0, dtype=np.int64)
+        w = np.zeros(0)
+    weight = k * w
+    actual = (np.sign(score[a] - score[b]) + 1) / 2
+
+    num_rounds = int(game_round.max()) + 1
+    seat_bounds = np.searchsorted(seat_round, np.arange(num_rounds + 1))
+    pair_bounds = np.searchsorted(seat_round[a], np.arange(num_rounds + 1))
+
+    ratings = np.full(num_players, DEFAULT_RATING)
+    seat_delta = np.zeros(order.size)
+    seat_after = np.zeros(order.size)
+    for r in range(num_rounds):
+        ss, se = seat_bounds[r], seat_bounds[r + 1]
+        ps, pe = pair_bounds[r], pair_bounds[r + 1]
+        pa, pb = a[ps:pe], b[ps:pe]
+        e = 1.0 / (1.0 + 10 ** ((ratings[player[pb]] - ratings[player[pa]]) / SCALE))
+        d = np.bincount(pa - ss, weights=weight[ps:pe] * (actual[ps:pe] - e), minlength=se - ss)
+        players = player[ss:se]
+        ratings[players] += d
+        seat_delta[ss:se] = d
+        seat_after[ss:se] = ratings[players]
+
+    # Back to input order
+    deltas = np.empty_like(seat_delta)
+    after = np.empty_like(seat_after)
+    deltas[order] = seat_delta
+    after[order] = seat_after
+    return ratings, deltas, after
+
+
+def load_games(chunk_size=20000):
+    """
+    Rated games from PlayerScore, oldest first, as flat lists:
+    (sessions [(id, created_at)], sizes, seat user ids, seat scores).
+    """
+    from .models import PlayerScore
+
+    rows = (
+        PlayerScore.objects
+        .filter(session__session_type__in=RATED_MODES)
+        .order_by("session__created_at", "session_id")
+        .values_list("session_id", "session__created_at", "player_id", "score")
+        .iterator(chunk_size=chunk_size)
+    )
+    sessions, sizes, seat_user, seat_score = [], [], [], []
+    for session_id, created_at, user_id, score in rows:
+        if not sessions or sessions[-1][0] != session_id:
+            sessions.append((session_id, created_at))
+            sizes.append(0)
+        sizes[-1] += 1
+        seat_user.append(user_id)
+        seat_score.append(score)
+    return sessions, sizes, seat_user, seat_score
+
+
+def recompute_ratings(history=False, chunk_size=20000):
+    """
+    Rebuild every CustomUser.rating (and RatingHistory with history=True)
+    from PlayerScore. Returns timings and counts.
+    """
+    from django.db import transaction
+
+    from .models import CustomUser, RatingHistory
+
+    stats = {}
+    start = time.perf_counter()
+    sessions, sizes, seat_user, seat_score = load_games(chunk_size)
+    index = {}
+    seat_player = [index.setdefault(uid, len(index)) for uid in seat_user]
+    stats["load_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ratings, deltas, after = replay_flat(sizes, seat_player, seat_score, len(index))
+    stats["replay_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with transaction.atomic():
+        CustomUser.objects.update(rating=DEFAULT_RATING)
+        CustomUser.objects.bulk_update(
+            [CustomUser(pk=uid, rating=float(ratings[i])) for uid, i in index.items()],
+            ["rating"], batch_size=500,
+        )
+        if history:
+            RatingHistory.objects.all().delete()
+            rows, pos = [], 0
+            for (session_id, created_at), n in zip(sessions, sizes):
+                for _ in range(n):
+                    rows.append(RatingHistory(
+                        player_id=seat_user[pos], session_id=session_id, created_at=created_at,
+                        rating=round(float(after[pos])), delta=round(float(deltas[pos])),
+                    ))
+                    pos += 1
+                if len(rows) >= chunk_size:
+                    RatingHistory.objects.bulk_create(rows, batch_size=1000)
+                    rows = []
+            RatingHistory.objects.bulk_create(rows, batch_size=1000)
+    stats["write_s"] = time.perf_counter() - start
+    stats.update(games=len(sessions), players=len(index), vectorized=np is not None)
+    return stats
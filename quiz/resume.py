@@ -0,0 +1,111 @@
+"""
+Reconnect and resume for players whose websocket dropped.
+
+create/join hand the client a resume token. Every room frame sent through
+broadcast() (and personal frames sent through send_personal()) is stamped
+with a room-wide sequence number "seq" and kept in a bounded per-room
+ReplayBuffer. A reconnecting client sends
+{"action": "resume", "room": ..., "token": ..., "seq": <last seq seen>}:
+its new channel goes back into the room's group and it gets the frames it
+missed. When the buffer no longer reaches back that far, it gets a snapshot
+of the room instead. The game itself never restarts.
+"""
+import secrets
+from collections import deque
+from itertools import islice
+
+from django.conf import settings
+
+
+def issue_token():
+    return secrets.token_urlsafe(16)
+
+
+class ReplayBuffer:
+    """Last RESUME_BUFFER_SIZE frames of a room, each with its seq and audience."""
+
+    def __init__(self, size=None):
+        self.frames = deque(maxlen=size or getattr(settings, "RESUME_BUFFER_SIZE", 200))
+        self.seq = 0
+
+    def reserve(self, size):
+        """Grow the buffer to hold at least `size` frames (arena rooms record one frame per player)."""
+        if size > self.frames.maxlen:
+            self.frames = deque(self.frames, maxlen=size)
+
+    def record(self, payload, exclude=None, to=None):
+        """Stamp payload with the next seq and keep it. Returns the stamped copy."""
+        self.seq += 1
+        payload = {**payload, "seq": self.seq}
+        self.frames.append((self.seq, payload, exclude, to))
+        return payload
+
+    def missed(self, player, after):
+        """Frames for player with seq > after, or None when some of them were already dropped."""
+        if after >= self.seq:
+            return []
+        if not self.frames or self.frames[0][0] > after + 1:
+            return None
+        start = max(after + 1 - self.frames[0][0], 0)
+        return [
+            payload for _, payload, exclude, to in islice(self.frames, start, None)
+            if exclude != player and to in (None, player)
+        ]
+
+
+class ResumeMixin:
+    """
+    Resume handling for a consumer using BroadcastMixin. The consumer sets
+    `resume_rooms` (its in-memory room dict, whose rooms carry "tokens" and
+    "replay"), implements spectator_snapshot(room_name, room), which doubles
+    as the catch-up snapshot, and may override on_resumed(room, player).
+    """
+
+    resume_rooms = {}
+
+    def new_resume_token(self, room, player):
+        token = issue_token()
+        room["tokens"][token] = player
+        return token
+
+    async def broadcast(self, group, payload, exclude=None):
+        room = self.resume_rooms.get(group)
+        if room is not None:
+            payload = room["replay"].record(payload, exclude=exclude)
+        await super().broadcast(group, payload, exclude=exclude)
+
+    async def send_personal(self, payload):
+        """send_frame() for frames the player must still get after a reconnect."""
+        room = self.resume_rooms.get(getattr(self, "room_name", None))
+        if room is not None:
+            payload = room["replay"].record(payload, to=self.player_name)
+        await self.send_frame(payload)
+
+    def on_resumed(self, room, player):
+        pass
+
+    async def handle_resume(self, data):
+        room_name = data.get("room")
+        room = self.resume_rooms.get(room_name)
+        player = room["tokens"].get(data.get("token")) if room is not None else None
+        if player is None:
+            await self.send_frame({"error": "Cannot resume, the room or token is unknown"})
+            return
+
+        self.room_name = room_name
+        self.player_name = player
+        self.compress = bool(data.get("compress"))
+        await self.join_group(room_name)
+        self.on_resumed(room, player)
+
+        last_seq = data.get("seq")
+        replay = room["replay"]
+        frames = replay.missed(player, last_seq if isinstance(last_seq, int) else 0)
+        resumed = {"event": "resumed", "room": room_name, "player": player, "seq": replay.seq}
+        if frames is None:
+            resumed["snapshot"] = self.spectator_snapshot(room_name, room)
+            frames = []
+        await self.send_frame(resumed)
+        # Frames broadcast while this ran may also arrive live; clients drop seqs they have seen
+        for frame in frames:
+            await self.send_frame(frame)
@@ -0,0 +1,140 @@
+"""
+Topic search for questions.
+
+Two indexes back topic filtering:
+
+* Topic tags (Question.topics) - exact, normalized topic names.
+* A full-text index over question_text + category - an FTS5 table on SQLite,
+  a GIN tsvector index on PostgreSQL (created in migration 0008).
+
+Both are index lookups, so the cost grows with the number of matches rather
+than the size of the question bank. Other database backends fall back to the
+old LIKE matching.
+"""
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Question, Topic, normalize_topic
+
+FTS_TABLE = "quiz_question_fts"
+
+_fts_available = None
+
+# Keep the FTS table in step with quiz_question (same as migration 0008)
+SQLITE_FTS_TRIGGERS = {
+    "quiz_question_fts_ai": """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_ai AFTER INSERT ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(rowid, question_text, category)
+        VALUES (new.id, new.question_text, new.category);
+    END""",
+    "quiz_question_fts_ad": """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_ad AFTER DELETE ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(quiz_question_fts, rowid, question_text, category)
+        VALUES ('delete', old.id, old.question_text, old.category);
+    END""",
+    "quiz_question_fts_au": """CREATE TRIGGER IF NOT EXISTS quiz_question_fts_au AFTER UPDATE ON quiz_question BEGIN
+        INSERT INTO quiz_question_fts(quiz_question_fts, rowid, question_text, category)
+        VALUES ('delete', old.id, old.question_text, old.category);
+        INSERT INTO quiz_question_fts(rowid, question_text, category)
+        VALUES (new.id, new.question_text, new.category);
+    END""",
+}
+
+
+def _has_sqlite_fts():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available
+
+
+def ensure_fts_triggers(using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Recreate missing FTS triggers after migrate (connected in apps.py).
+
+    SQLite has no ALTER COLUMN, so a migration that remakes quiz_question
+    drops its triggers with the old table, and the index silently stops
+    following question changes. When any trigger is gone they are put back
+    and the index is rebuilt from the table.
+    """
+    conn = connections[using]
+    if conn.vendor != "sqlite" or FTS_TABLE not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'quiz_question'")
+        existing = {row[0] for row in cursor.fetchall()}
+        if existing.issuperset(SQLITE_FTS_TRIGGERS):
+            return
+        for sql in SQLITE_FTS_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def full_text_match(names):
+    """
+    Q matching questions whose text or category contain any of the topic
+    names, served by the full-text index. None when the database has none.
+    """
+    if connection.vendor == "sqlite" and _has_sqlite_fts():
+        # Prefix match on the last word keeps "py" -> "python" working like the old icontains
+        match = " OR ".join(f"{_quote(name)}*" for name in names)
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    elif connection.vendor == "postgresql":
+        match = " OR ".join(_quote(name) for name in names)
+        sql = (
+            "SELECT id FROM quiz_question WHERE "
+            "to_tsvector('english', coalesce(question_text, '') || ' ' || coalesce(category, '')) "
+            "@@ websearch_to_tsquery('english', %s)"
+        )
+    else:
+        return None
+
+    return Q(id__in=RawSQL(sql, [match]))
+
+
+def tagged_match(names):
+    """Q matching questions tagged with any of the (normalized) topic names."""
+    tagged = Question.topics.through.objects.filter(topic__name__in=names).values("question_id")
+    return Q(id__in=tagged)
+
+
+def filter_by_topics(qs, topics):
+    """Restrict a Question queryset to the given topics using the topic indexes."""
+    names = sorted({normalize_topic(t) for t in topics if normalize_topic(t)})
+    if not names:
+        return qs
+
+    text_match = full_text_match(names)
+    if text_match is None:
+        topic_filter = Q(topics__name__in=names)
+        for name in names:
+            topic_filter |= Q(category__icontains=name) | Q(question_text__icontains=name)
+        return qs.filter(topic_filter).distinct()
+
+    # Both sides are index lookups run as subqueries inside one statement
+    return qs.filter(text_match | tagged_match(names))
+
+
+def tag_questions(question_topics):
+    """
+    Attach topic tags in bulk.
+
+    question_topics is an iterable of (question_id, topic name) pairs. Two
+    bulk inserts no matter how many questions; existing tags are skipped.
+    """
+    pairs = [(qid, normalize_topic(name)) for qid, name in question_topics if normalize_topic(name)]
+    if not pairs:
+        return
+
+    names = {name for _, name in pairs}
+    Topic.objects.bulk_create([Topic(name=name) for name in names], ignore_conflicts=True)
+    topic_ids = dict(Topic.objects.filter(name__in=names).values_list("name", "id"))
+
+    Through = Question.topics.through
+    Through.objects.bulk_create(
+        [Through(question_id=qid, topic_id=topic_ids[name]) for qid, name in pairs],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dashboard import invalidate_dashboard
+from .models import PlayerScore
+
+
+@receiver(post_save, sender=PlayerScore)
+@receiver(post_delete, sender=PlayerScore)
+def playerscore_changed(sender, instance, **kwargs):
+    """Any change to a player's scores makes their cached dashboard stale."""
+    invalidate_dashboard(instance.player_id)
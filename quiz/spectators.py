@@ -0,0 +1,147 @@
+"""
+Read-only spectator stream for quiz rooms and coding battles.
+
+Spectators join "<room>_spectators", a group separate from the players', so
+nothing a viewer does (or how many there are) sits on the players' send
+path. Players' consumers only call relay.publish(), which stores the latest
+value per key; a background flush sends everything pending as one
+`spectator_update` frame at most SPECTATOR_MAX_UPDATES_PER_SEC times a
+second. Coalescing is per key, so a burst of score changes shows up as the
+final score.
+
+Code is relayed as diffs (quiz/code_diff.py) against the last version
+spectators were sent, so several submissions between flushes become a single
+diff. New spectators get a snapshot with those last-sent versions, so later
+diffs apply cleanly.
+"""
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+
+from .broadcast import encode_frame
+from .code_diff import make_diff
+
+logger = logging.getLogger(__name__)
+
+
+def spectator_group(room_name):
+    return f"{room_name}_spectators"
+
+
+class SpectatorRelay:
+    def __init__(self, channel_layer, room_name, max_rate=None):
+        self.channel_layer = channel_layer
+        self.group = spectator_group(room_name)
+        max_rate = max_rate or getattr(settings, "SPECTATOR_MAX_UPDATES_PER_SEC", 4)
+        self.interval = 1.0 / max_rate
+        self.viewers = 0
+        self.pending = {}      # key -> update dict, latest wins
+        self.code = {}         # player -> code as last sent to spectators
+        self.pending_code = {}  # player -> newest code not yet sent
+        self._last_flush = 0.0
+        self._task = None
+
+    def publish(self, key, update, urgent=False):
+        """Queue an update for spectators; urgent ones (game over) skip the rate limit."""
+        if not self.viewers:
+            return
+        self.pending[key] = update
+        self._schedule(0 if urgent else None)
+
+    def publish_code(self, player, code):
+        if not self.viewers:
+            self.code[player] = code  # keep the baseline current for future viewers
+            return
+        self.pending_code[player] = code
+        self._schedule()
+
+    def snapshot_code(self):
+        """Code versions the next diffs are relative to (for a new spectator's snapshot)."""
+        return dict(self.code)
+
+    def _schedule(self, delay=None):
+        if delay is None:
+            delay = max(self._last_flush + self.interval - time.monotonic(), 0)
+        if self._task is not None and not self._task.done():
+            if delay > 0:
+                return
+            self._task.cancel()
+        self._task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self._task = None
+        await self.flush()
+
+    async def flush(self):
+        updates = list(self.pending.values())
+        self.pending = {}
+
+        for player, code in self.pending_code.items():
+            diff = make_diff(self.code.get(player, ""), code)
+            if diff is not None:
+                updates.append({"event": "code", "player": player, "diff": diff})
+            self.code[player] = code
+        self.pending_code = {}
+
+        if not updates:
+            return
+        self._last_flush = time.monotonic()
+        try:
+            await self.channel_layer.group_send(self.group, {
+                "type": "broadcast_frame",
+                "text": encode_frame({"event": "spectator_update", "updates": updates}),
+                "exclude": None,
+            })
+        except Exception as e:
+            logger.error(f"Spectator update for {self.group} failed: {e}")
+
+
+class SpectatorMixin:
+    """
+    Spectator handling for a consumer. The consumer sets `spectator_rooms`
+    (its in-memory room dict) and implements spectator_snapshot(room_name, room).
+    """
+
+    spectator_rooms = {}
+
+    async def handle_spectate(self, data):
+        room_name = data.get("room")
+        room = self.spectator_rooms.get(room_name)
+        if room is None:
+            await self.send_frame({"error": "Room not found"})
+            return
+
+        relay = room.get("relay")
+        if relay is None:
+            relay = room["relay"] = SpectatorRelay(self.channel_layer, room_name)
+        relay.viewers += 1
+        self.spectating = room_name
+
+        await self.channel_layer.group_add(relay.group, self.channel_name)
+        snapshot = self.spectator_snapshot(room_name, room)
+        snapshot.update({"event": "spectating", "room": room_name})
+        await self.send_frame(snapshot)
+
+    async def stop_spectating(self):
+        room_name = getattr(self, "spectating", None)
+        if room_name is None:
+            return
+        self.spectating = None
+        room = self.spectator_rooms.get(room_name)
+        if room is not None and room.get("relay") is not None:
+            room["relay"].viewers = max(room["relay"].viewers - 1, 0)
+        await self.channel_layer.group_discard(spectator_group(room_name), self.channel_name)
+
+    def to_spectators(self, room, key, update, urgent=False):
+        relay = room.get("relay")
+        if relay is not None:
+            relay.publish(key, update, urgent=urgent)
+
+    def code_to_spectators(self, room, player, code):
+        relay = room.get("relay")
+        if relay is not None:
+            relay.publish_code(player, code)
@@ -0,0 +1,327 @@
+"""
+Coalesced user stats writes.
+
+CustomUser.update_stats normally issues one atomic UPDATE per game. With
+QUIZ_STATS_BUFFERED = True it instead adds the game to a buffer of per-user
+deltas (score, games, wins). The buffer is flushed in batches, and each
+batch is a single UPDATE over all the users in it (apply_stat_deltas). A
+user who finishes ten games between flushes costs one row write, not ten.
+
+The buffer lives in Redis when it is reachable, so every worker shares it
+and `manage.py flush_user_stats` can flush it from cron. Otherwise each
+process keeps its own, which only that process can flush. Either way it is
+flushed when it holds QUIZ_STATS_FLUSH_SIZE users, by a background timer
+every QUIZ_STATS_FLUSH_INTERVAL seconds (so a worker that goes quiet does
+not sit on deltas), and at exit.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY = "stats:pending"
+
+# A drained Redis hash still around after this long belongs to a flush that died
+ORPHAN_AGE = 300
+
+# Users per UPDATE statement, keeps the CASE expressions a sensible size
+APPLY_CHUNK_SIZE = 500
+
+
+def stats_buffered():
+    return getattr(settings, "QUIZ_STATS_BUFFERED", False)
+
+
+def apply_stat_deltas(deltas):
+    """
+    Apply {user_id: (score, games, wins)} to CustomUser in one UPDATE per
+    chunk of users, then refresh their leaderboard totals. Returns the
+    number of users updated.
+    """
+    from django.db.models import Case, F, FloatField, IntegerField, Value, When
+    from django.db.models.functions import Cast
+
+    from . import leaderboard
+    from .models import CustomUser
+
+    deltas = {uid: d for uid, d in deltas.items() if uid is not None and d[1] > 0}
+    if not deltas:
+        return 0
+
+    user_ids = sorted(deltas)
+    updated = 0
+    with transaction.atomic():
+        for i in range(0, len(user_ids), APPLY_CHUNK_SIZE):
+            chunk = user_ids[i:i + APPLY_CHUNK_SIZE]
+
+            def per_user(index):
+                return Case(
+                    *[When(pk=uid, then=Value(deltas[uid][index])) for uid in chunk],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+
+            score, games, wins = per_user(0), per_user(1), per_user(2)
+            # All right-hand sides see the old row values, so win_rate is
+            # recomputed from the old games_played and the new totals.
+            updated += CustomUser.objects.filter(pk__in=chunk).update(
+                total_score=F("total_score") + score,
+                games_played=F("games_played") + games,
+                win_rate=(
+                    F("win_rate") * Cast(F("games_played"), FloatField()) + Cast(wins, FloatField()) * 100.0
+                ) / Cast(F("games_played") + games, FloatField()),
+            )
+
+        totals = list(CustomUser.objects.filter(pk__in=user_ids).values_list("id", "total_score"))
+
+    # Right away outside a transaction; after the commit inside one (quiz/persistence.py)
+    def push_totals():
+        for user_id, total_score in totals:
+            leaderboard.record_score(user_id, total_score)
+
+    transaction.on_commit(push_totals, robust=True)
+    return updated
+
+
+class MemoryStatsBuffer:
+    """Per-process buffer: {user_id: [score, games, wins]}."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id, score, won):
+        with self._lock:
+            entry = self._pending.setdefault(user_id, [0, 0, 0])
+            entry[0] += score
+            entry[1] += 1
+            entry[2] += 1 if won else 0
+            return len(self._pending)
+
+    def drain(self):
+        """Take everything buffered so far as {user_id: (score, games, wins)}."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return {uid: tuple(values) for uid, values in pending.items()}
+
+    def done(self):
+        """The last drain was written."""
+
+    def restore(self, deltas):
+        """Put deltas back after a failed flush."""
+        with self._lock:
+            for uid, (score, games, wins) in deltas.items():
+                entry = self._pending.setdefault(uid, [0, 0, 0])
+                entry[0] += score
+                entry[1] += games
+                entry[2] += wins
+
+
+class RedisStatsBuffer:
+    """
+    Shared buffer in one Redis hash with fields "<user_id>:s|g|w". Draining
+    renames the hash away first, so increments that race a flush simply
+    land in the next one.
+
+    The renamed hash is only deleted once its UPDATE is written (done), or
+    after merging it back (restore). Renamed hashes are listed in a set, so
+    one left behind by a process that died mid-flush is merged back by a
+    later drain once it is ORPHAN_AGE old.
+    """
+
+    FIELDS = ("s", "g", "w")
+
+    def __init__(self, client, key=BUFFER_KEY):
+        self.client = client
+        self.key = key
+        self.flushing_key = f"{key}:flushing"
+        self._draining = None
+
+    def __len__(self):
+        return self.client.hlen(self.key) // len(self.FIELDS)
+
+    def add(self, user_id, score, won):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(self.key, f"{user_id}:s", score)
+        pipe.hincrby(self.key, f"{user_id}:g", 1)
+        pipe.hincrby(self.key, f"{user_id}:w", 1 if won else 0)
+        pipe.hlen(self.key)
+        return pipe.execute()[-1] // len(self.FIELDS)
+
+    def drain(self):
+        self._recover_orphans()
+        tmp_key = f"{self.flushing_key}:{time.time_ns()}"
+        self.client.sadd(self.flushing_key, tmp_key)
+        try:
+            self.client.rename(self.key, tmp_key)
+        except Exception:
+            self.client.srem(self.flushing_key, tmp_key)
+            return {}  # nothing buffered (RENAME fails on a missing key)
+        self._draining = tmp_key
+
+        deltas = {}
+        for field, value in self.client.hgetall(tmp_key).items():
+            uid, kind = field.decode().rsplit(":", 1)
+            entry = deltas.setdefault(int(uid), [0, 0, 0])
+            entry[self.FIELDS.index(kind)] = int(value)
+        return {uid: tuple(values) for uid, values in deltas.items()}
+
+    def done(self):
+        """The last drain was written: drop its renamed hash."""
+        if self._draining:
+            self._drop(self.client.pipeline(), self._draining).execute()
+            self._draining = None
+
+    def restore(self, deltas):
+        """Merge deltas back into the live hash, then drop the drained copy, in one transaction."""
+        pipe = self.client.pipeline()
+        for uid, values in deltas.items():
+            for kind, value in zip(self.FIELDS, values):
+                pipe.hincrby(self.key, f"{uid}:{kind}", value)
+        if self._draining:
+            self._drop(pipe, self._draining)
+            self._draining = None
+        pipe.execute()
+
+    def _drop(self, pipe, tmp_key):
+        pipe.delete(tmp_key)
+        pipe.srem(self.flushing_key, tmp_key)
+        return pipe
+
+    def _recover_orphans(self):
+        cutoff = time.time_ns() - ORPHAN_AGE * 10**9
+        for member in self.client.smembers(self.flushing_key):
+            tmp_key = member.decode()
+            if int(tmp_key.rsplit(":", 1)[1]) > cutoff:
+                continue  # another worker may still be writing it
+            pipe = self.client.pipeline()
+            for field, value in self.client.hgetall(tmp_key).items():
+                pipe.hincrby(self.key, field.decode(), int(value))
+            self._drop(pipe, tmp_key).execute()
+            logger.warning(f"Merged back stats deltas from an abandoned flush ({tmp_key})")
+
+
+class StatsBuffer:
+    """Adds games to the backing buffer and flushes it in batches."""
+
+    def __init__(self, store, flush_size=None, flush_interval=None):
+        self.store = store
+        self.flush_size = flush_size or getattr(settings, "QUIZ_STATS_FLUSH_SIZE", 200)
+        self.flush_interval = flush_interval or getattr(settings, "QUIZ_STATS_FLUSH_INTERVAL", 30)
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def add(self, user_id, score, won=False):
+        pending = self.store.add(user_id, score, won)
+        if pending >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered deltas. Returns the number of users updated."""
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # another thread is already flushing
+        try:
+            self._last_flush = time.monotonic()
+            deltas = self.store.drain()
+            if not deltas:
+                return 0
+            try:
+                updated = apply_stat_deltas(deltas)
+            except Exception as e:
+                logger.error(f"Stats flush failed for {len(deltas)} users, re-buffering: {e}")
+                self.store.restore(deltas)
+                return 0
+            self.store.done()
+            return updated
+        finally:
+            self._flush_lock.release()
+
+    def start_timer(self):
+        """Flush every flush_interval seconds from a daemon thread."""
+        def run():
+            from django.db import connections
+
+            while not self._stopped.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Timed stats flush failed: {e}")
+                finally:
+                    connections.close_all()  # this thread's connections only
+
+        threading.Thread(target=run, name="stats-buffer-flush", daemon=True).start()
+
+    def stop_timer(self):
+        self._stopped.set()
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_stats_buffer():
+    """The process-wide buffer, on Redis when the leaderboard found it reachable."""
+    global _buffer
+    if _buffer is not None:
+        return _buffer
+
+    with _buffer_lock:
+        if _buffer is None:
+            from . import leaderboard
+
+            backend = leaderboard.get_backend()
+            if isinstance(backend, leaderboard.RedisLeaderboard):
+                store = RedisStatsBuffer(backend.client)
+            else:
+                store = MemoryStatsBuffer()
+            _buffer = StatsBuffer(store)
+            _buffer.start_timer()
+            atexit.register(_buffer.flush)
+    return _buffer
+
+
+def record_game_stats(user_id, score, won=False):
+    """Buffer one finished game. Never raises; falls back to a direct write."""
+    try:
+        get_stats_buffer().add(user_id, score, won)
+    except Exception as e:
+        logger.error(f"Stats buffer unavailable for user {user_id} ({e}), writing directly")
+        apply_stat_deltas({user_id: (score, 1, 1 if won else 0)})
+
+
+def record_game_results(results, mode=None):
+    """
+    End-of-game stats for every player at once. results is [(user_id, score, won)];
+    anonymous players (user_id None) are skipped. Applied as one batched
+    UPDATE, or buffered with QUIZ_STATS_BUFFERED. Leaderboard and buffer
+    writes wait for the surrounding transaction, if any, to commit.
+    """
+    from . import leaderboard
+
+    results = [(user_id, score, won) for user_id, score, won in results if user_id is not None]
+
+    def push():
+        for user_id, score, won in results:
+            if mode:
+                leaderboard.record_game(user_id, score, mode)
+            if stats_buffered():
+                record_game_stats(user_id, score, won)
+
+    transaction.on_commit(push, robust=True)
+    if stats_buffered():
+        return 0
+
+    deltas = {}
+    for user_id, score, won in results:
+        total, games, wins = deltas.get(user_id, (0, 0, 0))
+        deltas[user_id] = (total + score, games + 1, wins + (1 if won else 0))
+    return apply_stat_deltas(deltas) if deltas else 0
@@ -21,4 +21,6 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('leaderboard/', views.leaderboard_view, name='leaderboard'),
+    path('matchmaking/stats/', views.matchmaking_stats, name='matchmaking_stats'),
+    path('question-cache/stats/', views.question_cache_stats, name='question_cache_stats'),
 ]
@@ -5,16 +5,23 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from django.db.models import Avg, Max, Sum, Q
+from django.db.models import Max, Min
 
 import json
+import logging
 import uuid
 import random
 
 from .models import (
-    Question, QuizSession, PlayerScore, SessionQuestion,
-    CustomUser, CodingProblem
+    Question, QuizSession, PlayerScore, SessionQuestion, PlayerAnswer,
+    CustomUser, CodingProblem, normalize_question_text, question_text_hash
 )
+from .search import filter_by_topics, tag_questions
+from .dashboard import get_dashboard_payload
+from . import adaptive, leaderboard, matchmaking
+from .generation_cache import GENERATION_CACHE
+
+logger = logging.getLogger(__name__)
 
 # ==================== BASIC VIEWS ====================
 
@@ -128,6 +135,9 @@ def start_single_session(request):
     1. I get the topic and difficulty the user selected.
     2. I create a new 'QuizSession' in my database.
     3. I get the questions (MCQs) and save them so the user can play.
+
+    With "adaptive": true I only create the session; get_next_question then
+    picks each question from the player's running ability.
     """
     if request.method != "POST":
         return JsonResponse({"error": "Method not allowed"}, status=405)
@@ -142,6 +152,23 @@ def start_single_session(request):
     num_questions = int(data.get("num_questions", 5))
     time_limit = int(data.get("time_per_question_seconds", 15))
 
+    if data.get("adaptive"):
+        # Questions are picked one at a time by get_next_question (quiz/adaptive.py)
+        bank_size = adaptive.get_buckets(topics).size
+        if bank_size:
+            session = QuizSession.objects.create(
+                session_type="single",
+                max_players=1,
+                time_limit=time_limit,
+                difficulty_level=difficulty,
+                is_adaptive=True,
+                ability=adaptive.initial_ability(request.user, difficulty),
+                target_questions=min(num_questions, bank_size),
+                adaptive_topics=[t for t in topics if t],
+            )
+            return JsonResponse({"session_id": session.id, "adaptive": True})
+        # An empty question bank can't adapt; the fixed list below has a fallback
+
     # Create a quiz session
     session = QuizSession.objects.create(
         session_type="single",
@@ -158,31 +185,77 @@ def start_single_session(request):
         time_limit=time_limit,
     )
 
-    # Link questions to session with order
-    for index, q_data in enumerate(questions_data):
-        # If we already have this question in DB by id, use it
+    link_questions_to_session(session, questions_data)
+
+    return JsonResponse({"session_id": session.id})
+
+
+def link_questions_to_session(session, questions_data):
+    """
+    I save the questions for a session in order.
+
+    Questions that came from the DB are reused by id. New ones go in with a
+    single bulk_create(ignore_conflicts=True): texts already in the bank are
+    left out, the unique text_hash column drops duplicates from concurrent
+    generators, then one lookup by hash gives me the ids of both the
+    inserted rows and the ones that already existed.
+    """
+    new_questions = {}
+    for q_data in questions_data:
         if "db_id" in q_data:
-            question_obj = Question.objects.get(id=q_data["db_id"])
-        else:
-            # Create a new question record
-            question_obj = Question.objects.create(
-                question_text=q_data["question_text"],
-                question_type="multiple_choice",
-                difficulty=q_data.get("difficulty", "medium"),
-                options=q_data.get("options", []),
-                correct_answer=q_data.get("correct_answer"),
-                explanation=q_data.get("explanation", ""),
-                category=q_data.get("category", ""),
-                is_ai_generated=q_data.get("is_ai_generated", False),
-            )
+            continue
+        text_hash = question_text_hash(q_data["question_text"])
+        if text_hash in new_questions:
+            continue
+        new_questions[text_hash] = Question(
+            question_text=q_data["question_text"],
+            question_type="multiple_choice",
+            difficulty=q_data.get("difficulty", "medium"),
+            options=q_data.get("options", []),
+            correct_answer=q_data.get("correct_answer"),
+            explanation=q_data.get("explanation", ""),
+            category=q_data.get("category", ""),
+            is_ai_generated=q_data.get("is_ai_generated", False),
+            text_hash=text_hash,
+        )
 
-        SessionQuestion.objects.create(
-            session=session,
-            question=question_obj,
-            order=index,
+    ids_by_hash = {}
+    if new_questions:
+        existing = set(
+            Question.objects.filter(text_hash__in=new_questions.keys())
+            .values_list("text_hash", flat=True)
+        )
+        Question.objects.bulk_create(
+            [question for text_hash, question in new_questions.items() if text_hash not in existing],
+            ignore_conflicts=True,
+        )
+        ids_by_hash = dict(
+            Question.objects.filter(text_hash__in=new_questions.keys())
+            .values_list("text_hash", "id")
+        )
+        # Only the rows inserted here get this generation's category as a tag;
+        # an existing question keeps the topics it already has
+        tag_questions(
+            (ids_by_hash[text_hash], question.category)
+            for text_hash, question in new_questions.items()
+            if text_hash in ids_by_hash and text_hash not in existing and question.category
         )
 
-    return JsonResponse({"session_id": session.id})
+    # Link questions to session with order
+    links = []
+    used_ids = set()
+    for q_data in questions_data:
+        if "db_id" in q_data:
+            question_id = q_data["db_id"]
+        else:
+            question_id = ids_by_hash.get(question_text_hash(q_data["question_text"]))
+        # Skip anything that vanished or would repeat inside this session
+        if question_id is None or question_id in used_ids:
+            continue
+        used_ids.add(question_id)
+        links.append(SessionQuestion(session=session, question_id=question_id, order=len(links)))
+
+    SessionQuestion.objects.bulk_create(links)
 
 
 @csrf_exempt
@@ -238,15 +311,36 @@ def submit_answer(request):
         score.score += 1
     score.save()
 
+    # Every answer feeds the per-question stats (quiz/question_stats.py)
+    try:
+        response_time_ms = int(request.POST.get("response_time_ms"))
+    except (TypeError, ValueError):
+        response_time_ms = None
+    PlayerAnswer.objects.create(
+        session=session,
+        player=user,
+        player_name=user.username,
+        question=question,
+        selected_option=int(answer) if str(answer).isdigit() else None,
+        is_correct=is_correct,
+        response_time_ms=response_time_ms,
+    )
+
     # Move to next question
-    next_q = session.next_question()
+    if session.is_adaptive:
+        adaptive.record_answer(session, question, is_correct, response_time_ms)
+        session.current_question_index += 1
+        session.save(update_fields=["ability", "current_question_index"])
+        finished = session.current_question_index >= session.target_questions
+    else:
+        finished = session.next_question() is None
 
     response = {
         "status": "ok",
         "score": score.score,
     }
 
-    if next_q is None:
+    if finished:
         # Session finished
         session.end_session()
 
@@ -280,7 +374,7 @@ def submit_answer(request):
         # Simple user stats update
         if request.user.is_authenticated:
             is_win = score.accuracy >= 50
-            request.user.update_stats(score.score, won=is_win)
+            request.user.update_stats(score.score, won=is_win, mode="single")
 
     return JsonResponse(response)
 
@@ -366,6 +460,51 @@ def generate_quiz_session(request):
 # These are small functions I wrote to help me get questions from the database.
 # ==============================================================================
 
+# Hardcoded MCQs used when the database can't fill a session.
+FALLBACK_MCQ_QUESTIONS = (
+    {
+        "question_text": "What is Python?",
+        "options": ["A programming language", "A snake", "A database", "A web framework"],
+        "correct_answer": 0,
+        "explanation": "Python is a high-level programming language.",
+        "category": "Programming",
+        "difficulty": "easy",
+    },
+    {
+        "question_text": "Which of these is NOT a valid variable name in Python?",
+        "options": ["my_var", "2var", "_var", "var2"],
+        "correct_answer": 1,
+        "explanation": "Variable names cannot start with a number.",
+        "category": "Programming",
+        "difficulty": "easy",
+    },
+    {
+        "question_text": "What is the output of print(2 ** 3)?",
+        "options": ["6", "8", "9", "5"],
+        "correct_answer": 1,
+        "explanation": "2 raised to the power of 3 is 8.",
+        "category": "Programming",
+        "difficulty": "easy",
+    },
+    {
+        "question_text": "Which keyword is used to define a function in Python?",
+        "options": ["func", "def", "function", "define"],
+        "correct_answer": 1,
+        "explanation": "The 'def' keyword is used to define functions.",
+        "category": "Programming",
+        "difficulty": "easy",
+    },
+    {
+        "question_text": "What data type is the result of: 3 / 2 ?",
+        "options": ["int", "float", "str", "bool"],
+        "correct_answer": 1,
+        "explanation": "Division always returns a float in Python 3.",
+        "category": "Programming",
+        "difficulty": "easy",
+    },
+)
+
+
 def generate_mcq_questions(count, topics, difficulty, time_limit, user=None):
     """
     This function gets MCQ questions.
@@ -376,17 +515,13 @@ def generate_mcq_questions(count, topics, difficulty, time_limit, user=None):
     """
     qs = Question.objects.filter(question_type="multiple_choice")
 
-    # Filter by topics
+    # Filter by topics (topic tags + full-text index, see quiz/search.py)
     if topics and topics != [""]:
-        topic_filter = Q()
-        for topic in topics:
-            if topic:
-                topic_filter |= Q(category__icontains=topic) | Q(question_text__icontains=topic)
-        qs = qs.filter(topic_filter)
+        qs = filter_by_topics(qs, topics)
 
     # Filter by difficulty
     if difficulty != "mixed":
-        qs = qs.filter(difficulty__iexact=difficulty)
+        qs = qs.filter(difficulty=difficulty.lower())
 
     # Shuffle and pick some
     qs = qs.order_by("?")[:count]
@@ -405,12 +540,38 @@ def generate_mcq_questions(count, topics, difficulty, time_limit, user=None):
             "db_id": q.id,
         })
 
-    # Fallback if DB doesn't have enough
+    # Fallback if the filtered query doesn't have enough:
+    # 1. sample a few more rows from the whole bank (indexed, no full scan)
+    # 2. then use the hardcoded backup list
     if len(question_dicts) < count:
-        needed = count - len(question_dicts)
-        fallback = get_all_mcq_questions()
-        random.shuffle(fallback)
-        for item in fallback[:needed]:
+        selected_ids = [d["db_id"] for d in question_dicts]
+        extra_ids = sample_question_ids(
+            Question.objects.filter(question_type="multiple_choice"),
+            count - len(question_dicts),
+            exclude_ids=selected_ids,
+        )
+        extra = Question.objects.in_bulk(extra_ids)
+        for q in (extra[qid] for qid in extra_ids if qid in extra):
+            question_dicts.append({
+                "question_text": q.question_text,
+                "question_type": "multiple_choice",
+                "difficulty": q.difficulty,
+                "options": q.options,
+                "correct_answer": q.correct_answer,
+                "explanation": q.explanation or "No explanation available.",
+                "category": q.category or "General",
+                "is_ai_generated": q.is_ai_generated,
+                "db_id": q.id,
+            })
+
+    if len(question_dicts) < count:
+        chosen = {normalize_question_text(d["question_text"]) for d in question_dicts}
+        fallback = [
+            item for item in FALLBACK_MCQ_QUESTIONS
+            if normalize_question_text(item["question_text"]) not in chosen
+        ]
+        needed = min(count - len(question_dicts), len(fallback))
+        for item in random.sample(fallback, needed):
             question_dicts.append({
                 "question_text": item["question_text"],
                 "question_type": "multiple_choice",
@@ -425,6 +586,36 @@ def generate_mcq_questions(count, topics, difficulty, time_limit, user=None):
     return question_dicts[:count]
 
 
+def sample_question_ids(qs, count, exclude_ids=()):
+    """
+    Pick up to `count` random ids from qs without scanning the table.
+
+    Each pick jumps to a random id between MIN(id) and MAX(id) and takes the
+    first matching row at or after it (wrapping around), which is a primary
+    key index seek instead of ORDER BY RANDOM() over every row.
+    """
+    bounds = qs.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None or count <= 0:
+        return []
+
+    excluded = set(exclude_ids)
+    picked = []
+    attempts = 0
+    while len(picked) < count and attempts < count * 4:
+        attempts += 1
+        pivot = random.randint(bounds["lo"], bounds["hi"])
+        remaining = qs.exclude(id__in=excluded).order_by("id").values_list("id", flat=True)
+        candidate = remaining.filter(id__gte=pivot).first()
+        if candidate is None:
+            candidate = remaining.filter(id__lt=pivot).first()
+        if candidate is None:
+            break  # nothing left to pick
+        excluded.add(candidate)
+        picked.append(candidate)
+
+    return picked
+
+
 def generate_coding_questions(count, topics, difficulty, time_limit):
     """
     This function gets Coding questions.
@@ -475,49 +666,8 @@ def generate_coding_questions(count, topics, difficulty, time_limit):
 
 
 def get_all_mcq_questions():
-    """Hardcoded fallback MCQs + DB ones."""
-    fallback_questions = [
-        {
-            "question_text": "What is Python?",
-            "options": ["A programming language", "A snake", "A database", "A web framework"],
-            "correct_answer": 0,
-            "explanation": "Python is a high-level programming language.",
-            "category": "Programming",
-            "difficulty": "easy",
-        },
-        {
-            "question_text": "Which of these is NOT a valid variable name in Python?",
-            "options": ["my_var", "2var", "_var", "var2"],
-            "correct_answer": 1,
-            "explanation": "Variable names cannot start with a number.",
-            "category": "Programming",
-            "difficulty": "easy",
-        },
-        {
-            "question_text": "What is the output of print(2 ** 3)?",
-            "options": ["6", "8", "9", "5"],
-            "correct_answer": 1,
-            "explanation": "2 raised to the power of 3 is 8.",
-            "category": "Programming",
-            "difficulty": "easy",
-        },
-        {
-            "question_text": "Which keyword is used to define a function in Python?",
-            "options": ["func", "def", "function", "define"],
-            "correct_answer": 1,
-            "explanation": "The 'def' keyword is used to define functions.",
-            "category": "Programming",
-            "difficulty": "easy",
-        },
-        {
-            "question_text": "What data type is the result of: 3 / 2 ?",
-            "options": ["int", "float", "str", "bool"],
-            "correct_answer": 1,
-            "explanation": "Division always returns a float in Python 3.",
-            "category": "Programming",
-            "difficulty": "easy",
-        },
-    ]
+    """Deprecated: loads the whole question bank. Use sample_question_ids() and FALLBACK_MCQ_QUESTIONS instead."""
+    fallback_questions = [dict(item) for item in FALLBACK_MCQ_QUESTIONS]
 
     try:
         db_qs = Question.objects.filter(question_type="multiple_choice")
@@ -551,6 +701,8 @@ def get_next_question(request, session_id):
     try:
         session = QuizSession.objects.get(id=session_id)
         q = session.get_current_question()
+        if not q and session.is_adaptive and session.current_question_index < session.target_questions:
+            q = adaptive.select_next_question(session)
         if not q:
             if session.current_question_index >= session.sessionquestion_set.count():
                 return JsonResponse({"error": "Session finished"}, status=404)
@@ -575,65 +727,108 @@ def get_next_question(request, session_id):
 
 @login_required(login_url="quiz:login")
 def dashboard_view(request):
-    """Simple dashboard with stats and a small trend chart."""
+    """
+    Simple dashboard with stats and a small trend chart.
+    The numbers come from a per-user cache (see quiz/dashboard.py).
+    """
     user = request.user
-    user_scores = PlayerScore.objects.filter(player=user).select_related("session")
-
-    total_quizzes = user_scores.count()
-    avg_score = user_scores.aggregate(Avg("score"))["score__avg"] or 0
-    best_score = user_scores.aggregate(Max("score"))["score__max"] or 0
-    total_questions = user_scores.aggregate(total=Sum("total_answers"))["total"] or 0
-    total_correct = user_scores.aggregate(total=Sum("correct_answers"))["total"] or 0
-
-    win_rate = 0
-    if total_questions > 0:
-        win_rate = (total_correct / total_questions) * 100
-
-    stats = {
-        "total_quizzes": total_quizzes,
-        "average_score": round(avg_score, 1),
-        "best_score": best_score,
-        "total_questions": total_questions,
-        "win_rate": round(win_rate, 1),
-    }
-
-    recent_quizzes = user_scores.order_by("-session__created_at")[:5]
-    recent_quiz_data = []
-    for score in recent_quizzes:
-        recent_quiz_data.append({
-            "date": score.session.created_at,
-            "score": score.score,
-            "accuracy": score.accuracy,
-            "mode": score.session.session_type,
-        })
-
-    trend_data = user_scores.order_by("session__created_at")[:10]
-    trend_dates = [s.session.created_at.strftime("%m/%d") for s in trend_data]
-    trend_scores = [s.score for s in trend_data]
+    payload = get_dashboard_payload(user.id)
 
     context = {
-        "stats": stats,
-        "recent_quizzes": recent_quiz_data,
-        "trend_dates": json.dumps(trend_dates),
-        "trend_scores": json.dumps(trend_scores),
+        "stats": payload["stats"],
+        "recent_quizzes": payload["recent_quizzes"],
+        "trend_dates": json.dumps(payload["trend_dates"]),
+        "trend_scores": json.dumps(payload["trend_scores"]),
         "user": user,
     }
     return render(request, "quiz/dashboard.html", context)
 
 
 def leaderboard_view(request):
-    """Simple global leaderboard"""
-    top_users = CustomUser.objects.order_by("-total_score")[:50]
-
-    leaderboard_data = []
-    for idx, u in enumerate(top_users):
-        leaderboard_data.append({
-            "rank": idx + 1,
-            "username": u.username,
-            "score": u.total_score,
-            "games_played": u.games_played,
-            "win_rate": round(u.win_rate, 1),
-            "is_current": request.user.is_authenticated and u.id == request.user.id,
-        })
+    """
+    Global leaderboard, plus daily/weekly/monthly and per-mode boards
+    (?window=weekly&mode=multiplayer).
+
+    Ranks come from the leaderboard service (Redis sorted sets), so I only
+    load the users that are actually shown. If the global board fails I fall
+    back to the old ORDER BY query.
+    """
+    window = request.GET.get("window", "all")
+    if window != "all" and window not in leaderboard.WINDOWS:
+        window = "all"
+    mode = request.GET.get("mode") or None
+    if mode not in leaderboard.MODES:
+        mode = None
+
+    current_id = request.user.id if request.user.is_authenticated else None
+
+    try:
+        board = None
+        if window != "all" or mode:
+            board = leaderboard.bucket_board(window, mode)
+            top_entries = board.top(50)
+        else:
+            top_entries = leaderboard.top(50)
+    except Exception as e:
+        logger.error(f"Leaderboard service failed: {e}")
+        board = None
+        top_entries = []
+        if window == "all" and not mode:
+            top_entries = list(CustomUser.objects.order_by("-total_score").values_list("id", "total_score")[:50])
+
+    # Show the players around me when I'm not in the top 50
+    neighbour_entries = []
+    if current_id is not None and current_id not in {uid for uid, _ in top_entries}:
+        try:
+            if board is not None:
+                neighbour_entries = board.around(current_id, radius=2)
+            elif window == "all" and not mode:
+                neighbour_entries = leaderboard.around(current_id, radius=2)
+        except Exception:
+            neighbour_entries = []
+
+    ranked = [(idx + 1, uid, score) for idx, (uid, score) in enumerate(top_entries)]
+    users = CustomUser.objects.in_bulk([uid for _, uid, _ in ranked + neighbour_entries])
+
+    def build_rows(entries):
+        rows = []
+        for rank, uid, score in entries:
+            u = users.get(uid)
+            if u is None:
+                continue
+            rows.append({
+                "rank": rank,
+                "username": u.username,
+                "score": score,
+                "games_played": u.games_played,
+                "win_rate": round(u.win_rate, 1),
+                "is_current": uid == current_id,
+            })
+        return rows
+
+    return render(request, "quiz/leaderboard.html", {
+        "leaderboard": build_rows(ranked),
+        "neighbours": build_rows(neighbour_entries),
+        "window": window,
+        "mode": mode or "",
+        "windows": [("all", "All time"), ("daily", "Today"), ("weekly", "This week"), ("monthly", "This month")],
+        "modes": [("", "All modes"), ("single", "Single"), ("multiplayer", "Multiplayer"), ("coding_battle", "Coding Battle")],
+    })
+
 
-    return render(request, "quiz/leaderboard.html", {"leaderboard": leaderboard_data})
+def matchmaking_stats(request):
+    """Queue depth per bucket and wait-time histograms of matched players."""
+    try:
+        return JsonResponse(matchmaking.get_matchmaker().stats())
+    except Exception as e:
+        logger.error(f"Matchmaking stats failed: {e}")
+        return JsonResponse({"error": "Matchmaking stats unavailable"}, status=503)
+
+
+def question_cache_stats(request):
+    """Hit/miss counts and size of the AI question generation cache."""
+    try:
+        return JsonResponse(GENERATION_CACHE.stats())
+    except Exception as e:
+        logger.error(f"Question cache stats failed: {e}")
+        return JsonResponse({"error": "Question cache stats unavailable"}, status=503)
@@ -0,0 +1,105 @@
+"""
+Compact binary protocol for the quiz websocket.
+
+Clients talk JSON by default. A client can send {"action": "hello",
+"protocol": "msgpack"} as its first frame. The server answers with the field
+code table (in JSON), and from then on both sides exchange MessagePack binary
+frames whose dict keys are replaced by the short codes below.
+
+Keys under OPAQUE fields ("scores" is keyed by player name, code diffs have
+their own one-letter keys) are data, not protocol, and are never translated. Needs the optional `msgpack`
+package; without it the hello reply says "json" and nothing changes.
+"""
+from collections import Counter
+
+try:
+    import msgpack
+except ImportError:  # optional
+    msgpack = None
+
+PROTOCOL_JSON = "json"
+PROTOCOL_MSGPACK = "msgpack"
+
+FIELD_CODES = {
+    "event": "e",
+    "action": "a",
+    "error": "x",
+    "room": "r",
+    "player": "p",
+    "players": "ps",
+    "count": "c",
+    "mode": "m",
+    "max_players": "mp",
+    "topic": "tp",
+    "difficulty": "d",
+    "num_questions": "nq",
+    "question_text": "q",
+    "options": "o",
+    "order": "n",
+    "total": "t",
+    "time_limit": "tl",
+    "selected": "s",
+    "answered": "an",
+    "results": "rs",
+    "scores": "sc",
+    "winners": "w",
+    "top": "tk",
+    "rank": "rk",
+    "score": "pt",
+    "points": "pp",
+    "correct_option": "co",
+    "updates": "u",
+    "game_active": "ga",
+    "question": "qq",
+    "seq": "sq",
+    "token": "tn",
+}
+EXPANDED = {code: name for name, code in FIELD_CODES.items()}
+
+# Fields whose dict value is not keyed by field names
+OPAQUE = {"scores", "diff", "code_diff"}
+
+# Number of msgpack members per channel group in this process, so broadcasts
+# only pack when someone will use it
+GROUP_MSGPACK_MEMBERS = Counter()
+
+
+def available():
+    return msgpack is not None
+
+
+def _translate(value, table):
+    if isinstance(value, dict):
+        return {
+            table.get(k, k): (v if k in OPAQUE or table.get(k) in OPAQUE else _translate(v, table))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [_translate(v, table) for v in value]
+    return value
+
+
+def shorten(payload):
+    return _translate(payload, FIELD_CODES)
+
+
+def expand(payload):
+    return _translate(payload, EXPANDED)
+
+
+def pack(payload):
+    return msgpack.packb(shorten(payload), use_bin_type=True)
+
+
+def unpack(data):
+    return expand(msgpack.unpackb(data, raw=False))
+
+
+def hello_reply(requested):
+    """Negotiation answer (always sent as JSON)."""
+    protocol = PROTOCOL_MSGPACK if requested == PROTOCOL_MSGPACK and available() else PROTOCOL_JSON
+    reply = {"event": "hello", "protocol": protocol}
+    if protocol == PROTOCOL_MSGPACK:
+        reply["fields"] = FIELD_CODES
+        reply["opaque"] = sorted(OPAQUE)
+    return reply
@@ -0,0 +1,115 @@
+"""
+Microbenchmark: CPU per room broadcast, dict events vs encode-once frames.
+
+    python scripts/bench_broadcast.py [--members 2 10 100] [--rounds 200]
+
+"dict" is the old path: group_send a dict, every member rebuilds the frame
+and json.dumps it. "encode-once" is quiz.broadcast: the frame is encoded
+once and every member just forwards the text. When msgpack is installed the
+per-member channel-layer serialization (what channels_redis does) is
+included for both paths.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from channels.layers import InMemoryChannelLayer
+
+from quiz.broadcast import encode_frame, orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+QUESTION = {
+    "question_text": "A train covers 360 km in 4 hours. What is its average speed in km/h?",
+    "options": ["80", "90", "100", "120"],
+    "order": 3,
+    "total": 10,
+}
+
+GAME_OVER = {
+    "winner": "alice",
+    "reason": "Passed more tests",
+    "submissions": {
+        name: {
+            "passed": 4, "total": 5, "runtime": 0.42, "submission_time": 1700000000.0,
+            "code": "def solve(n):\n    return sum(range(n + 1))\n" * 8,
+            "results": [
+                {"input": str(i), "expected": str(i * 2), "actual": str(i * 2), "passed": True, "error": None}
+                for i in range(5)
+            ],
+        }
+        for name in ("alice", "bob")
+    },
+}
+
+
+def channel_layer_cost(message):
+    if msgpack is not None:
+        msgpack.packb(message, use_bin_type=True)
+
+
+async def setup(members):
+    layer = InMemoryChannelLayer(capacity=members * 4)
+    channels = [await layer.new_channel() for _ in range(members)]
+    for channel in channels:
+        await layer.group_add("room", channel)
+    return layer, channels
+
+
+async def dict_broadcast(layer, channels, event_type, payload):
+    await layer.group_send("room", {"type": event_type, **payload})
+    for channel in channels:
+        event = await layer.receive(channel)
+        channel_layer_cost(event)
+        frame = {"event": event_type}
+        frame.update({k: v for k, v in event.items() if k != "type"})
+        json.dumps(frame)
+
+
+async def encoded_broadcast(layer, channels, event_type, payload):
+    await layer.group_send("room", {
+        "type": "broadcast_frame",
+        "text": encode_frame({"event": event_type, **payload}),
+        "exclude": None,
+    })
+    for channel in channels:
+        event = await layer.receive(channel)
+        channel_layer_cost(event)
+        event["text"]  # handed to the socket as-is
+
+
+async def measure(fn, members, rounds, event_type, payload):
+    layer, channels = await setup(members)
+    await fn(layer, channels, event_type, payload)  # warm up
+    start = time.process_time()
+    for _ in range(rounds):
+        await fn(layer, channels, event_type, payload)
+    return (time.process_time() - start) / rounds * 1e6
+
+
+async def main(members_list, rounds):
+    print(f"encoder: {'orjson' if orjson else 'json'}, channel-layer msgpack: {'yes' if msgpack else 'no'}")
+    print(f"{'event':<12}{'members':>8}{'dict us':>12}{'once us':>12}{'speedup':>10}")
+    for event_type, payload in (("question", QUESTION), ("game_over", GAME_OVER)):
+        for members in members_list:
+            old = await measure(dict_broadcast, members, rounds, event_type, payload)
+            new = await measure(encoded_broadcast, members, rounds, event_type, payload)
+            print(f"{event_type:<12}{members:>8}{old:>12.1f}{new:>12.1f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--members", type=int, nargs="+", default=[2, 10, 100])
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.members, args.rounds))
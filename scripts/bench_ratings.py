@@ -0,0 +1,73 @@
+"""
+Benchmark: replaying rating history, vectorized vs game by game.
+
+    python scripts/bench_ratings.py [--games 1000000] [--players 50000] [--room-share 0.05]
+
+Generates random duels plus a share of 3-8 player rooms as flat seat lists
+(what recompute_ratings() loads from the database) and times
+quiz.rating.replay_flat() with numpy (when installed) and the pure Python loop.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartquizarena.settings')
+
+import django
+
+django.setup()
+
+from quiz import rating
+
+
+def make_games(num_games, num_players, room_share, seed=1):
+    rng = random.Random(seed)
+    sizes, seat_player, seat_score = [], [], []
+    for _ in range(num_games):
+        size = rng.randint(3, 8) if rng.random() < room_share else 2
+        sizes.append(size)
+        seat_player.extend(rng.sample(range(num_players), size))
+        seat_score.extend(rng.randint(0, 10) * 10 for _ in range(size))
+    return sizes, seat_player, seat_score
+
+
+def timed(label, games, num_players):
+    start = time.perf_counter()
+    ratings, _, _ = rating.replay_flat(*games, num_players, k=32)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12}{elapsed:>8.2f}s{len(games[0]) / elapsed:>14.0f} games/s")
+    return ratings
+
+
+def main(num_games, num_players, room_share, skip_python):
+    games = make_games(num_games, num_players, room_share)
+    print(f"{num_games} games, {num_players} players, {room_share:.0%} multi-player rooms")
+    if rating.np is not None:
+        vectorized = timed("numpy", games, num_players)
+    else:
+        print("numpy is not installed, only the Python loop is measured")
+    if not skip_python:
+        np_module, rating.np = rating.np, None
+        try:
+            python = timed("python", games, num_players)
+        finally:
+            rating.np = np_module
+        if np_module is not None:
+            drift = max(abs(a - b) for a, b in zip(vectorized, python))
+            print(f"max difference between the two: {drift:.2e} rating points")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--games", type=int, default=1_000_000)
+    parser.add_argument("--players", type=int, default=50_000)
+    parser.add_argument("--room-share", type=float, default=0.05)
+    parser.add_argument("--skip-python", action="store_true")
+    args = parser.parse_args()
+    main(args.games, args.players, args.room_share, args.skip_python)
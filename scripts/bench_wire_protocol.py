@@ -0,0 +1,107 @@
+"""
+Benchmark: JSON vs the compact msgpack protocol (quiz/wire.py) for one game.
+
+    python scripts/bench_wire_protocol.py [--players 2 50 500] [--questions 10] [--rounds 50]
+
+Replays the frames of a multiplayer game (lobby, questions, answers, final
+scores, plus arena standings when there are more than two players) and
+reports, per game, the server's encode CPU, one client's decode CPU and the
+bytes one client receives and sends.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from quiz import wire
+from quiz.broadcast import encode_frame
+
+
+def game_frames(players, questions):
+    """(server frames, client frames) of one game as seen by one player."""
+    names = [f"player_{i}" for i in range(players)]
+    arena = players > 2
+    top = names[:10]
+    server = [{"event": "created", "room": "room_1234", "players": names[:1],
+               "mode": "arena" if arena else "duel", "max_players": 500 if arena else 2}]
+    server.append({"event": "player_joined", "players": top, "count": players, "player": names[-1]})
+    client = [{"action": "create", "player": names[0], "topic": "any", "difficulty": "medium",
+               "num_questions": questions, "mode": "arena" if arena else "duel"}]
+    for order in range(1, questions + 1):
+        server.append({
+            "event": "question",
+            "question_text": "A train covers 360 km in 4 hours. What is its average speed in km/h?",
+            "options": ["80", "90", "100", "120"],
+            "order": order,
+            "total": questions,
+            "time_limit": 15,
+        })
+        client.append({"action": "answer", "room": "room_1234", "player": names[0], "selected": 1})
+        if arena:
+            server.append({"event": "progress", "order": order, "answered": players // 2, "players": players})
+            server.append({"event": "standings", "order": order, "correct_option": 1,
+                           "top": [[n, 20 * order - i] for i, n in enumerate(top)], "players": players})
+            server.append({"event": "your_rank", "rank": 7, "score": 18 * order, "players": players})
+    scores = {n: 20 * questions - i for i, n in enumerate(top if arena else names)}
+    results = {"scores": scores, "winners": top[:1]}
+    if arena:
+        results["players"] = players
+    server.append({"event": "finished", "results": results})
+    return server, client
+
+
+def json_encode(frame):
+    return encode_frame(frame).encode()
+
+
+def json_decode(data):
+    return json.loads(data)
+
+
+CODECS = {
+    "json": (json_encode, json_decode),
+    "msgpack": (wire.pack, wire.unpack),
+}
+
+
+def measure(codec, frames, rounds):
+    encode, decode = CODECS[codec]
+    encoded = [encode(f) for f in frames]
+    start = time.process_time()
+    for _ in range(rounds):
+        for f in frames:
+            encode(f)
+    encode_us = (time.process_time() - start) / rounds * 1e6
+    start = time.process_time()
+    for _ in range(rounds):
+        for data in encoded:
+            decode(data)
+    decode_us = (time.process_time() - start) / rounds * 1e6
+    return encode_us, decode_us, sum(len(d) for d in encoded)
+
+
+def main(players_list, questions, rounds):
+    codecs = ["json"] + (["msgpack"] if wire.available() else [])
+    if not wire.available():
+        print("msgpack is not installed, only JSON is measured")
+    print(f"{'players':>8}{'codec':>9}{'enc us':>10}{'dec us':>10}{'recv B':>9}{'sent B':>9}")
+    for players in players_list:
+        server, client = game_frames(players, questions)
+        for codec in codecs:
+            enc, dec, received = measure(codec, server, rounds)
+            _, _, sent = measure(codec, client, 1)
+            print(f"{players:>8}{codec:>9}{enc:>10.1f}{dec:>10.1f}{received:>9}{sent:>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--players", type=int, nargs="+", default=[2, 50, 500])
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+    main(args.players, args.questions, args.rounds)
@@ -101,6 +101,58 @@ CACHES = {
 }
 
 
+# Leaderboard storage: "auto" (Redis sorted set, in-process fallback), "redis" or "memory"
+LEADERBOARD_BACKEND = os.getenv('LEADERBOARD_BACKEND', 'auto')
+
+# Coalesce user stats writes into batched updates (see quiz/stats_buffer.py).
+# Pending deltas are flushed every QUIZ_STATS_FLUSH_SIZE users / QUIZ_STATS_FLUSH_INTERVAL seconds
+# (a background timer per worker) and, for the shared Redis buffer, by `manage.py flush_user_stats`.
+QUIZ_STATS_BUFFERED = os.getenv('QUIZ_STATS_BUFFERED', 'False').lower() == 'true'
+QUIZ_STATS_FLUSH_SIZE = 200
+QUIZ_STATS_FLUSH_INTERVAL = 30  # seconds
+
+# Finished multiplayer/battle games are persisted in batches after the results are sent (quiz/persistence.py)
+QUIZ_PERSIST_BATCH_SIZE = 50
+QUIZ_PERSIST_FLUSH_DELAY = 0.2  # seconds to wait for more games before writing a partial batch
+
+# Arena rooms (multiplayer mode="arena", see quiz/arena.py)
+ARENA_MAX_PLAYERS = 500
+ARENA_QUESTION_TIME = 15  # seconds per question
+ARENA_TOP_K = 10  # players shown in the standings
+ARENA_BROADCAST_INTERVAL = 0.5  # seconds between lobby / answer-progress updates
+
+# Spectators ("spectate" action) get coalesced updates at most this often (quiz/spectators.py)
+SPECTATOR_MAX_UPDATES_PER_SEC = 4
+
+# Websocket frames at least this many bytes are sent zlib-compressed to clients that opt in (quiz/broadcast.py)
+WS_COMPRESS_THRESHOLD = 4096
+
+# Frames kept per room for players who reconnect with their resume token (quiz/resume.py)
+RESUME_BUFFER_SIZE = 200
+
+# Matchmaking (quiz/matchmaking.py): players within RATING_BAND rating points are paired;
+# the band widens by BAND_WIDEN points per second waited, checked every RETRY_INTERVAL seconds
+MATCHMAKING_RATING_BAND = 100
+MATCHMAKING_BAND_WIDEN = 10
+MATCHMAKING_RETRY_INTERVAL = 2
+
+# Elo K-factor: the most a rating can move in one game (quiz/rating.py)
+RATING_K = 32
+
+# Adaptive single-player sessions (quiz/adaptive.py): chance of a correct answer
+# the next question aims for, bucket width in logits, how long (seconds) a
+# worker keeps its difficulty buckets before rebuilding them, and for how many
+# topic filters (least recently used dropped first)
+ADAPTIVE_TARGET_SUCCESS = 0.7
+ADAPTIVE_BUCKET_WIDTH = 0.5
+ADAPTIVE_BUCKET_TTL = 300
+ADAPTIVE_BUCKET_CACHE_SIZE = 64
+
+# `manage.py rollup_question_stats` calibrates Question.irt_difficulty with the
+# easy/medium/hard label counting as this many answers (quiz/question_stats.py)
+QUESTION_STATS_PRIOR_WEIGHT = 10
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -163,6 +215,14 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 # Gemini API configuration
 
+# Question generation provider: "gemini" (falls back to "local" when degraded)
+# or "local" (offline, deterministic; for load tests and benchmarks)
+QUESTION_PROVIDER = os.getenv('QUESTION_PROVIDER', 'gemini')
+
+# Prompt-level cache for generated question batches (see quiz/generation_cache.py)
+QUESTION_CACHE_TIMEOUT = 6 * 60 * 60  # seconds
+QUESTION_CACHE_MAX_ENTRIES = 500
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -1,7 +1,55 @@
 import os
 import sys
 
+import pytest
+
 # Ensure project root is on sys.path so imports like 'utils' work during tests
 ROOT = os.path.dirname(os.path.dirname(__file__))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def django_test_db():
+    """
+    Django set up against a fresh, migrated in-memory SQLite database, with
+    a local-memory cache and in-process leaderboard so no Redis is needed.
+    Only tests that ask for `db` pay for this.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smartquizarena.settings")
+    import django
+
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+    overrides = override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        LEADERBOARD_BACKEND="memory",
+        QUIZ_STATS_BUFFERED=False,
+    )
+    overrides.enable()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    yield
+    connection.creation.destroy_test_db(old_name, verbosity=0)
+    teardown_test_environment()
+    overrides.disable()
+
+
+@pytest.fixture
+def db(django_test_db):
+    """Run the test inside a transaction that is rolled back afterwards, with fresh in-process state."""
+    from django.core.cache import cache
+    from django.db import transaction
+
+    from quiz import leaderboard, stats_buffer
+
+    leaderboard._backend = leaderboard._buckets = None
+    leaderboard._warm_checked = False
+    stats_buffer._buffer = None
+    cache.clear()
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
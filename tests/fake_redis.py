@@ -0,0 +1,157 @@
+"""
+A small in-memory stand-in for the redis-py client, covering the commands
+the leaderboard, matchmaking queue and stats buffer use. Values come back
+as bytes, like a real client without decode_responses.
+"""
+
+
+def _b(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def _score_bound(value):
+    """(bound, exclusive) from a ZRANGEBYSCORE argument such as 5, "(5" or "+inf"."""
+    if isinstance(value, str):
+        if value in ("+inf", "inf"):
+            return float("inf"), False
+        if value == "-inf":
+            return float("-inf"), False
+        if value.startswith("("):
+            return float(value[1:]), True
+    return float(value), False
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    # ---- keys ----
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def rename(self, src, dst):
+        if src not in self.data:
+            raise Exception("ERR no such key")
+        self.data[dst] = self.data.pop(src)
+        return True
+
+    def expire(self, key, ttl):
+        return int(key in self.data)
+
+    def set(self, key, value):
+        self.data[key] = _b(value)
+        return True
+
+    # ---- hashes ----
+
+    def hset(self, key, field, value):
+        self.data.setdefault(key, {})[_b(field)] = _b(value)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(_b(field))
+
+    def hmget(self, key, fields):
+        return [self.hget(key, field) for field in fields]
+
+    def hdel(self, key, field):
+        return int(self.data.get(key, {}).pop(_b(field), None) is not None)
+
+    def hincrby(self, key, field, amount=1):
+        table = self.data.setdefault(key, {})
+        table[_b(field)] = _b(int(table.get(_b(field), b"0")) + amount)
+        return int(table[_b(field)])
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hlen(self, key):
+        return len(self.data.get(key, {}))
+
+    # ---- sets ----
+
+    def sadd(self, key, member):
+        members = self.data.setdefault(key, set())
+        added = _b(member) not in members
+        members.add(_b(member))
+        return int(added)
+
+    def srem(self, key, member):
+        members = self.data.get(key, set())
+        removed = _b(member) in members
+        members.discard(_b(member))
+        return int(removed)
+
+    def smembers(self, key):
+        return set(self.data.get(key, set()))
+
+    # ---- sorted sets ----
+
+    def zadd(self, key, mapping):
+        board = self.data.setdefault(key, {})
+        for member, score in mapping.items():
+            board[_b(member)] = float(score)
+
+    def zincrby(self, key, delta, member):
+        board = self.data.setdefault(key, {})
+        board[_b(member)] = board.get(_b(member), 0.0) + delta
+        return board[_b(member)]
+
+    def zrem(self, key, member):
+        board = self.data.get(key, {})
+        removed = board.pop(_b(member), None) is not None
+        if key in self.data and not board:
+            del self.data[key]
+        return int(removed)
+
+    def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def _ascending(self, key):
+        return sorted(self.data.get(key, {}).items(), key=lambda kv: (kv[1], kv[0]))
+
+    def zrevrange(self, key, start, end, withscores=False):
+        rows = self._ascending(key)[::-1][start:end + 1]
+        return rows if withscores else [member for member, _ in rows]
+
+    def zrevrank(self, key, member):
+        members = [m for m, _ in self._ascending(key)[::-1]]
+        return members.index(_b(member)) if _b(member) in members else None
+
+    def zrangebyscore(self, key, low, high, start=0, num=None):
+        (lo, lo_ex), (hi, hi_ex) = _score_bound(low), _score_bound(high)
+        rows = [
+            m for m, s in self._ascending(key)
+            if (s > lo if lo_ex else s >= lo) and (s < hi if hi_ex else s <= hi)
+        ]
+        return rows[start:start + num if num is not None else None]
+
+    def zrevrangebyscore(self, key, high, low, start=0, num=None):
+        (lo, lo_ex), (hi, hi_ex) = _score_bound(low), _score_bound(high)
+        rows = [
+            m for m, s in self._ascending(key)[::-1]
+            if (s > lo if lo_ex else s >= lo) and (s < hi if hi_ex else s <= hi)
+        ]
+        return rows[start:start + num if num is not None else None]
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in calls]
@@ -0,0 +1,78 @@
+import math
+import random
+
+import pytest
+
+from quiz import adaptive
+
+
+def make_buckets(difficulties, width=0.5):
+    return adaptive.DifficultyBuckets(
+        [(qid, b, "medium") for qid, b in enumerate(difficulties)], width=width,
+    )
+
+
+def test_uncalibrated_questions_use_label_prior():
+    buckets = adaptive.DifficultyBuckets([(1, None, "easy"), (2, None, "hard"), (3, 0.1, "hard")], width=0.5)
+    assert buckets.buckets == {-2: [1], 2: [2], 0: [3]}
+
+
+def test_pick_targets_bucket_then_neighbours():
+    buckets = make_buckets([-2.0, -1.0, -1.0, 0.0, 1.0])
+    assert buckets.pick(-1.1) in (1, 2)
+    assert buckets.pick(-1.1, exclude={1, 2}) in (0, 3)
+    assert buckets.pick(3.0) == 4
+    assert buckets.pick(0.0, exclude=set(range(5))) is None
+
+
+def test_target_difficulty_gives_target_success():
+    b = adaptive.target_difficulty(0.8, target=0.7)
+    assert adaptive.p_correct(0.8, b) == pytest.approx(0.7)
+
+
+def test_ability_moves_toward_results():
+    ability = 0.0
+    for answered in range(10):
+        ability = adaptive.update_ability(ability, 0.0, 1.0, answered)
+    assert ability > 1.0
+    assert adaptive.update_ability(ability, ability, 0.0, 10) < ability
+    assert adaptive.update_ability(10.0, 0.0, 1.0, 0) == adaptive.MAX_ABILITY
+
+
+def test_slow_correct_answers_count_less():
+    fast = adaptive.answer_outcome(True, 1000, 15)
+    slow = adaptive.answer_outcome(True, 15000, 15)
+    assert 1.0 > fast > slow == pytest.approx(1 - adaptive.SLOW_DISCOUNT)
+    assert adaptive.answer_outcome(True) == 1.0
+    assert adaptive.answer_outcome(False, 500, 15) == 0.0
+
+
+def test_estimate_converges_on_simulated_player():
+    rng = random.Random(3)
+    true_ability = 1.5
+    bank = [rng.uniform(-3, 3) for _ in range(2000)]
+    buckets = make_buckets(bank)
+    ability, used = 0.0, set()
+    for answered in range(40):
+        qid = buckets.pick(adaptive.target_difficulty(ability, target=0.7), exclude=used)
+        used.add(qid)
+        correct = rng.random() < 1 / (1 + math.exp(bank[qid] - true_ability))
+        ability = adaptive.update_ability(ability, bank[qid], float(correct), answered)
+    assert abs(ability - true_ability) < 0.8
+
+
+def test_bucket_cache_keeps_recent_topic_filters(db):
+    from django.test import override_settings
+
+    from quiz.models import Question
+
+    Question.objects.create(question_text="Who painted the Mona Lisa?", correct_answer="Leonardo", category="art")
+    Question.objects.create(question_text="When did Rome fall?", correct_answer="476", category="history")
+    adaptive._buckets.clear()
+    with override_settings(ADAPTIVE_BUCKET_CACHE_SIZE=2):
+        art = adaptive.get_buckets(["Art"])
+        adaptive.get_buckets(["history"])
+        assert adaptive.get_buckets([" art "]) is art  # same normalized key, now most recent
+        adaptive.get_buckets(["music", "Art"])
+        assert list(adaptive._buckets) == [("art",), ("art", "music")]
+    assert art.size == 1
@@ -0,0 +1,27 @@
+from quiz.arena import BASE_POINTS, SPEED_BONUS, ArenaScoreboard
+
+
+def test_one_pass_scoring_and_standings():
+    board = ArenaScoreboard(["ann", "bob", "cat", "dan"])
+    board.open_question(correct_option=2, now=100.0)
+    assert board.answer("ann", 2, now=100.0)       # instant, full bonus
+    assert board.answer("bob", 2, now=105.0)       # half the time left
+    assert board.answer("cat", 1, now=101.0)       # wrong
+    assert not board.answer("cat", 2, now=101.5)   # second answer ignored
+    assert not board.all_answered
+
+    points = board.close_question(time_limit_ms=10_000)
+    assert list(points) == [BASE_POINTS + SPEED_BONUS, BASE_POINTS + SPEED_BONUS // 2, 0, 0]
+    assert board.top(2) == [("ann", 20), ("bob", 15)]
+    assert list(board.ranks()) == [1, 2, 3, 3]
+    assert list(board.answered) == [1, 1, 1, 0]
+    assert [a[0] for a in board.answers()] == ["ann", "bob", "cat"]
+
+
+def test_invalid_answers_count_as_wrong():
+    board = ArenaScoreboard(["ann"])
+    board.open_question(correct_option=0, now=0.0)
+    assert board.answer("ann", "0", now=1.0)
+    assert board.all_answered
+    assert list(board.close_question(10_000)) == [0]
+    assert list(board.answers()) == [("ann", None, False, 1000)]
@@ -0,0 +1,38 @@
+from quiz.battle_protocol import CodeSync, bitmap_cases, results_bitmap
+from quiz.code_diff import apply_diff
+
+
+def test_results_bitmap_round_trip():
+    results = [{"passed": True}, {"passed": False}, {"passed": True}] + [{"passed": True}] * 40
+    bits = results_bitmap(results)
+    assert bitmap_cases(bits, len(results)) == [r["passed"] for r in results]
+    assert results_bitmap([{"passed": False}]) == "0"
+
+
+def test_diffs_are_against_the_acked_version():
+    sync = CodeSync()
+    sync.update("ann", "print(1)\n")
+    first = sync.frame_for("bob", "ann")
+    assert first["base_version"] == 0
+    bob_copy = apply_diff("", first["code_diff"])
+    assert sync.ack("bob", "ann", first["code_version"])
+
+    # Two submissions without an ack: the diff still starts from what bob has
+    sync.update("ann", "print(1)\nprint(2)\n")
+    sync.update("ann", "print(1)\nprint(3)\n")
+    frame = sync.frame_for("bob", "ann")
+    assert frame["base_version"] == 1 and frame["code_version"] == 3
+    assert apply_diff(bob_copy, frame["code_diff"]) == "print(1)\nprint(3)\n"
+
+    assert not sync.ack("bob", "ann", 99)
+    assert sync.ack("bob", "ann", 3)
+    assert not sync.ack("bob", "ann", 2)  # no going backwards
+
+
+def test_full_copy_when_acked_version_was_dropped():
+    sync = CodeSync()
+    sync.update("ann", "v1")
+    sync.ack("bob", "ann", 1)
+    for i in range(2, 10):
+        sync.update("ann", f"v{i}")
+    assert sync.frame_for("bob", "ann") == {"code_version": 9, "code": "v9"}
@@ -0,0 +1,28 @@
+import asyncio
+import json
+
+from quiz.broadcast import BroadcastMixin, encode_frame
+
+
+class FakeConsumer(BroadcastMixin):
+    def __init__(self, player_name):
+        self.player_name = player_name
+        self.sent = []
+
+    async def send(self, text_data=None):
+        self.sent.append(text_data)
+
+
+def test_encode_frame_is_compact_json():
+    text = encode_frame({"event": "question", "options": ["a", "b"], "order": 1})
+    assert json.loads(text) == {"event": "question", "options": ["a", "b"], "order": 1}
+    assert " " not in text
+
+
+def test_broadcast_frame_skips_excluded_player():
+    alice, bob = FakeConsumer("alice"), FakeConsumer("bob")
+    event = {"type": "broadcast_frame", "text": encode_frame({"event": "opponent_running"}), "exclude": "alice"}
+    for consumer in (alice, bob):
+        asyncio.run(consumer.broadcast_frame(event))
+    assert alice.sent == []
+    assert bob.sent == [event["text"]]
@@ -0,0 +1,33 @@
+from quiz.code_diff import apply_diff, make_diff
+
+
+def test_diff_round_trip():
+    cases = [
+        ("", "print(1)\n"),
+        ("def f():\n    return 1\n", "def f():\n    return 2\n"),
+        ("abcabc", "abc"),
+        ("aaa", "aaaa"),
+        ("hello", ""),
+    ]
+    for old, new in cases:
+        diff = make_diff(old, new)
+        assert apply_diff(old, diff) == new
+    assert make_diff("same", "same") is None
+
+
+def test_offsets_count_utf16_units_like_the_browser():
+    old, new = "# 🎉 done\nx = 1\n", "# 🎉 done\nx = 2\n"
+    diff = make_diff(old, new)
+    # The emoji is two UTF-16 code units, as String.slice counts it
+    assert diff == {"p": 14, "s": 1, "i": "2"}  # 13 Python characters
+    assert apply_diff(old, diff) == new
+
+    diff = make_diff("a😀b", "a😁b")
+    assert diff == {"p": 1, "s": 1, "i": "😁"}
+    assert apply_diff("a😀b", diff) == "a😁b"
+
+
+def test_small_edit_is_small():
+    old = "x = 1\n" * 200
+    new = old[:600] + "y = 2\n" + old[600:]
+    assert make_diff(old, new) == {"p": 600, "s": 600, "i": "y = 2\n"}
@@ -0,0 +1,64 @@
+def test_recent_games_query_is_served_by_the_index(db):
+    from quiz.models import PlayerScore
+
+    plan = PlayerScore.objects.filter(player_id=1).order_by("-joined_at").values(
+        "score", "session__created_at",
+    )[:10].explain()
+    assert "playerscore_player_recent_idx" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def _player_with_games(name, scores):
+    from quiz.models import CustomUser, PlayerScore, QuizSession
+
+    user = CustomUser.objects.create(username=name)
+    for score in scores:
+        PlayerScore.objects.create(
+            player=user, session=QuizSession.objects.create(), score=score, correct_answers=score, total_answers=5,
+        )
+    return user
+
+
+def test_payload_aggregates_the_players_games(db):
+    from quiz.dashboard import build_dashboard_payload
+
+    user = _player_with_games("cara", [2, 4, 5])
+    _player_with_games("dev", [1])
+
+    payload = build_dashboard_payload(user.id)
+    assert payload["stats"] == {
+        "total_quizzes": 3, "average_score": 3.7, "best_score": 5, "total_questions": 15, "win_rate": 73.3,
+    }
+    assert [q["score"] for q in payload["recent_quizzes"]] == [5, 4, 2]
+    assert payload["trend_scores"] == [2, 4, 5]
+
+
+def test_cached_until_one_of_the_players_scores_changes(db):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from quiz.dashboard import get_dashboard_payload
+
+    user = _player_with_games("cara", [2, 4])
+    other = _player_with_games("dev", [1])
+    get_dashboard_payload(user.id)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert get_dashboard_payload(user.id)["stats"]["total_quizzes"] == 2
+    assert len(queries) == 0
+
+    _player_with_games("erin", [3])  # someone else's game leaves the cache alone
+    score = other.playerscore_set.get()
+    score.score = 9
+    score.save()
+    with CaptureQueriesContext(connection) as queries:
+        get_dashboard_payload(user.id)
+    assert len(queries) == 0
+
+    score = user.playerscore_set.order_by("id").first()
+    score.score = 5
+    score.save()
+    assert get_dashboard_payload(user.id)["stats"]["best_score"] == 5
+
+    score.delete()
+    assert get_dashboard_payload(user.id)["stats"]["total_quizzes"] == 1
@@ -0,0 +1,91 @@
+def _batch(n):
+    return [{"question": f"Question {i}?", "options": ["a", "b", "c", "d"], "correct_answer": "a"} for i in range(n)]
+
+
+def test_consecutive_requests_get_different_slices(db):
+    from quiz.generation_cache import GenerationCache
+
+    cache = GenerationCache(timeout=60, max_entries=10, max_batch_size=50)
+    cache.store("History", "easy", 2, _batch(5))
+
+    slices = [[q["question"] for q in cache.get_slice("history", "easy", 2)] for _ in range(3)]
+    assert slices == [
+        ["Question 0?", "Question 1?"],
+        ["Question 2?", "Question 3?"],
+        ["Question 4?", "Question 0?"],
+    ]
+    assert cache.get_slice("History", "hard", 2) is None
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_slices_skip_questions_the_user_has_played(db):
+    from quiz.generation_cache import GenerationCache
+    from quiz.models import CustomUser, PlayerScore, Question, QuizSession, SessionQuestion
+
+    cache = GenerationCache(timeout=60, max_entries=10, max_batch_size=50)
+    cache.store("History", "easy", 2, _batch(3))
+    user = CustomUser.objects.create(username="ben")
+    session = QuizSession.objects.create()
+    PlayerScore.objects.create(player=user, session=session)
+    for order, text in enumerate(["Question 0?", "Question 2?"]):
+        question = Question.objects.create(question_text=text, correct_answer="a")
+        SessionQuestion.objects.create(session=session, question=question, order=order)
+
+    # Only one unplayed question left for this user: not enough for a slice of 2
+    assert cache.get_slice("History", "easy", 2, user=user) is None
+    cache.store("History", "easy", 1, _batch(3))
+    assert [q["question"] for q in cache.get_slice("History", "easy", 1, user=user)] == ["Question 1?"]
+
+
+def test_eviction_drops_the_oldest_prompt(db):
+    from quiz.generation_cache import GenerationCache
+
+    cache = GenerationCache(timeout=60, max_entries=2, max_batch_size=50)
+    for topic in ("a", "b", "c"):
+        cache.store(topic, "easy", 1, _batch(1))
+    assert cache.get_slice("a", "easy", 1) is None
+    assert cache.get_slice("c", "easy", 1) is not None
+    assert cache.stats()["entries"] == 2
+
+
+def test_concurrent_stores_keep_every_key_in_the_index(db):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from quiz.generation_cache import GenerationCache
+
+    cache = GenerationCache(timeout=60, max_entries=5, max_batch_size=50)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.store(f"Topic {i}", "easy", 1, _batch(2)), range(20)))
+
+    # The cap holds and no store dropped another's key from the index
+    index = cache._get(cache._index_key, [])
+    assert len(index) == 5
+    assert sum(cache.get_slice(f"Topic {i}", "easy", 1) is not None for i in range(20)) == 5
+
+
+def test_held_index_lock_skips_tracking_instead_of_racing(db, monkeypatch):
+    from django.core.cache import cache as django_cache
+
+    from quiz import generation_cache
+    from quiz.generation_cache import GenerationCache
+
+    monkeypatch.setattr(generation_cache, "INDEX_LOCK_WAIT", 0.01)
+    cache = GenerationCache(timeout=60, max_entries=5, max_batch_size=50)
+    django_cache.add(f"{cache._index_key}:lock", 1, 60)
+    cache.store("History", "easy", 1, _batch(2))
+
+    assert cache._get(cache._index_key, []) == []
+    assert cache.get_slice("History", "easy", 1) is not None
+
+
+def test_stats_view_reports_hits_and_misses(db):
+    from django.test import Client
+
+    from quiz.generation_cache import GENERATION_CACHE
+
+    GENERATION_CACHE.store("History", "easy", 1, _batch(2))
+    GENERATION_CACHE.get_slice("History", "easy", 1)
+    GENERATION_CACHE.get_slice("History", "hard", 1)
+
+    body = Client().get("/question-cache/stats/").json()
+    assert body["hits"] == 1 and body["misses"] == 1 and body["hit_rate"] == 50.0
@@ -0,0 +1,55 @@
+import json
+
+from quiz.json_stream import JSONArrayStreamParser
+
+
+QUESTIONS = [
+    {
+        "question": "Which brace closes {this}?",
+        "options": ["}", "]", ")", "\""],
+        "correct_answer": "}",
+        "explanation": "A \"quoted\" brace { inside a string is ignored.",
+    },
+    {
+        "question": "What is 2 + 2?",
+        "options": ["3", "4", "5", "6"],
+        "correct_answer": "4",
+        "explanation": "Nested [brackets] are fine too.",
+    },
+]
+
+
+def _feed_in_chunks(text, size):
+    parser = JSONArrayStreamParser()
+    found = []
+    for i in range(0, len(text), size):
+        found.extend(parser.feed(text[i:i + size]))
+    return parser, found
+
+
+def test_objects_yielded_for_any_chunk_size():
+    text = json.dumps(QUESTIONS, indent=2)
+    for size in (1, 3, 7, 64, len(text)):
+        parser, found = _feed_in_chunks(text, size)
+        assert found == QUESTIONS
+        assert parser.finished
+
+
+def test_first_object_available_before_array_closes():
+    text = json.dumps(QUESTIONS)
+    cut = text.index("}, {") + 1
+    parser = JSONArrayStreamParser()
+    assert parser.feed(text[:cut]) == [QUESTIONS[0]]
+    assert not parser.finished
+
+
+def test_markdown_fence_and_bad_elements_are_skipped():
+    text = "```json\n[" + '"not an object", {"broken": }, ' + json.dumps(QUESTIONS[1]) + "]\n```"
+    parser, found = _feed_in_chunks(text, 5)
+    assert found == [QUESTIONS[1]]
+
+
+def test_no_array_means_not_started():
+    parser = JSONArrayStreamParser()
+    assert parser.feed("Sorry, I cannot help with that.") == []
+    assert not parser.started
@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+
+from quiz import leaderboard
+from quiz.leaderboard import MemoryLeaderboard, RedisLeaderboard
+
+from fake_redis import FakeRedis
+
+
+def _board():
+    board = MemoryLeaderboard()
+    board.replace_all([(1, 50), (2, 80), (3, 10), (4, 80), (5, 30)])
+    return board
+
+
+def test_top_and_rank():
+    board = _board()
+    assert board.top(3) == [(2, 80), (4, 80), (1, 50)]
+    assert board.rank(1) == 3
+    assert board.rank(3) == 5
+    assert board.rank(99) is None
+
+
+def test_updates_move_players():
+    board = _board()
+    board.set_score(3, 100)
+    assert board.rank(3) == 1
+    assert board.incr(5, 25) == 55
+    assert board.rank(5) == 4
+    board.remove(2)
+    assert len(board) == 4
+    assert board.top(1) == [(3, 100)]
+
+
+def test_around_me():
+    board = _board()
+    assert board.around(1, radius=1) == [(2, 4, 80), (3, 1, 50), (4, 5, 30)]
+    assert board.around(2, radius=1) == [(1, 2, 80), (2, 4, 80)]
+
+
+def test_redis_board_is_warm_only_after_a_full_load():
+    board = RedisLeaderboard(FakeRedis())
+    board.set_score(7, 40)  # first write after a deploy creates the key
+    assert not board.warmed
+    board.replace_all([(1, 50), (7, 40)])
+    assert board.warmed
+    assert board.top(2) == [(1, 50), (7, 40)]
+
+
+def test_first_read_rebuilds_a_board_created_by_a_write(monkeypatch):
+    board = RedisLeaderboard(FakeRedis())
+    board.set_score(7, 40)
+    monkeypatch.setattr(leaderboard, "_warm_checked", False)
+    monkeypatch.setattr(leaderboard, "rebuild", lambda b: b.replace_all([(1, 50), (2, 20), (7, 40)]))
+    assert leaderboard._warm(board).top(3) == [(1, 50), (7, 40), (2, 20)]
+
+
+def test_memory_board_is_warm_only_after_a_full_load():
+    board = MemoryLeaderboard()
+    board.incr(7, 40)
+    assert not board.warmed
+    board.replace_all([(7, 40)])
+    assert board.warmed
+
+
+# ---- Windowed boards ----
+
+
+def test_bucket_key_per_window_and_mode():
+    when = datetime(2025, 12, 31, 23, 30, tzinfo=timezone.utc)
+    assert leaderboard.bucket_key("daily", when=when) == "leaderboard:daily:2025-12-31:all"
+    # ISO week: 31 Dec 2025 is in week 1 of 2026
+    assert leaderboard.bucket_key("weekly", "single", when=when) == "leaderboard:weekly:2026-W01:single"
+    assert leaderboard.bucket_key("monthly", "multiplayer", when=when) == "leaderboard:monthly:2025-12:multiplayer"
+    assert leaderboard.bucket_key("all", "coding_battle") == "leaderboard:mode:coding_battle"
+
+
+def test_window_start_is_start_of_bucket():
+    when = datetime(2025, 12, 31, 23, 30, tzinfo=timezone.utc)
+    assert leaderboard.window_start("daily", when) == datetime(2025, 12, 31, tzinfo=timezone.utc)
+    assert leaderboard.window_start("weekly", when) == datetime(2025, 12, 29, tzinfo=timezone.utc)
+    assert leaderboard.window_start("monthly", when) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+    assert leaderboard.window_start("all", when) is None
+
+
+def test_record_game_adds_to_every_bucket_of_the_mode(db):
+    leaderboard.record_game(1, 5, "single")
+    leaderboard.record_game(1, 3, "single")
+    leaderboard.record_game(2, 4, "multiplayer")
+    leaderboard.record_game(2, 4, "unknown-mode")
+    buckets = leaderboard.get_buckets()
+    assert buckets.board(leaderboard.bucket_key("all", "single")).top(5) == [(1, 8)]
+    assert buckets.board(leaderboard.bucket_key("weekly", "single")).top(5) == [(1, 8)]
+    assert buckets.board(leaderboard.bucket_key("daily")).top(5) == [(1, 8), (2, 4)]
+    assert buckets.board(leaderboard.bucket_key("monthly", "multiplayer")).top(5) == [(2, 4)]
+
+
+def _play(user, score, mode="single"):
+    from quiz.models import PlayerScore, QuizSession
+
+    session = QuizSession.objects.create(session_type=mode)
+    PlayerScore.objects.create(player=user, session=session, score=score)
+    return session
+
+
+def test_board_created_by_a_write_is_rebuilt_on_first_read(db):
+    from quiz.models import CustomUser
+
+    alice = CustomUser.objects.create(username="alice")
+    bob = CustomUser.objects.create(username="bob")
+    _play(alice, 30)
+    _play(bob, 20)
+    _play(bob, 5)
+    bob.update_stats(5, mode="single")  # creates the weekly/all-time single buckets
+
+    for window in ("weekly", "all"):
+        board = leaderboard.bucket_board(window, "single")
+        assert board.top(5) == [(alice.pk, 30), (bob.pk, 25)]
+
+    # Later games are added to the now warm board, not rebuilt away
+    _play(alice, 10)
+    alice.update_stats(10, mode="single")
+    assert leaderboard.bucket_board("weekly", "single").top(5) == [(alice.pk, 40), (bob.pk, 25)]
+
+
+def test_all_time_board_warms_from_total_score(db):
+    from quiz.models import CustomUser
+
+    CustomUser.objects.create(username="alice", total_score=70)
+    bob = CustomUser.objects.create(username="bob", total_score=10)
+    bob.update_stats(5)
+    assert [score for _, score in leaderboard.top(5)] == [70, 15]
@@ -0,0 +1,104 @@
+import time
+
+from quiz.matchmaking import Matchmaker, MemoryQueueStore, RedisQueueStore, wait_bin
+
+from fake_redis import FakeRedis
+
+
+def make(store=None):
+    return Matchmaker(store or MemoryQueueStore(), band=100, widen=10)
+
+
+def ticket(mm, name, rating, difficulty="easy", waited=0):
+    t = mm.new_ticket("battle", name, None, f"chan-{name}", rating, difficulty=difficulty)
+    t["enqueued_at"] = time.time() - waited
+    return t
+
+
+def test_pairs_closest_rating_within_band():
+    mm = make()
+    for name, rating in (("far", 1500), ("near", 1290), ("close", 1180)):
+        assert mm.enqueue(ticket(mm, name, rating)) is None
+
+    opponent = mm.enqueue(ticket(mm, "me", 1200))
+    assert opponent["player"] == "close"
+    assert mm.stats()["depth"] == {"battle:easy:any": 2}
+    assert sum(mm.stats()["wait_seconds"]["battle"].values()) == 2
+
+
+def test_buckets_and_band_keep_players_apart():
+    mm = make()
+    mm.enqueue(ticket(mm, "hard", 1200, difficulty="hard"))
+    mm.enqueue(ticket(mm, "strong", 1600))
+    assert mm.enqueue(ticket(mm, "me", 1200)) is None
+    assert mm.stats()["depth"] == {"battle:hard:any": 1, "battle:easy:any": 2}
+
+
+def test_band_widens_while_waiting_and_retry_pairs():
+    mm = make()
+    waiting = ticket(mm, "veteran", 1600, waited=60)
+    mm.enqueue(waiting)
+    # 60s waited -> band 700, so a 400-point gap is now acceptable
+    assert mm.enqueue(ticket(mm, "me", 1200))["player"] == "veteran"
+
+    lonely = ticket(mm, "lonely", 1000)
+    mm.enqueue(lonely)
+    mm.enqueue(ticket(mm, "other", 1500))
+    lonely["enqueued_at"] -= 60
+    queued, opponent = mm.retry(lonely)
+    assert (queued, opponent["player"]) == (False, "other")
+    assert mm.retry(lonely) == (False, None)  # already gone
+
+
+def test_wait_bins():
+    assert [wait_bin(s) for s in (0.2, 1, 7, 500)] == ["1", "1", "10", "+Inf"]
+
+
+def test_redis_queue_only_pairs_players_of_the_same_worker():
+    client = FakeRedis()
+    worker_a = make(RedisQueueStore(client, scope="host:1"))
+    worker_b = make(RedisQueueStore(client, scope="host:2"))
+
+    worker_a.enqueue(ticket(worker_a, "on-a", 1200))
+    # A player on another worker would get a room that worker doesn't have
+    assert worker_b.enqueue(ticket(worker_b, "on-b", 1210)) is None
+    assert worker_a.stats()["depth"] == {"battle:easy:any": 2}
+
+    assert worker_a.enqueue(ticket(worker_a, "also-on-a", 1190))["player"] == "on-a"
+    assert worker_b.stats()["depth"] == {"battle:easy:any": 1}
+    assert sum(worker_b.stats()["wait_seconds"]["battle"].values()) == 2
+
+
+def test_matched_rooms_never_reuse_a_live_room_name(django_test_db, monkeypatch):
+    import asyncio
+    import random
+
+    from quiz import consumers
+
+    random.seed(11)
+    taken = f"room_{random.randint(1000, 9999)}"
+    live = {"players": ["a", "b"]}
+    monkeypatch.setitem(consumers.ROOMS, taken, live)
+
+    async def no_questions(self, **config):
+        return []
+
+    monkeypatch.setattr(consumers.QuizConsumer, "get_questions", no_questions)
+    sides = [{"player": p, "user_id": None, "channel": p, "topic": "any", "difficulty": "easy"} for p in ("c", "d")]
+
+    random.seed(11)  # the first name drawn is the live room's
+    room_name = asyncio.run(consumers.QuizConsumer().create_match(*sides))
+    try:
+        assert room_name != taken
+        assert consumers.ROOMS[taken] is live
+        assert consumers.ROOMS[room_name]["players"] == ["c", "d"]
+    finally:
+        consumers.ROOMS.pop(room_name, None)
+
+
+def test_room_names_get_longer_when_short_codes_run_out(django_test_db, monkeypatch):
+    from quiz import consumers
+
+    rooms = {f"battle_{n}": None for n in range(1000, 10000)}
+    name = consumers.unused_room_name("battle", rooms)
+    assert name not in rooms and name.startswith("battle_")
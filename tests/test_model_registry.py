@@ -0,0 +1,86 @@
+import pytest
+
+
+@pytest.fixture
+def ai_service(django_test_db):
+    from quiz import ai_service
+
+    return ai_service
+
+
+@pytest.fixture
+def clock(ai_service, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ai_service.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_known_good_first_then_first_unknown(ai_service):
+    registry = ai_service.ModelRegistry(["a", "b"])
+    assert registry.variants == ["a", "models/a", "b", "models/b"]
+    assert registry.best_model() == "a"
+
+    registry.mark_bad("a")
+    assert registry.best_model() == "models/a"
+    registry.mark_good("b")
+    assert registry.best_model() == "b"
+    assert registry.best_model(exclude={"b"}) == "models/a"
+    assert registry.has_good_model()
+
+
+def test_all_bad_means_no_model(ai_service):
+    registry = ai_service.ModelRegistry(["a"])
+    registry.mark_bad("a")
+    registry.mark_bad("models/a")
+    assert registry.best_model() is None
+
+
+def test_marks_expire_after_their_ttl(ai_service, clock):
+    registry = ai_service.ModelRegistry(["a"])
+    registry.mark_bad("a")
+    registry.mark_good("models/a")
+
+    clock[0] += registry.BAD_TTL
+    assert registry.status("a") is None
+    assert registry.status("models/a") is True
+
+    clock[0] += registry.GOOD_TTL
+    assert registry.status("models/a") is None
+    assert not registry.has_good_model()
+
+
+class NotFound(Exception):
+    pass
+
+
+class _Model:
+    def __init__(self, error=None):
+        self.error = error
+
+    def generate_content(self, prompt, stream=False):
+        if self.error:
+            raise self.error
+        return type("Response", (), {"text": "ok"})()
+
+
+def _probe(ai_service, monkeypatch, models):
+    monkeypatch.setattr(ai_service, "get_gemini_model", lambda variant: models[variant])
+    registry = ai_service.ModelRegistry(["a", "b"])
+    registry._probe_unknown()
+    return registry
+
+
+def test_probe_marks_missing_models_bad_and_stops_at_first_good(ai_service, monkeypatch):
+    registry = _probe(ai_service, monkeypatch, {
+        "a": _Model(NotFound("models/a is not found")),
+        "models/a": _Model(Exception("403 Permission denied on model")),
+        "b": _Model(),
+    })
+    assert [registry.status(v) for v in registry.variants] == [False, False, True, None]
+
+
+def test_transient_errors_leave_models_unknown(ai_service, monkeypatch):
+    for error in (Exception("429 Resource has been exhausted (e.g. check quota)"), TimeoutError("read timed out")):
+        registry = _probe(ai_service, monkeypatch, {"a": _Model(error), "b": _Model()})
+        assert [registry.status(v) for v in registry.variants] == [None] * 4
+        assert registry.best_model() == "a"
@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from quiz.persistence import WriteBehindQueue, persist_game_results
+
+
+def test_results_are_written_in_batches():
+    batches = []
+
+    async def run():
+        queue = WriteBehindQueue(persist=batches.append, batch_size=3, flush_delay=0.05)
+        queue._write = _direct_write(queue)
+        for i in range(7):
+            queue.enqueue({"room": f"room_{i}"})
+        await queue.join()
+
+    asyncio.run(run())
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert [r["room"] for b in batches for r in b] == [f"room_{i}" for i in range(7)]
+
+
+def test_failed_batch_does_not_stop_the_worker():
+    written = []
+
+    def persist(batch):
+        if batch[0]["room"] == "bad":
+            raise RuntimeError("db down")
+        written.extend(batch)
+
+    async def run():
+        queue = WriteBehindQueue(persist=persist, batch_size=1, flush_delay=0)
+        queue._write = _direct_write(queue)
+        queue.enqueue({"room": "bad"})
+        queue.enqueue({"room": "good"})
+        await queue.join()
+
+    asyncio.run(run())
+    assert written == [{"room": "good"}]
+
+
+def test_failing_batch_is_retried_game_by_game():
+    attempts, written = [], []
+
+    def persist(batch):
+        attempts.append(len(batch))
+        if any(r["room"] == "bad" for r in batch):
+            raise RuntimeError("foreign key constraint failed")
+        written.extend(batch)
+
+    async def run():
+        queue = WriteBehindQueue(persist=persist, batch_size=3, flush_delay=0.05)
+        queue.retry_delay = 0
+        queue._persist = _direct_persist(queue)
+        for room in ("a", "bad", "b"):
+            queue.enqueue({"room": room})
+        await queue.join()
+
+    asyncio.run(run())
+    assert attempts == [3, 3, 3, 1, 1, 1]
+    assert [r["room"] for r in written] == ["a", "b"]
+
+
+def _direct_write(queue):
+    """Same as WriteBehindQueue._write but without the thread hop and retry sleeps."""
+    async def write(batch):
+        try:
+            queue.persist(batch)
+        except Exception:
+            pass
+    return write
+
+
+def _direct_persist(queue):
+    """WriteBehindQueue._persist without the thread hop."""
+    async def persist(batch):
+        queue.persist(batch)
+    return persist
+
+
+# ---- persist_game_results against the database ----
+
+
+def _game(alice, bob, question, room="room_1", mode="multiplayer"):
+    from django.utils import timezone
+
+    now = timezone.now()
+    return {
+        "mode": mode,
+        "room": room,
+        "difficulty": "easy",
+        "started_at": now,
+        "finished_at": now,
+        "question_ids": [question.pk],
+        "players": [
+            {"name": "alice", "user_id": alice.pk, "score": 20, "correct": 1, "total": 1, "won": True},
+            {"name": "bob", "user_id": bob.pk, "score": 0, "correct": 0, "total": 1, "won": False},
+            {"name": "guest", "user_id": None, "score": 10, "correct": 1, "total": 1, "won": False},
+        ],
+        "answers": [
+            {"player": "alice", "question_id": question.pk, "selected": 1, "is_correct": True,
+             "response_time_ms": 1500, "answered_at": now},
+            {"player": "guest", "question_id": question.pk, "selected": 0, "is_correct": False,
+             "response_time_ms": 4000, "answered_at": now},
+        ],
+    }
+
+
+def _players_and_question():
+    from quiz.models import CustomUser, Question
+
+    alice = CustomUser.objects.create(username="alice")
+    bob = CustomUser.objects.create(username="bob")
+    question = Question.objects.create(question_text="2 + 2?", options=["3", "4"], correct_answer="1")
+    return alice, bob, question
+
+
+def test_persist_game_results_writes_the_batch(db):
+    from django.test import TestCase
+
+    from quiz import leaderboard
+    from quiz.models import PlayerAnswer, PlayerScore, QuizSession, RatingHistory
+
+    alice, bob, question = _players_and_question()
+    with TestCase.captureOnCommitCallbacks(execute=True):
+        assert persist_game_results([_game(alice, bob, question), _game(alice, bob, question, "room_2")]) == 2
+
+    assert QuizSession.objects.filter(session_type="multiplayer", status="finished").count() == 2
+    assert PlayerScore.objects.filter(player=alice).count() == 2
+    assert PlayerAnswer.objects.filter(player=None, player_name="guest").count() == 2
+    assert RatingHistory.objects.filter(player=bob).count() == 2
+
+    alice.refresh_from_db()
+    bob.refresh_from_db()
+    assert (alice.total_score, alice.games_played, alice.win_rate) == (40, 2, 100.0)
+    assert alice.rating > 1200 > bob.rating
+    assert leaderboard.top(2) == [(alice.pk, 40), (bob.pk, 0)]
+    weekly = leaderboard.get_buckets().board(leaderboard.bucket_key("weekly", "multiplayer"))
+    assert weekly.top(1) == [(alice.pk, 40)]
+
+
+def test_rolled_back_batch_leaves_leaderboards_alone(db, monkeypatch):
+    from django.test import TestCase
+
+    from quiz import leaderboard, rating
+    from quiz.models import QuizSession
+
+    alice, bob, question = _players_and_question()
+
+    def fail(games):
+        raise RuntimeError("rating update failed")
+
+    monkeypatch.setattr(rating, "apply_game_ratings", fail)
+    with TestCase.captureOnCommitCallbacks(execute=True) as callbacks:
+        with pytest.raises(RuntimeError):
+            persist_game_results([_game(alice, bob, question)])
+
+    assert callbacks == []
+    assert not QuizSession.objects.exists()
+    weekly = leaderboard.get_buckets().board(leaderboard.bucket_key("weekly", "multiplayer"))
+    assert len(weekly) == 0
@@ -0,0 +1,77 @@
+from quiz.providers import LocalQuestionProvider, FallbackQuestionProvider, QuestionProvider
+
+
+def test_local_provider_is_deterministic():
+    a = LocalQuestionProvider(seed=42).generate_questions("Aptitude", "medium", 20)
+    b = LocalQuestionProvider(seed=42).generate_questions("Aptitude", "medium", 20)
+    assert a == b
+    assert a != LocalQuestionProvider(seed=7).generate_questions("Aptitude", "medium", 20)
+
+
+def test_local_questions_are_valid_mcqs():
+    provider = LocalQuestionProvider(seed=1)
+    for difficulty in ("easy", "medium", "hard"):
+        questions = provider.generate_questions("Aptitude", difficulty, 25)
+        assert len(questions) == 25
+        assert len({q["question"] for q in questions}) == 25
+        for q in questions:
+            assert len(q["options"]) == 4
+            assert len(set(q["options"])) == 4
+            assert q["correct_answer"] in q["options"]
+
+
+def test_repeated_calls_continue_the_sequence():
+    provider = LocalQuestionProvider(seed=3)
+    first = provider.generate_questions("Aptitude", "easy", 5)
+    second = provider.generate_questions("Aptitude", "easy", 5)
+    assert first != second
+
+
+class _DownProvider(QuestionProvider):
+    name = "down"
+
+    def is_available(self):
+        return False
+
+
+def test_fallback_used_when_primary_degraded():
+    provider = FallbackQuestionProvider(_DownProvider(), LocalQuestionProvider(seed=0))
+    assert len(provider.generate_questions("Aptitude", "easy", 3)) == 3
+
+
+class _RecordingProvider(QuestionProvider):
+    name = "recording"
+
+    def __init__(self):
+        self.users = []
+
+    def generate_questions(self, topic, difficulty="medium", num_questions=5, user=None):
+        self.users.append(user)
+        return []
+
+
+def test_fallback_passes_the_user_to_both_providers():
+    primary, fallback = _RecordingProvider(), _RecordingProvider()
+    user = object()
+    assert FallbackQuestionProvider(primary, fallback).generate_questions("Biology", "easy", 2, user=user) == []
+    assert primary.users == fallback.users == [user]
+
+
+def test_local_provider_draws_other_topics_from_the_bank(db):
+    from quiz.models import CustomUser, PlayerScore, Question, QuizSession, SessionQuestion
+
+    played, fresh = Question.objects.bulk_create([
+        Question(question_text=f"Which organelle {n}?", options=["Nucleus", "Ribosome", "Mitochondrion", "Vacuole"],
+                 correct_answer="2", category="Biology", difficulty="easy", text_hash=str(n))
+        for n in ("makes ATP", "holds DNA")
+    ])
+    user = CustomUser.objects.create(username="ana")
+    session = QuizSession.objects.create()
+    SessionQuestion.objects.create(session=session, question=played, order=0)
+    PlayerScore.objects.create(player=user, session=session)
+
+    provider = LocalQuestionProvider(seed=0)
+    questions = provider.generate_questions("biology", "easy", 5, user=user)
+    assert [q["question"] for q in questions] == [fresh.question_text]
+    assert questions[0]["correct_answer"] == "Mitochondrion"
+    assert provider.generate_questions("Astronomy", "easy", 5) == []
@@ -0,0 +1,59 @@
+import importlib
+
+
+def test_text_hash_ignores_case_and_spacing(django_test_db):
+    from quiz.models import question_text_hash
+
+    assert question_text_hash("What is  2+2?") == question_text_hash(" what is 2+2? ")
+    assert question_text_hash("What is 2+2?") != question_text_hash("What is 2+3?")
+
+
+def _q(text, category="math"):
+    return {"question_text": text, "options": ["3", "4"], "correct_answer": 1, "category": category}
+
+
+def test_linking_reuses_existing_questions_without_retagging(db):
+    from quiz.models import Question, QuizSession, SessionQuestion
+    from quiz.search import tag_questions
+    from quiz.views import link_questions_to_session
+
+    existing = Question.objects.create(question_text="What is 2+2?", correct_answer="1", category="math")
+    tag_questions([(existing.id, "math")])
+
+    session = QuizSession.objects.create()
+    link_questions_to_session(session, [
+        _q("what is  2+2?", category="arithmetic"),
+        _q("What is 3+3?", category="arithmetic"),
+        _q("WHAT IS 3+3?", category="arithmetic"),
+    ])
+
+    linked = list(SessionQuestion.objects.filter(session=session).order_by("order").values_list("question_id", flat=True))
+    assert len(linked) == 2 and linked[0] == existing.id
+    assert Question.objects.count() == 2
+    assert list(existing.topics.values_list("name", flat=True)) == ["math"]
+    assert list(Question.objects.get(id=linked[1]).topics.values_list("name", flat=True)) == ["arithmetic"]
+
+
+def test_migration_folds_unhashed_duplicates_into_the_kept_copy(db):
+    from django.apps import apps
+
+    from quiz.models import PlayerAnswer, Question, QuizSession, Topic
+
+    migration = importlib.import_module("quiz.migrations.0015_merge_duplicate_questions")
+    kept = Question.objects.create(question_text="Capital of France?", correct_answer="Paris")
+    duplicate, lone = Question.objects.bulk_create([
+        Question(question_text="capital of  france?", correct_answer="Paris", text_hash=None),
+        Question(question_text="Capital of Spain?", correct_answer="Madrid", text_hash=None),
+    ])
+    duplicate.topics.add(Topic.objects.create(name="geography"))
+    session = QuizSession.objects.create()
+    PlayerAnswer.objects.create(session=session, question=duplicate, is_correct=True)
+
+    migration.merge_duplicate_questions(apps, None)
+
+    assert not Question.objects.filter(id=duplicate.id).exists()
+    assert PlayerAnswer.objects.get(session=session).question_id == kept.id
+    assert list(kept.topics.values_list("name", flat=True)) == ["geography"]
+    lone.refresh_from_db()
+    assert lone.text_hash is not None
+    lone.save()  # no longer collides with anything
@@ -0,0 +1,37 @@
+def _questions(n, **fields):
+    from quiz.models import Question
+
+    return Question.objects.bulk_create([
+        Question(question_text=f"Sample question {i}?", options=["a", "b", "c", "d"], correct_answer="0",
+                 text_hash=f"sample-{i}", **fields)
+        for i in range(n)
+    ])
+
+
+def test_sample_picks_distinct_ids_and_respects_exclusions(db):
+    from quiz.models import Question
+    from quiz.views import sample_question_ids
+
+    ids = [q.id for q in _questions(10)]
+    qs = Question.objects.filter(id__in=ids)
+
+    picked = sample_question_ids(qs, 4, exclude_ids=ids[:3])
+    assert len(picked) == 4 == len(set(picked))
+    assert set(picked) <= set(ids[3:])
+
+    # Asking for more than is left returns everything left
+    assert sorted(sample_question_ids(qs, 20, exclude_ids=ids[:8])) == ids[8:]
+    assert sample_question_ids(qs.none(), 3) == []
+    assert sample_question_ids(qs, 0) == []
+
+
+def test_short_topic_is_topped_up_from_bank_then_fallbacks(db):
+    from quiz.views import FALLBACK_MCQ_QUESTIONS, generate_mcq_questions
+
+    _questions(2, category="geology", difficulty="easy")
+    questions = generate_mcq_questions(6, ["geology"], "mixed", 15)
+    assert len(questions) == 6
+    assert len({q["question_text"].lower() for q in questions}) == 6
+    from_bank = [q for q in questions if "db_id" in q]
+    assert len(from_bank) == 2
+    assert len(questions) - len(from_bank) <= len(FALLBACK_MCQ_QUESTIONS)
@@ -0,0 +1,76 @@
+import pytest
+
+from quiz import question_stats as qs
+
+
+def test_histogram_median_is_within_one_bucket():
+    times = [800, 1200, 1500, 2000, 2500, 3000, 9000]
+    histogram = {}
+    for ms in times:
+        histogram = qs.merge_histograms(histogram, {str(qs.time_bucket(ms)): 1})
+    median = qs.histogram_median(histogram)
+    assert median == pytest.approx(2000, rel=2 ** (1 / qs.HISTOGRAM_STEPS) - 1)
+    assert qs.histogram_median({}) is None
+
+
+def test_histograms_merge_across_runs():
+    merged = qs.merge_histograms({"40": 2, "44": 1}, {"44": 3, "48": 1})
+    assert merged == {"40": 2, "44": 4, "48": 1}
+
+
+def test_rollups_group_sorted_rows_by_question():
+    rows = [(1, True, 1000), (1, False, None), (2, True, 3000), (2, True, 3100), (2, False, 4000)]
+    rollups = list(qs.iter_rollups(iter(rows)))
+    assert [(r.question_id, r.attempts, r.correct) for r in rollups] == [(1, 2, 1), (2, 3, 2)]
+    assert sum(rollups[0].histogram.values()) == 1
+
+
+def test_calibration_starts_at_label_prior_and_follows_answers():
+    assert qs.calibrated_difficulty(0, 0, "hard", weight=10) == pytest.approx(1.0)
+    assert qs.calibrated_difficulty(190, 200, "hard", weight=10) < -1.5
+    assert qs.calibrated_difficulty(5, 200, "easy", weight=10) > 1.5
+
+
+def _question(text, difficulty="medium"):
+    from quiz.models import Question
+
+    return Question.objects.create(
+        question_text=text, difficulty=difficulty, options=["a", "b"], correct_answer="a",
+    )
+
+
+def test_classic_session_answers_are_recorded(db):
+    from django.test import Client
+
+    from quiz.models import PlayerAnswer, QuizSession, SessionQuestion
+
+    question = _question("Which letter comes first?")
+    session = QuizSession.objects.create(session_type="single", status="active")
+    SessionQuestion.objects.create(session=session, question=question, order=0)
+
+    response = Client().post("/submit-answer/", {
+        "question_id": question.id, "session_id": session.id, "answer": "a", "response_time_ms": "1800",
+    })
+    assert response.status_code == 200
+    answer = PlayerAnswer.objects.get(session=session)
+    assert (answer.question_id, answer.is_correct, answer.response_time_ms) == (question.id, True, 1800)
+
+
+def test_full_rollup_keeps_calibration_of_unanswered_questions(db):
+    from quiz.models import PlayerAnswer, Question, QuizSession
+
+    answered, unanswered = _question("Answered?"), _question("Unanswered?")
+    Question.objects.filter(id=unanswered.id).update(irt_difficulty=1.25)
+    session = QuizSession.objects.create()
+    PlayerAnswer.objects.bulk_create([
+        PlayerAnswer(session=session, question=answered, is_correct=i % 2 == 0, response_time_ms=2000)
+        for i in range(4)
+    ])
+
+    stats = qs.rollup_question_stats(full=True)
+    assert (stats["answers"], stats["questions"]) == (4, 1)
+    answered.refresh_from_db()
+    unanswered.refresh_from_db()
+    assert (answered.attempt_count, answered.correct_count, answered.correct_rate) == (4, 2, 0.5)
+    assert answered.irt_difficulty is not None
+    assert (unanswered.attempt_count, unanswered.irt_difficulty) == (0, 1.25)
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from quiz import rating
+
+
+def test_duel_is_plain_elo_and_zero_sum():
+    deltas = rating.game_deltas([1200, 1200], [100, 20], k=32)
+    assert deltas == [16.0, -16.0]
+    upset = rating.game_deltas([1000, 1400], [100, 20], k=32)
+    assert upset[0] == pytest.approx(32 * (1 - rating.expected(1000, 1400)))
+    assert sum(upset) == pytest.approx(0)
+
+
+def test_room_weights_each_opponent_by_n_minus_one():
+    deltas = rating.game_deltas([1200] * 4, [30, 20, 20, 10], k=32)
+    assert deltas == pytest.approx([16, 0, 0, -16])
+
+
+def random_games(num_players=50, num_games=400, seed=7):
+    rng = random.Random(seed)
+    games = []
+    for _ in range(num_games):
+        seats = rng.sample(range(num_players), rng.choice((2, 2, 2, 3, 5)))
+        games.append((seats, [rng.randint(0, 3) * 10 for _ in seats]))
+    return games
+
+
+def test_python_replay_matches_game_by_game():
+    games = random_games()
+    ratings = [rating.DEFAULT_RATING] * 50
+    for seats, scores in games:
+        for p, d in zip(seats, rating.game_deltas([ratings[p] for p in seats], scores, k=32)):
+            ratings[p] += d
+
+    np_module, rating.np = rating.np, None
+    try:
+        replayed, deltas, after = rating.replay(games, 50, k=32)
+    finally:
+        rating.np = np_module
+    assert replayed == pytest.approx(ratings)
+    assert len(deltas) == len(after) == sum(len(seats) for seats, _ in games)
+
+
+def test_vectorized_replay_matches_python():
+    pytest.importorskip("numpy")
+    games = random_games()
+    expected_ratings = [rating.DEFAULT_RATING] * 50
+    expected_after = []
+    for seats, scores in games:
+        for p, d in zip(seats, rating.game_deltas([expected_ratings[p] for p in seats], scores, k=32)):
+            expected_ratings[p] += d
+            expected_after.append(expected_ratings[p])
+
+    ratings, deltas, after = rating.replay(games, 50, k=32)
+    assert list(ratings) == pytest.approx(expected_ratings)
+    assert list(after) == pytest.approx(expected_after)
+
+
+def test_vectorized_game_deltas_match_the_pairwise_loop():
+    pytest.importorskip("numpy")
+    rng = random.Random(5)
+    ratings = [rng.uniform(900, 1600) for _ in range(60)]
+    scores = [rng.randint(0, 5) * 10 for _ in ratings]
+    vectorized = rating.game_deltas(ratings, scores, k=32)
+
+    np_module, rating.np = rating.np, None
+    try:
+        looped = rating.game_deltas(ratings, scores, k=32)
+    finally:
+        rating.np = np_module
+    assert vectorized == pytest.approx(looped)
+
+
+def test_incremental_ratings_match_a_recompute_when_guests_played(db):
+    from django.utils import timezone
+
+    from quiz.models import CustomUser, PlayerScore, QuizSession
+
+    users = [CustomUser.objects.create(username=f"p{i}") for i in range(3)]
+    games = []
+    for scores in ([30, 10, 20], [0, 40, 10]):
+        session = QuizSession.objects.create(session_type="multiplayer")
+        for user, score in zip(users, scores):
+            PlayerScore.objects.create(player=user, session=session, score=score)
+        # A guest who beat everyone sat in both rooms
+        games.append((session, [(u.id, s) for u, s in zip(users, scores)] + [(None, 99)], timezone.now()))
+
+    rating.apply_game_ratings(games)
+    incremental = dict(CustomUser.objects.values_list("id", "rating"))
+    rating.recompute_ratings()
+    assert dict(CustomUser.objects.values_list("id", "rating")) == pytest.approx(incremental)
+    assert incremental[users[0].id] != rating.DEFAULT_RATING
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from quiz.resume import ReplayBuffer
+
+
+def test_replay_buffer_stamps_and_filters_by_audience():
+    buffer = ReplayBuffer(size=10)
+    first = buffer.record({"event": "question"})
+    buffer.record({"event": "opponent_running"}, exclude="alice")
+    buffer.record({"event": "submission_result"}, to="bob")
+    buffer.record({"event": "finished"})
+
+    assert first["seq"] == 1
+    assert [f["event"] for f in buffer.missed("alice", 0)] == ["question", "finished"]
+    assert [f["seq"] for f in buffer.missed("bob", 1)] == [2, 3, 4]
+    assert buffer.missed("bob", 4) == []
+
+
+def test_replay_buffer_reports_gap_when_frames_were_dropped():
+    buffer = ReplayBuffer(size=3)
+    for i in range(5):
+        buffer.record({"event": "progress", "order": i})
+    assert buffer.missed("alice", 1) is None
+    assert [f["order"] for f in buffer.missed("alice", 2)] == [2, 3, 4]
+
+
+def test_reserve_grows_the_buffer_and_keeps_frames():
+    buffer = ReplayBuffer(size=2)
+    buffer.record({"event": "question"})
+    buffer.reserve(5)
+    for _ in range(3):
+        buffer.record({"event": "your_rank"}, to="ann")
+    assert [f["seq"] for f in buffer.missed("ann", 0)] == [1, 2, 3, 4]
+    buffer.reserve(3)  # never shrinks
+    assert buffer.frames.maxlen == 5
+
+
+class _Layer:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, channel, message):
+        self.sent.append((channel, json.loads(message["text"])))
+
+    async def group_send(self, group, message):
+        pass
+
+
+def test_arena_ranks_are_replayed_to_reconnecting_players(django_test_db, monkeypatch):
+    from quiz import consumers
+
+    room = consumers.new_quiz_room(["ann", "bob"], {}, {"ann": "ch-ann"}, {"difficulty": "easy"}, arena=True)
+    room.update(game_active=True, questions=[{"id": 1, "correct_option": 0}])
+    room["arena"].open_question(0, now=0)
+    room["arena"].answer("bob", 0, now=0.5)
+    monkeypatch.setitem(consumers.ROOMS, "room_arena", room)
+
+    async def no_next_question(self, room_name):
+        pass
+
+    monkeypatch.setattr(consumers.QuizConsumer, "send_question", no_next_question)
+    consumer = consumers.QuizConsumer()
+    consumer.channel_layer = _Layer()
+    asyncio.run(consumer.close_arena_question("room_arena", 0))
+
+    # ann was connected and got her frame; bob was away and gets his on resume
+    (channel, frame), = consumer.channel_layer.sent
+    assert channel == "ch-ann" and frame["event"] == "your_rank" and "seq" in frame
+    missed = room["replay"].missed("bob", 0)
+    assert [(f["event"], f["rank"]) for f in missed if f["event"] == "your_rank"] == [("your_rank", 1)]
+    assert frame not in missed
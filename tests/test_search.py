@@ -0,0 +1,53 @@
+def test_fts_index_follows_questions_after_table_remakes(db):
+    # Later migrations remake quiz_question; post_migrate must restore the triggers
+    from quiz import search
+    from quiz.models import Question
+
+    question = Question.objects.create(question_text="What does a mitochondrion produce?", correct_answer="ATP")
+    matches = Question.objects.filter(search.full_text_match(["mitochondrion"]))
+    assert list(matches.values_list("id", flat=True)) == [question.id]
+
+    question.question_text = "What does a chloroplast produce?"
+    question.save()
+    assert not Question.objects.filter(search.full_text_match(["mitochondrion"])).exists()
+    assert Question.objects.filter(search.full_text_match(["chloroplast"])).exists()
+
+
+def _bank():
+    from quiz.models import Question
+    from quiz.search import tag_questions
+
+    tagged, in_text, in_category, other = (
+        Question.objects.create(question_text=text, correct_answer="a", category=category)
+        for text, category in [
+            ("Which planet is largest?", ""),
+            ("What is a Python decorator?", "programming"),
+            ("What does len() return?", "Python"),
+            ("Who wrote Hamlet?", "literature"),
+        ]
+    )
+    tag_questions([(tagged.id, "Python")])
+    return tagged, in_text, in_category, other
+
+
+def test_topics_match_tags_text_and_category(db):
+    from quiz.models import Question
+    from quiz.search import filter_by_topics
+
+    tagged, in_text, in_category, other = _bank()
+    matched = set(filter_by_topics(Question.objects.all(), ["  PYTHON "]).values_list("id", flat=True))
+    assert matched == {tagged.id, in_text.id, in_category.id}
+    # The last word is a prefix match, like the old icontains
+    assert set(filter_by_topics(Question.objects.all(), ["pyth"]).values_list("id", flat=True)) >= {in_text.id, in_category.id}
+    assert filter_by_topics(Question.objects.all(), ["", " "]).count() == 4
+
+
+def test_like_fallback_without_a_full_text_index(db, monkeypatch):
+    from quiz import search
+    from quiz.models import Question
+
+    tagged, in_text, in_category, other = _bank()
+    monkeypatch.setattr(search, "_fts_available", False)
+    assert search.full_text_match(["python"]) is None
+    matched = search.filter_by_topics(Question.objects.all(), ["python"])
+    assert set(matched.values_list("id", flat=True)) == {tagged.id, in_text.id, in_category.id}
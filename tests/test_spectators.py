@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from quiz.code_diff import apply_diff
+from quiz.spectators import SpectatorRelay
+
+
+class FakeLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, json.loads(message["text"])))
+
+
+def test_relay_coalesces_updates_and_code():
+    async def run():
+        layer = FakeLayer()
+        relay = SpectatorRelay(layer, "battle_1", max_rate=1000)
+        relay.viewers = 1
+        relay.publish("status:ann", {"event": "opponent_running", "player": "ann"})
+        relay.publish("status:ann", {"event": "opponent_result", "player": "ann", "passed": 1})
+        relay.publish_code("ann", "print(1)")
+        relay.publish_code("ann", "print(2)")
+        await asyncio.sleep(0.05)
+        return layer.sent, relay
+
+    sent, relay = asyncio.run(run())
+    assert len(sent) == 1
+    group, frame = sent[0]
+    assert group == "battle_1_spectators"
+    assert frame["updates"] == [
+        {"event": "opponent_result", "player": "ann", "passed": 1},
+        {"event": "code", "player": "ann", "diff": {"p": 0, "s": 0, "i": "print(2)"}},
+    ]
+    assert relay.snapshot_code() == {"ann": "print(2)"}
+
+
+def test_updates_are_rate_limited():
+    async def run():
+        layer = FakeLayer()
+        relay = SpectatorRelay(layer, "room_1", max_rate=10)
+        relay.viewers = 1
+        for score in range(50):
+            relay.publish("score:ann", {"event": "score", "player": "ann", "score": score})
+            await asyncio.sleep(0.01)
+        sent_while_busy = len(layer.sent)
+        await asyncio.sleep(0.15)
+        return layer.sent, sent_while_busy
+
+    sent, sent_while_busy = asyncio.run(run())
+    # About 0.5s of updates at 10 frames/s: the first goes out at once, the rest every 0.1s
+    assert 3 <= sent_while_busy <= 7
+    # Nothing is lost: the last frame carries the final score
+    assert sent[-1][1]["updates"] == [{"event": "score", "player": "ann", "score": 49}]
+
+
+def test_urgent_updates_skip_the_rate_limit():
+    async def run():
+        layer = FakeLayer()
+        relay = SpectatorRelay(layer, "room_1", max_rate=1)
+        relay.viewers = 1
+        relay.publish("score:ann", {"event": "score", "score": 1})
+        await asyncio.sleep(0.01)
+        relay.publish("score:ann", {"event": "score", "score": 2})
+        relay.publish("game_over", {"event": "game_over"}, urgent=True)
+        await asyncio.sleep(0.01)
+        return layer.sent
+
+    sent = asyncio.run(run())
+    assert [frame["updates"] for _, frame in sent] == [
+        [{"event": "score", "score": 1}],
+        [{"event": "score", "score": 2}, {"event": "game_over"}],
+    ]
+
+
+def test_code_diffs_apply_to_the_snapshot_of_a_late_viewer():
+    async def run():
+        layer = FakeLayer()
+        relay = SpectatorRelay(layer, "battle_1", max_rate=1000)
+        relay.publish_code("ann", "def f():\n    pass\n")  # nobody watching yet
+        relay.publish("status:ann", {"event": "opponent_running"})
+        await asyncio.sleep(0.01)
+        assert layer.sent == []
+
+        relay.viewers = 1
+        snapshot = relay.snapshot_code()
+        relay.publish_code("ann", "def f():\n    return 1\n")
+        await asyncio.sleep(0.01)
+        return snapshot, layer.sent
+
+    snapshot, sent = asyncio.run(run())
+    (update,) = sent[0][1]["updates"]
+    assert apply_diff(snapshot["ann"], update["diff"]) == "def f():\n    return 1\n"
@@ -0,0 +1,123 @@
+from quiz.stats_buffer import MemoryStatsBuffer
+
+
+def test_games_coalesce_per_user():
+    buf = MemoryStatsBuffer()
+    buf.add(1, 50, won=True)
+    buf.add(2, 10, won=False)
+    assert buf.add(1, 20, won=False) == 2
+    assert buf.drain() == {1: (70, 2, 1), 2: (10, 1, 0)}
+    assert len(buf) == 0
+
+
+def test_restore_merges_with_new_games():
+    buf = MemoryStatsBuffer()
+    buf.add(1, 5, won=True)
+    deltas = buf.drain()
+    buf.add(1, 3, won=False)
+    buf.restore(deltas)
+    assert buf.drain() == {1: (8, 2, 1)}
+
+
+def _redis_buffer():
+    from fake_redis import FakeRedis
+
+    from quiz.stats_buffer import RedisStatsBuffer
+
+    return RedisStatsBuffer(FakeRedis())
+
+
+def test_redis_flush_keeps_deltas_until_written(monkeypatch):
+    from quiz import stats_buffer
+
+    store = _redis_buffer()
+    store.add(1, 50, won=True)
+    store.add(1, 20, won=False)
+    buffer = stats_buffer.StatsBuffer(store, flush_size=100, flush_interval=60)
+
+    def fail(deltas):
+        # The drained hash is still in Redis while the UPDATE runs
+        assert len(store.client.smembers(store.flushing_key)) == 1
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(stats_buffer, "apply_stat_deltas", fail)
+    assert buffer.flush() == 0
+    store.add(1, 5, won=False)
+    assert store.client.smembers(store.flushing_key) == set()
+
+    written = []
+    monkeypatch.setattr(stats_buffer, "apply_stat_deltas", lambda deltas: written.append(deltas) or len(deltas))
+    assert buffer.flush() == 1
+    assert written == [{1: (75, 3, 1)}]
+    assert store.client.data.keys() <= {store.flushing_key}
+    assert store.client.smembers(store.flushing_key) == set()
+
+
+def test_redis_drain_recovers_abandoned_flushes(monkeypatch):
+    from quiz import stats_buffer
+
+    store = _redis_buffer()
+    store.add(7, 10, won=True)
+    assert store.drain() == {7: (10, 1, 1)}  # process dies before done()/restore()
+
+    store.add(7, 4, won=False)
+    assert store.drain() == {7: (4, 1, 0)}  # too recent to be called abandoned
+    store.done()
+
+    real_ns = stats_buffer.time.time_ns
+    monkeypatch.setattr(stats_buffer.time, "time_ns", lambda: real_ns() + (stats_buffer.ORPHAN_AGE + 1) * 10**9)
+    assert store.drain() == {7: (10, 1, 1)}
+
+
+def test_timer_flushes_a_quiet_buffer(django_test_db, monkeypatch):
+    import threading
+
+    from quiz import stats_buffer
+
+    flushed = threading.Event()
+    monkeypatch.setattr(stats_buffer, "apply_stat_deltas", lambda deltas: flushed.set() or len(deltas))
+    buffer = stats_buffer.StatsBuffer(MemoryStatsBuffer(), flush_size=100, flush_interval=0.01)
+    buffer.store.add(3, 1, won=False)
+    buffer.start_timer()
+    try:
+        assert flushed.wait(2)
+        assert len(buffer.store) == 0
+    finally:
+        buffer.stop_timer()
+
+
+def test_websocket_players_are_bound_by_user_id(django_test_db):
+    from django.contrib.auth.models import AnonymousUser
+
+    from quiz.consumers import scope_user_id
+
+    class LoggedIn:
+        pk = 7
+        is_authenticated = True
+
+    assert scope_user_id({"user": LoggedIn()}) == 7
+    assert scope_user_id({"user": AnonymousUser()}) is None
+    assert scope_user_id({}) is None
+
+
+def test_game_results_are_one_update_per_game(db):
+    from django.db import connection
+    from django.test import TestCase
+    from django.test.utils import CaptureQueriesContext
+
+    from quiz import leaderboard
+    from quiz.models import CustomUser
+    from quiz.stats_buffer import record_game_results
+
+    # Usernames that the old split("_")[0] lookup confused
+    bob, bob_smith = CustomUser.objects.create(username="bob"), CustomUser.objects.create(username="bob_smith")
+    with CaptureQueriesContext(connection) as queries, TestCase.captureOnCommitCallbacks(execute=True):
+        updated = record_game_results([(bob_smith.id, 30, True), (bob.id, 10, False), (None, 50, False)])
+
+    assert updated == 2
+    assert sum(q["sql"].startswith("UPDATE") for q in queries.captured_queries) == 1
+    bob.refresh_from_db()
+    bob_smith.refresh_from_db()
+    assert (bob_smith.total_score, bob_smith.games_played, bob_smith.win_rate) == (30, 1, 100.0)
+    assert (bob.total_score, bob.games_played, bob.win_rate) == (10, 1, 0.0)
+    assert leaderboard.top(2) == [(bob_smith.id, 30), (bob.id, 10)]
@@ -0,0 +1,58 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+
+
+def _games(user, results):
+    from quiz.models import PlayerScore, QuizSession
+
+    for correct, total in results:
+        PlayerScore.objects.create(
+            player=user, session=QuizSession.objects.create(), score=correct * 10,
+            correct_answers=correct, total_answers=total,
+        )
+
+
+def _run(*args):
+    from django.core.management import call_command
+
+    out = StringIO()
+    call_command("update_user_stats", *args, stdout=out)
+    return out.getvalue()
+
+
+def test_wins_are_games_with_at_least_half_correct(db):
+    from quiz.models import CustomUser
+
+    ann, bob = CustomUser.objects.create(username="ann"), CustomUser.objects.create(username="bob_smith")
+    CustomUser.objects.filter(id=bob.id).update(total_score=999, games_played=9, win_rate=50.0)
+    _games(ann, [(3, 5), (2, 5), (1, 2), (0, 0)])  # win, loss, win (exactly 50%), no answers
+
+    assert "updated stats for 2 users" in _run("--batch-size", "1")
+    ann.refresh_from_db()
+    bob.refresh_from_db()
+    assert (ann.total_score, ann.games_played, ann.win_rate) == (60, 4, 50.0)
+    assert (bob.total_score, bob.games_played, bob.win_rate) == (0, 0, 0.0)
+
+
+def test_since_only_recomputes_recently_active_players(db):
+    from django.core.management.base import CommandError
+    from django.utils import timezone
+
+    from quiz.models import CustomUser, PlayerScore
+
+    old, recent = CustomUser.objects.create(username="old"), CustomUser.objects.create(username="recent")
+    _games(old, [(5, 5)])
+    _games(recent, [(1, 5), (4, 5)])
+    PlayerScore.objects.filter(player=old).update(last_activity=timezone.now() - timedelta(days=10))
+
+    since = (timezone.now() - timedelta(days=1)).date().isoformat()
+    assert "updated stats for 1 users" in _run("--since", since)
+    old.refresh_from_db()
+    recent.refresh_from_db()
+    assert old.games_played == 0
+    assert (recent.total_score, recent.games_played, recent.win_rate) == (50, 2, 50.0)
+
+    with pytest.raises(CommandError):
+        _run("--since", "last tuesday")
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("msgpack")
+
+from quiz import wire
+from quiz.broadcast import BroadcastMixin, encode_frame
+
+
+class FakeConsumer(BroadcastMixin):
+    def __init__(self, player_name, protocol):
+        self.player_name = player_name
+        self.protocol = protocol
+        self.sent = []
+
+    async def send(self, text_data=None, bytes_data=None):
+        self.sent.append(text_data if bytes_data is None else bytes_data)
+
+
+def test_pack_round_trip_keeps_opaque_keys():
+    frame = {
+        "event": "finished",
+        "results": {"scores": {"player": 10, "e": 20}, "winners": ["e"]},
+        "updates": [{"event": "code", "player": "a", "diff": {"p": 1, "s": 0, "i": "x"}}],
+    }
+    packed = wire.pack(frame)
+    assert wire.unpack(packed) == frame
+    assert len(packed) < len(encode_frame(frame))
+    short = wire.shorten(frame)
+    assert short["rs"]["sc"] == {"player": 10, "e": 20}
+
+
+def test_hello_reply():
+    assert wire.hello_reply("msgpack")["protocol"] == "msgpack"
+    assert wire.hello_reply("msgpack")["fields"]["event"] == "e"
+    assert wire.hello_reply("cbor") == {"event": "hello", "protocol": "json"}
+
+
+def test_broadcast_frame_per_protocol():
+    frame = {"event": "question", "options": ["a", "b"], "order": 1}
+    event = {"type": "broadcast_frame", "text": encode_frame(frame), "exclude": None}
+    json_client, msgpack_client = FakeConsumer("a", "json"), FakeConsumer("b", "msgpack")
+    for consumer in (json_client, msgpack_client):
+        asyncio.run(consumer.broadcast_frame(event))
+    assert json_client.sent == [event["text"]]
+    assert wire.unpack(msgpack_client.sent[0]) == frame